@@ -4,14 +4,16 @@
 import base64
 import os
 import json
-from google import genai
 from google.genai import types
 from dotenv import load_dotenv
+from llm import agenerate_text, gather_bounded, generate_text, stream_text
+from model_routing import ROUTED
+from quiz_validation import is_repairable_quiz, normalize_question, repair_json, validate_quiz
 
 # Load environment variables from .env file
 load_dotenv()
 
-def generate_quiz(text, topic=None, num_questions=5):
+def generate_quiz(text, topic=None, num_questions=5, use_cache=True, exclude=None):
     """
     Generate a quiz from text content using Google Gemini API.
     
@@ -19,22 +21,176 @@ def generate_quiz(text, topic=None, num_questions=5):
         text (str): The text content to create quiz questions from
         topic (str, optional): The topic of the content
         num_questions (int): Number of questions to generate
+        use_cache (bool): Reuse a cached quiz for identical input; False generates fresh questions
+        exclude (list, optional): Texts of existing questions the model must not repeat
         
     Returns:
         list: A list of quiz questions in the format:
              [{"question": "...", "options": ["...", "..."], "answer": "..."}]
+             Broken JSON is repaired locally and every answer is one of its
+             options; questions that fail validation are re-requested on their own.
     """
-    client = genai.Client(
-        api_key=os.environ.get("GEMINI_API_KEY"),
+    model, contents, generate_content_config = _quiz_request(text, topic, num_questions, exclude)
+
+    try:
+        response_text = generate_text(
+            model,
+            contents,
+            generate_content_config,
+            use_cache=use_cache,
+            validate=is_repairable_quiz,
+            operation="quiz",
+        )
+        return _fill_shortfall(_parse_quiz(response_text), text, topic, num_questions, use_cache, exclude)
+            
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return None
+
+def stream_quiz(text, topic=None, num_questions=5, use_cache=True, exclude=None):
+    """
+    Generate a quiz and yield each question as soon as it is complete in the stream.
+    Takes the same arguments as generate_quiz; raises on API errors.
+
+    Yields:
+        dict: {"question": "...", "options": [...], "answer": "..."}
+    """
+    model, contents, generate_content_config = _quiz_request(text, topic, num_questions, exclude)
+    parser = QuestionStreamParser()
+    questions = []
+    stream = stream_text(model, contents, generate_content_config, use_cache=use_cache,
+                         validate=is_repairable_quiz, operation="quiz")
+    try:
+        for chunk in stream:
+            for item in parser.feed(chunk):
+                question, reason = normalize_question(item)
+                if question is None:
+                    print(f"Dropped invalid question: {reason}")
+                    continue
+                questions.append(question)
+                yield question
+                if len(questions) >= num_questions:
+                    return
+    finally:
+        # Closing the stream aborts the model call, so extra questions are not paid for
+        stream.close()
+
+    # Questions that were invalid or cut off are re-requested on their own afterwards
+    filled = _fill_shortfall(questions, text, topic, num_questions, use_cache, exclude) or []
+    yield from filled[len(questions):]
+
+class QuestionStreamParser:
+    """
+    Incremental parser for a streamed JSON array of questions.
+    feed() returns the question objects whose closing brace has arrived,
+    tracking strings and nesting so braces inside question text are ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.in_string = False
+        self.escaped = False
+        self.stack = []  # (bracket, start index) of open objects and arrays
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        questions = []
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.stack.append((char, self.position))
+            elif char in "}]" and self.stack:
+                bracket, start = self.stack.pop()
+                # A finished object directly inside an array is one question
+                if bracket == "{" and (not self.stack or self.stack[-1][0] == "["):
+                    try:
+                        item = json.loads(self.buffer[start:self.position + 1])
+                    except json.JSONDecodeError:
+                        item = None
+                    if isinstance(item, dict) and "question" in item:
+                        questions.append(item)
+            self.position += 1
+        return questions
+
+async def agenerate_quiz(text, topic=None, num_questions=5, use_cache=True, exclude=None):
+    """
+    Async version of generate_quiz built on the async Gemini client.
+    API errors are raised rather than printed so batch callers can report them per item.
+    """
+    model, contents, generate_content_config = _quiz_request(text, topic, num_questions, exclude)
+    response_text = await agenerate_text(
+        model, contents, generate_content_config, use_cache=use_cache, validate=is_repairable_quiz,
+        operation="quiz",
     )
+    questions = _parse_quiz(response_text) or []
+
+    for _ in range(REPAIR_ROUNDS):
+        missing = num_questions - len(questions)
+        if missing <= 0:
+            break
+        request = _quiz_request(text, topic, missing, _with_kept(exclude, questions))
+        try:
+            replacement = await agenerate_text(*request, use_cache=use_cache, validate=is_repairable_quiz,
+                                               operation="quiz")
+        except Exception as e:
+            print(f"Could not replace invalid questions: {e}")
+            break
+        questions = _merge_replacements(questions, _parse_quiz(replacement))
+    return questions[:num_questions] or None
+
+async def generate_quizzes_many(items, num_questions=5, concurrency=4, use_cache=True):
+    """
+    Generate quizzes for many texts concurrently.
 
-    model = "gemini-2.5-flash-preview-04-17"
+    Args:
+        items (list): Texts, or dicts with "text" and optional "topic" and "num_questions"
+        num_questions (int): Default number of questions per quiz
+        concurrency (int): Maximum number of quizzes generated at once
+        use_cache (bool): Reuse cached quizzes for identical input
+
+    Returns:
+        list: One question list (or None if no usable questions came back) per item,
+        in input order; items that failed hold the exception instead
+    """
+    async def one(item):
+        if isinstance(item, str):
+            item = {"text": item}
+        return await agenerate_quiz(
+            item["text"],
+            item.get("topic"),
+            item.get("num_questions", num_questions),
+            use_cache=use_cache,
+        )
+
+    return await gather_bounded(one, items, concurrency)
+
+# Upper bound on existing questions listed in a prompt as exclusions
+MAX_EXCLUSIONS = 50
+
+def _quiz_request(text, topic, num_questions, exclude=None):
+    """Build the model, contents and config for a quiz request."""
+    model = ROUTED
     
     # Prepare the prompt with context
     context = ""
     if topic:
         context += f"Topic: {topic}\n"
     
+    # Existing questions the new ones must not repeat
+    if exclude:
+        listed = "\n".join(f"- {question}" for question in exclude[:MAX_EXCLUSIONS])
+        context += f"Do not repeat or rephrase any of these existing questions:\n{listed}\n"
+    
     prompt = f"""{context}
     Please create a quiz with {num_questions} multiple-choice questions based on the following text.
     
@@ -57,10 +213,11 @@ def generate_quiz(text, topic=None, num_questions=5):
 You will be given notes and topics.
 You need to make a practice quiz for the user.
 The output will be a JSON array containing quiz questions.
-Each question should have 3 fields: 
+Each question should have these fields: 
 - "question": the text of the question
 - "options": an array of possible answers (provide 4 options)
 - "answer": the correct answer (must be exactly one of the options)
+- "topic": the topic the question tests, taken from the given topics when there are any
 
 Example format:
 [
@@ -78,27 +235,59 @@ Example format:
         ],
     )
 
-    try:
-        response_text = ""
-        for chunk in client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
-        ):
-            response_text += chunk.text
-            
-        # Try to parse the JSON response
-        try:
-            quiz_data = json.loads(response_text)
-            return quiz_data
-        except json.JSONDecodeError:
-            # If JSON parsing fails, return an error message
-            print(f"Error parsing JSON response. Raw text: {response_text[:200]}...")
-            return None
-            
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    return model, contents, generate_content_config
+
+def _parse_quiz(response_text):
+    """
+    Parse, repair and validate a quiz response.
+    Returns the usable questions, or None if nothing could be recovered.
+    """
+    data = repair_json(response_text)
+    if data is None:
+        print(f"Error parsing JSON response. Raw text: {(response_text or '')[:200]}...")
         return None
+    questions, invalid = validate_quiz(data)
+    for index, reason in invalid:
+        print(f"Dropped invalid question {index + 1}: {reason}")
+    return questions or None
+
+# Rounds of re-requesting just the questions that were invalid or missing
+REPAIR_ROUNDS = 2
+
+def _with_kept(exclude, questions):
+    """Exclusions for a replacement request: the caller's plus the questions already kept."""
+    return [question["question"] for question in questions] + list(exclude or [])
+
+def _merge_replacements(questions, replacement):
+    """Append replacement questions whose text is not already in the quiz."""
+    known = {question["question"].casefold() for question in questions}
+    merged = list(questions)
+    for question in replacement or []:
+        if question["question"].casefold() not in known:
+            known.add(question["question"].casefold())
+            merged.append(question)
+    return merged
+
+def _fill_shortfall(questions, text, topic, num_questions, use_cache=True, exclude=None):
+    """
+    Top a validated quiz up to num_questions by asking only for the missing
+    questions, instead of regenerating the whole quiz.
+    Returns the questions, or None if there are none.
+    """
+    questions = list(questions or [])
+    for _ in range(REPAIR_ROUNDS):
+        missing = num_questions - len(questions)
+        if missing <= 0:
+            break
+        request = _quiz_request(text, topic, missing, _with_kept(exclude, questions))
+        try:
+            replacement = generate_text(*request, use_cache=use_cache, validate=is_repairable_quiz,
+                                        operation="quiz")
+        except Exception as e:
+            print(f"Could not replace invalid questions: {e}")
+            break
+        questions = _merge_replacements(questions, _parse_quiz(replacement))
+    return questions[:num_questions] or None
 
 def save_quiz_to_file(quiz_data, output_path="quiz.json"):
     """Save quiz data to a JSON file"""
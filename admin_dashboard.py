@@ -0,0 +1,80 @@
+import sqlite3
+
+import pandas as pd
+import streamlit as st
+
+from rate_limit import get_limiter
+from telemetry import TELEMETRY_PATH, latency_report
+
+# Admin view of model call telemetry:
+#     streamlit run admin_dashboard.py
+
+st.set_page_config(page_title="LLM Telemetry", layout="wide")
+st.title("LLM Call Telemetry")
+st.caption(f"Every Gemini call made by the app, OCR, summaries, quizzes and chat, read from {TELEMETRY_PATH}.")
+
+days = st.slider("Days to show", min_value=1, max_value=90, value=14)
+
+overall = latency_report(days=days, by_day=False)
+if not overall:
+    st.info("No model calls recorded yet.")
+    st.stop()
+
+st.subheader("By Operation")
+overall_df = pd.DataFrame(overall).drop(columns=["day"])
+st.dataframe(overall_df, use_container_width=True, hide_index=True)
+st.caption("Latency percentiles (ms) cover successful calls that reached the model; cache hits are counted separately.")
+
+st.subheader("By Day")
+daily_df = pd.DataFrame(latency_report(days=days, by_day=True))
+operations = sorted(daily_df["operation"].unique())
+selected = st.multiselect("Operations", operations, default=operations)
+daily_df = daily_df[daily_df["operation"].isin(selected)]
+
+percentile_choice = st.radio("Percentile", ["p50_ms", "p95_ms", "p99_ms"], index=1, horizontal=True)
+chart_df = daily_df.pivot_table(index="day", columns="operation", values=percentile_choice).sort_index()
+if not chart_df.empty:
+    st.line_chart(chart_df)
+st.dataframe(daily_df, use_container_width=True, hide_index=True)
+
+st.subheader("By Model")
+st.caption("Routed calls pick a model tier per operation (see model_routing); fallbacks are calls "
+           "made after another tier timed out or failed.")
+by_model_df = pd.DataFrame(latency_report(days=days, by_day=False, by_model=True)).drop(columns=["day"])
+st.dataframe(by_model_df[["operation", "model", "calls", "errors", "fallbacks", "cache_hits",
+                          "p50_ms", "p95_ms", "p99_ms"]], use_container_width=True, hide_index=True)
+
+with st.expander("Recent Routing Decisions", expanded=False):
+    conn = sqlite3.connect(TELEMETRY_PATH)
+    decisions = pd.read_sql_query('''
+        SELECT datetime(started_at, 'unixepoch', 'localtime') AS time, operation, model, status,
+               round(latency_ms) AS latency_ms, route
+        FROM llm_calls
+        WHERE route IS NOT NULL
+        ORDER BY started_at DESC
+        LIMIT 100
+    ''', conn)
+    conn.close()
+    if decisions.empty:
+        st.write("No routed calls yet.")
+    else:
+        st.dataframe(decisions, use_container_width=True, hide_index=True)
+
+with st.expander("Recent Errors", expanded=False):
+    conn = sqlite3.connect(TELEMETRY_PATH)
+    errors = pd.read_sql_query('''
+        SELECT datetime(started_at, 'unixepoch', 'localtime') AS time, operation, model, retries,
+               round(latency_ms) AS latency_ms, error
+        FROM llm_calls
+        WHERE status = 'error'
+        ORDER BY started_at DESC
+        LIMIT 50
+    ''', conn)
+    conn.close()
+    if errors.empty:
+        st.write("No failed calls.")
+    else:
+        st.dataframe(errors, use_container_width=True, hide_index=True)
+
+with st.expander("Rate Limiting", expanded=False):
+    st.json(get_limiter().totals())
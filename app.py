@@ -1,17 +1,30 @@
 import streamlit as st
+import asyncio
 import requests
 import json
 from database import Database
 import os
 import random
-import PyPDF2  # Import PyPDF2 for PDF text extraction
+import time
 import base64
-from google import genai
 from google.genai import types
 from dotenv import load_dotenv
-from summerize import generate_summary  # Import from summerize.py (note the spelling)
-from Qgen import generate_quiz, save_quiz_to_file  # Import quiz generation functions
+from llm import generate_text, is_json  # Shared, cached Gemini generation
+from model_routing import ROUTED  # Model tier picked per call
+from summerize import format_summary, generate_summary, generate_summaries_many  # Import from summerize.py (note the spelling)
+from Qgen import generate_quiz, save_quiz_to_file, stream_quiz  # Import quiz generation functions
+from quiz_batch import generate_quiz_batch  # Concurrent quizzes for several documents
+from question_bank import build_quiz, finish_quiz, plan_quiz, store_generated  # Reuse stored questions before generating
+from single_flight import coalesce, coalesce_stream  # Join identical generations already running
+from dedup import find_near_duplicate, index_question  # Near-duplicate question detection
 from chat_interface import create_chatbot_ui  # Import chatbot UI
+from ocr import extract_pdf_pages, ocr_pages, ocr_sections, sections_to_text  # Page and section views of extracted text
+from prompt_compaction import QUIZ_PROMPT_TOKENS, PAPER_PROMPT_TOKENS  # Prompt cleanup and token budgets
+from context_selection import select_context  # Full text, summary or hybrid prompt context
+from image_ingest import images_to_pdf, is_image_file  # Photo preprocessing before OCR
+from processing_pipeline import enqueue_document, ensure_worker, processing_status  # Background summary, topics and first quiz
+from paper_assembly import MODES as PAPER_MODES, assemble_for_document, load_paper, marks_label, save_paper  # Question papers from the bank, no model call
+from paper_variants import answer_keys_csv, create_variants, grade_response, load_variants, printable_set  # Shuffled sets A, B, C, ...
 
 # Load environment variables from .env file
 load_dotenv()
@@ -188,29 +201,44 @@ div[data-baseweb="select"] > div {
 # Initialize database connection
 db = Database("edumate.db")
 
+# Work off documents queued by earlier sessions or by ingestion scripts
+ensure_worker(db.db_name)
+
 # Ensure uploads directory exists
 os.makedirs("uploads", exist_ok=True)
 
 # Function to extract text from PDF
-def extract_text_from_pdf(pdf_path):
-    """Extract text content from a PDF file."""
+def extract_text_from_pdf(pdf_path, document_id=None):
+    """
+    Extract text content from a PDF file.
+    When a document_id is given, every page is stored in document_pages as it is
+    extracted, and pages that were already stored are reused instead of re-parsed,
+    so an interrupted extraction resumes where it stopped.
+    """
     try:
+        pages = {}
+        if document_id:
+            pages = {page[2]: page[3] for page in db.get_document_pages(document_id)}
+        
+        for page_number, page_text, confidence in extract_pdf_pages(pdf_path, skip_pages=pages):
+            pages[page_number] = page_text
+            if document_id:
+                db.add_document_page(document_id, page_number, page_text, 'text_layer', confidence)
+        
         text = ""
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n\n"
+        for page_number in sorted(pages):
+            if pages[page_number]:
+                text += pages[page_number] + "\n\n"
         return text
     except Exception as e:
         st.error(f"Error extracting text from PDF: {str(e)}")
         return None
 
 # OCR Function using Google Gemini API
-def ocr_pdf_with_gemini(pdf_file_path: str):
+def ocr_pdf_with_gemini(pdf_file_path: str, use_cache=True):
     """
     Process a PDF file with Google Gemini OCR and store results in the database.
+    Identical PDFs are answered from the response cache unless use_cache is False.
     Returns the JSON response from the API.
     """
     api_key = os.environ.get("GEMINI_API_KEY")
@@ -218,12 +246,8 @@ def ocr_pdf_with_gemini(pdf_file_path: str):
     if not api_key:
         st.error("GEMINI_API_KEY environment variable not set. Please add it to your .env file.")
         return None
-        
-    client = genai.Client(
-        api_key=api_key,
-    )
 
-    model = "gemini-2.5-flash-preview-04-17"
+    model = ROUTED
 
     # Read the PDF file in binary mode
     with open(pdf_file_path, "rb") as f:
@@ -259,7 +283,15 @@ def ocr_pdf_with_gemini(pdf_file_path: str):
             "sections": [
                 {
                     "title": "Section title if available",
-                    "content": "Content of this section"
+                    "content": "Content of this section",
+                    "topic": "The entry of topics this section belongs to"
+                }
+            ],
+            "pages": [
+                {
+                    "page_number": 1,
+                    "text": "The extracted text of this page",
+                    "confidence": "your confidence in this page's transcription, from 0.0 to 1.0"
                 }
             ]
         }
@@ -268,22 +300,27 @@ def ocr_pdf_with_gemini(pdf_file_path: str):
     )
 
     try:
-        st.info(f"Processing PDF with {model}. This may take a few minutes...")
+        st.info("Processing PDF with Gemini. This may take a few minutes...")
         
         # Create a placeholder for streaming output
         output_placeholder = st.empty()
-        full_response = ""
+        streamed = []
+        
+        def show_chunk(text):
+            # Update the placeholder with the current response
+            streamed.append(text)
+            output_placeholder.text("".join(streamed))
         
-        # Stream the response
-        for chunk in client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
-        ):
-            if chunk.text:
-                full_response += chunk.text
-                # Update the placeholder with the current response
-                output_placeholder.text(full_response)
+        # Stream the response (identical PDFs are answered from the cache)
+        full_response = generate_text(
+            model,
+            contents,
+            generate_content_config,
+            use_cache=use_cache,
+            validate=is_json,
+            on_chunk=show_chunk,
+            operation="ocr",
+        )
         
         # Try to parse the JSON response
         try:
@@ -299,7 +336,8 @@ def ocr_pdf_with_gemini(pdf_file_path: str):
                     "language": "unknown",
                     "pages": "unknown"
                 }),
-                "sections": json_data.get("sections", [])
+                "sections": json_data.get("sections", []),
+                "pages": json_data.get("pages", [])
             }
             
             # Format the JSON with proper indentation for display
@@ -323,13 +361,22 @@ def store_ocr_result(user_id, pdf_file_path, ocr_data):
     """
     try:
         # Add document to the database
+        # The document, its pages and sections are committed together below
         document_id = db.add_document(
             user_id=user_id, 
             original_file_url=pdf_file_path, 
             source_type='text', 
-            text_content=ocr_data.get('text', '')
+            text_content=ocr_data.get('text', ''),
+            commit=False
         )
         
+        # Store the per-page text so later stages can read single pages
+        for page_number, page_text, confidence in ocr_pages(ocr_data):
+            db.add_document_page(document_id, page_number, page_text, 'ocr', confidence, commit=False)
+        
+        # Index the sections by topic so topic filters only send matching text
+        db.replace_document_sections(document_id, ocr_sections(ocr_data), commit=False)
+        
         # Mark document as processed
         db.cursor.execute('''
             UPDATE documents 
@@ -338,113 +385,136 @@ def store_ocr_result(user_id, pdf_file_path, ocr_data):
         ''', (document_id,))
         
         db.conn.commit()
+        
+        # Summarize, index topics and build a first quiz in the background
+        enqueue_document(db, document_id)
         return document_id
         
     except Exception as e:
+        db.conn.rollback()
         st.error(f"Error storing OCR result: {str(e)}")
         return None
 
+# Function to get the text of the sections matching some topics
+def text_for_topics(document_id, topics):
+    """
+    Return the text of a document's sections that belong to the given topics.
+    Returns None when no topics are selected or no sections match, so callers
+    can fall back to the full text.
+    """
+    if not topics or "All Topics" in topics:
+        return None
+    sections = db.get_sections_for_topics(document_id, topics)
+    return sections_to_text(sections) if sections else None
+
+# Labels of the context policies offered in the quiz and paper tabs
+CONTEXT_POLICY_LABELS = {
+    "Auto": "auto",
+    "Full text": "full",
+    "Summary": "summary",
+    "Summary + key passages": "hybrid",
+}
+
+# Function to shrink document text before it is put into a prompt
+def compact_for_prompt(document_id, text, operation, max_tokens=None, topics=None, policy="full"):
+    """
+    Clean up a document's text for a prompt (whitespace, hyphenation, running
+    headers and footers) and, past max_tokens, keep the most informative passages.
+    With the summary, hybrid or auto policy the stored summary (plus topic
+    passages) may be used instead, see context_selection.
+    The before/after token counts are recorded in prompt_token_stats.
+    """
+    pages = [page[3] for page in db.get_document_pages(document_id)]
+    compacted, stats = select_context(db, document_id, text, topics, policy, max_tokens, pages)
+    db.add_prompt_token_stats(document_id, operation, stats, max_tokens)
+    return compacted, stats
+
 # Function to create a summary using the Gemini API
-def create_summary_for_document(document_id):
+def summary_input(document_id, topics=None):
+    """
+    Load what to summarize for a document.
+    When topics are given, only the sections indexed under them are used.
+    Returns (text, subject, topics) or None if the document has no text.
+    """
+    # Get document details from database
+    document = db.cursor.execute('''
+        SELECT document_id, text_content, original_file_url 
+        FROM documents
+        WHERE document_id = ?
+    ''', (document_id,)).fetchone()
+
+    if not document or not document[1]:  # If no document or no text content
+        return None
+
+    # Extract subject and topics from OCR data if available
+    ocr_data = {}
+    text_content = document[1]
+
+    # Try to extract subject and topics from text content
+    # This is assuming the OCR result is stored as JSON in the text_content field
+    try:
+        if text_content.strip().startswith('{') and text_content.strip().endswith('}'):
+            ocr_data = json.loads(text_content)
+            # If text is in JSON format, get the text field
+            if 'text' in ocr_data:
+                text_content = ocr_data.get('text', '')
+    except:
+        # If not JSON, use the text as is
+        pass
+
+    # Narrow the text down to the selected topics when sections are indexed
+    topic_text = text_for_topics(document_id, topics)
+    if topic_text:
+        text_content = topic_text
+
+    # No budget here: long documents are summarized in chunks rather than cut
+    text_content, _ = compact_for_prompt(document_id, text_content, "summary")
+
+    return (
+        text_content,
+        ocr_data.get('subject', None),
+        ", ".join(topics) if topic_text else ocr_data.get('topics', None),
+    )
+
+def store_summary(document_id, summary_result, topics=None):
+    """
+    Format a generate_summary result for storage and save it, with the topics
+    it was restricted to, if any. Returns the summary_id.
+    """
+    return db.add_summary(document_id, format_summary(summary_result), topics)
+
+def create_summary_for_document(document_id, topics=None, use_cache=True):
     """
     Create a summary for a document using the Gemini API.
+    When topics are given, only the sections indexed under them are summarized.
+    Pass use_cache=False to regenerate instead of reusing a cached summary.
+    Sessions (and the background pipeline) asking for the same summary at the
+    same time share one generation and one stored summary.
     Returns the summary_id if successful, None otherwise.
     """
     try:
-        # Get document details from database
-        document = db.cursor.execute('''
-            SELECT document_id, text_content, original_file_url 
-            FROM documents
-            WHERE document_id = ?
-        ''', (document_id,)).fetchone()
-        
-        if not document or not document[1]:  # If no document or no text content
+        request = summary_input(document_id, topics)
+        if request is None:
             st.error("No text content found for this document")
             return None
-            
-        # Extract subject and topics from OCR data if available
-        ocr_data = {}
-        text_content = document[1]
+        text_content, subject, summary_topics = request
+        # Recorded with the summary so quiz and paper prompts only use it for these topics
+        covered = list(topics) if text_for_topics(document_id, topics) else None
         
-        # Try to extract subject and topics from text content
-        # This is assuming the OCR result is stored as JSON in the text_content field
-        try:
-            if text_content.strip().startswith('{') and text_content.strip().endswith('}'):
-                ocr_data = json.loads(text_content)
-                # If text is in JSON format, get the text field
-                if 'text' in ocr_data:
-                    text_content = ocr_data.get('text', '')
-        except:
-            # If not JSON, use the text as is
-            pass
-            
-        # Generate summary using summerize.py
-        summary_result = generate_summary(
-            text_content,
-            subject=ocr_data.get('subject', None),
-            topics=ocr_data.get('topics', None)
-        )
+        def generate_and_store():
+            # Generate summary using summerize.py
+            summary_result = generate_summary(
+                text_content,
+                subject=subject,
+                topics=summary_topics,
+                use_cache=use_cache
+            )
+            return store_summary(document_id, summary_result, covered) if summary_result else None
         
-        if summary_result:
-            # Format summary for storage based on summerize.py output format
-            # The format is expected to be different from summarize.py
-            formatted_summary = ""
-            
-            # Check if we have a topics list or dictionary
-            if isinstance(summary_result, dict):
-                # Create a better structured JSON summary format
-                structured_summary = {
-                    "document_id": document_id,
-                    "summary": summary_result.get("summary", ""),
-                    "topics": []
-                }
-                
-                if "topics" in summary_result and isinstance(summary_result["topics"], list):
-                    # Handle topics as a list of objects with name and content
-                    topic_list = []
-                    for topic in summary_result.get("topics", []):
-                        if isinstance(topic, dict) and "name" in topic and "content" in topic:
-                            topic_list.append({
-                                "name": topic["name"],
-                                "content": topic["content"]
-                            })
-                            formatted_summary += f"## {topic['name']}\n\n{topic['content']}\n\n"
-                        else:
-                            topic_list.append({"name": str(topic), "content": ""})
-                            formatted_summary += f"- {topic}\n"
-                    
-                    structured_summary["topics"] = topic_list
-                    formatted_summary = "# Summary\n\n" + summary_result.get("summary", "") + "\n\n# Topics\n\n" + formatted_summary
-                else:
-                    # Handle top-level keys as topics
-                    topic_list = []
-                    formatted_summary += "# Summary\n\n" + summary_result.get("summary", "") + "\n\n# Topics\n\n"
-                    
-                    for key, value in summary_result.items():
-                        if key != "summary" and key != "topics":
-                            topic_list.append({
-                                "name": key,
-                                "content": value
-                            })
-                            formatted_summary += f"## {key}\n\n{value}\n\n"
-                    
-                    structured_summary["topics"] = topic_list
-            else:
-                # If it's just a text string, create a simple structure
-                structured_summary = {
-                    "document_id": document_id,
-                    "summary": str(summary_result),
-                    "topics": []
-                }
-                formatted_summary = str(summary_result)
-            
-            # Store the structured JSON in the database along with formatted text
-            summary_id = db.add_summary(document_id, formatted_summary)
-            
-            # Optionally, you can also store the structured JSON separately
-            # This would require a database schema update
-            # db.add_structured_summary(document_id, json.dumps(structured_summary))
-            
+        summary_id = coalesce("summary", document_id,
+                              {"db": os.path.abspath(db.db_name), "topics": topics or None, "fresh": not use_cache},
+                              generate_and_store)
+        if summary_id:
             return summary_id
         else:
             st.error("Failed to generate summary")
@@ -454,6 +524,35 @@ def create_summary_for_document(document_id):
         st.error(f"Error creating summary: {str(e)}")
         return None
 
+def create_summaries_for_documents(document_ids, use_cache=True, concurrency=4):
+    """
+    Summarize several documents concurrently with generate_summaries_many.
+    Returns {document_id: summary_id or an error message}, so one failing
+    document does not stop the others from being saved.
+    """
+    outcome = {}
+    requests = {}
+    for document_id in document_ids:
+        request = summary_input(document_id)
+        if request is None:
+            outcome[document_id] = "No text content found for this document"
+        else:
+            requests[document_id] = request
+
+    results = asyncio.run(generate_summaries_many(
+        [{"text": text, "subject": subject, "topics": topics} for text, subject, topics in requests.values()],
+        concurrency=concurrency,
+        use_cache=use_cache,
+    ))
+    for document_id, result in zip(requests, results):
+        if isinstance(result, Exception):
+            outcome[document_id] = f"Error creating summary: {result}"
+        elif not result:
+            outcome[document_id] = "Failed to generate summary"
+        else:
+            outcome[document_id] = store_summary(document_id, result)
+    return outcome
+
 # Advanced function to import data from JSON file
 def import_json_data(json_file, document_id):
     """
@@ -543,8 +642,17 @@ def import_json_data(json_file, document_id):
                                 if correct_option not in options:
                                     options.append(correct_option)
                                 
+                                # Skip near-duplicates of questions already stored for the document
+                                duplicate = find_near_duplicate(db, question_text, correct_option, document_id)
+                                if duplicate:
+                                    results["actions"].append(
+                                        f"Skipped question similar to stored {duplicate[0]} question #{duplicate[1]}"
+                                    )
+                                    continue
+                                
                                 # Add question to database
-                                db.add_quiz_question(quiz_id, question_text, correct_option, options)
+                                question_id = db.add_quiz_question(quiz_id, question_text, correct_option, options)
+                                index_question(db, 'quiz', question_id, document_id, question_text, correct_option)
                                 question_count += 1
                     
                     if question_count > 0:
@@ -611,7 +719,16 @@ def import_json_data(json_file, document_id):
                                     if correct_option not in options:
                                         options.append(correct_option)
                                     
-                                    db.add_paper_question(paper_id, question_text, correct_option, options)
+                                    # Skip near-duplicates of questions already stored for the document
+                                    duplicate = find_near_duplicate(db, question_text, correct_option, document_id)
+                                    if duplicate:
+                                        results["actions"].append(
+                                            f"Skipped question similar to stored {duplicate[0]} question #{duplicate[1]}"
+                                        )
+                                        continue
+                                    
+                                    question_id = db.add_paper_question(paper_id, question_text, correct_option, options)
+                                    index_question(db, 'paper', question_id, document_id, question_text, correct_option)
                                     question_count += 1
                         
                         if question_count > 0:
@@ -951,29 +1068,55 @@ with tab2:
         with st.form("document_form"):
             user_id = st.number_input("User ID", min_value=1, step=1)
             source_type = st.selectbox("Document Type", ["handwritten", "text"])
-            uploaded_file = st.file_uploader("Upload Document", type=["pdf", "png", "jpg", "txt"])
+            uploaded_file = st.file_uploader("Upload Document", type=["pdf", "png", "jpg", "jpeg", "txt"])
             
             submit_doc = st.form_submit_button("Upload Document")
             
-            if submit_doc and uploaded_file is not None:
+            if submit_doc and uploaded_file is not None and is_image_file(uploaded_file.name):
+                # Photos have no text layer: shrink them into a PDF and send it through OCR
+                file_path = os.path.join("uploads", os.path.splitext(uploaded_file.name)[0] + ".pdf")
+                try:
+                    with st.spinner("Preparing image for OCR..."):
+                        stats = images_to_pdf([uploaded_file.getvalue()], file_path)
+                    st.info(f"Image reduced from {stats['input_bytes'] / 1024:.0f} KB to {stats['output_bytes'] / 1024:.0f} KB before OCR.")
+                    
+                    with st.spinner("Processing image with Gemini AI..."):
+                        ocr_result = ocr_pdf_with_gemini(file_path)
+                    
+                    if ocr_result:
+                        document_id = store_ocr_result(user_id, file_path, ocr_result)
+                        if document_id:
+                            st.success(f"Document uploaded successfully! Document ID: {document_id}")
+                            st.info("A summary and a first quiz are being prepared in the background; "
+                                    "see 'Manage Summaries' for progress.")
+                    else:
+                        st.error("OCR processing failed. Please try again.")
+                except Exception as e:
+                    st.error(f"Error uploading image: {str(e)}")
+            
+            elif submit_doc and uploaded_file is not None:
                 # Save uploaded file
                 file_path = f"uploads/{uploaded_file.name}"
                 with open(file_path, "wb") as f:
                     f.write(uploaded_file.getbuffer())
                 
-                # Extract text content if it's a PDF
-                text_content = None
-                if uploaded_file.name.lower().endswith('.pdf'):
-                    with st.spinner("Extracting text from PDF..."):
-                        text_content = extract_text_from_pdf(file_path)
-                        if text_content:
-                            st.success("Successfully extracted text from PDF!")
-                        else:
-                            st.warning("Could not extract text from PDF. The file might be scanned or image-based.")
-                
                 # Add document to database
                 try:
-                    document_id = db.add_document(user_id, file_path, source_type, text_content)
+                    document_id = db.add_document(user_id, file_path, source_type)
+                    
+                    # Extract text content if it's a PDF, storing each page as it is read
+                    text_content = None
+                    if uploaded_file.name.lower().endswith('.pdf'):
+                        with st.spinner("Extracting text from PDF..."):
+                            text_content = extract_text_from_pdf(file_path, document_id)
+                            if text_content:
+                                db.update_document_text(document_id, text_content)
+                                st.success("Successfully extracted text from PDF!")
+                            else:
+                                st.warning("Could not extract text from PDF. The file might be scanned or image-based.")
+                    
+                    # Extract (OCR for scans), summarize, index topics and build a first quiz in the background
+                    enqueue_document(db, document_id)
                     st.success(f"Document uploaded successfully! Document ID: {document_id}")
                     
                     if text_content:
@@ -983,7 +1126,8 @@ with tab2:
                                          ("..." if len(text_content) > 1000 else ""), 
                                          height=200, disabled=True)
                     
-                    st.info("Now you can add a summary for this document in the 'Manage Summaries' tab.")
+                    st.info("A summary and a first quiz are being prepared in the background; "
+                            "see 'Manage Summaries' for progress.")
                 except Exception as e:
                     st.error(f"Error uploading document: {str(e)}")
     
@@ -1012,7 +1156,15 @@ with tab2:
                 
                 # PDF file upload
                 uploaded_pdf = st.file_uploader("Upload PDF File for OCR", type=["pdf"], key="ocr_pdf")
+                uploaded_images = st.file_uploader(
+                    "Or upload photos of notes",
+                    type=["png", "jpg", "jpeg"],
+                    accept_multiple_files=True,
+                    help="Photos are straightened, converted to grayscale, downscaled and combined into one document in upload order",
+                    key="ocr_images"
+                )
                 
+                file_path = None
                 if uploaded_pdf is not None:
                     # Display basic file info
                     file_details = {"FileName": uploaded_pdf.name, "FileType": uploaded_pdf.type, "FileSize": f"{uploaded_pdf.size / 1024:.2f} KB"}
@@ -1024,7 +1176,20 @@ with tab2:
                         f.write(uploaded_pdf.getbuffer())
                     
                     st.success(f"PDF saved at: {file_path}")
+                
+                elif uploaded_images:
+                    # Bundle the photos into one multi-page PDF before OCR
+                    base_name = os.path.splitext(uploaded_images[0].name)[0]
+                    file_path = os.path.join("uploads", f"{base_name}_notes.pdf")
+                    with st.spinner("Preparing images for OCR..."):
+                        stats = images_to_pdf([image.getvalue() for image in uploaded_images], file_path)
                     
+                    st.success(
+                        f"Combined {stats['pages']} images into {file_path} "
+                        f"({stats['input_bytes'] / 1024:.0f} KB -> {stats['output_bytes'] / 1024:.0f} KB)"
+                    )
+                
+                if file_path is not None:
                     # Process button
                     if st.button("Process with Gemini OCR"):
                         # Run OCR processing
@@ -1158,6 +1323,17 @@ with tab2:
             ''').fetchall()
             
             if documents and len(documents) > 0:
+                # Summarize every document that has no summary yet in one concurrent batch
+                unsummarized = [doc[0] for doc in documents if doc[5] == 0]
+                if unsummarized and st.button(f"Summarize All Unsummarized Documents ({len(unsummarized)})"):
+                    with st.spinner(f"Summarizing {len(unsummarized)} documents..."):
+                        outcome = create_summaries_for_documents(unsummarized)
+                    for document_id, result in outcome.items():
+                        if isinstance(result, int):
+                            st.success(f"Document #{document_id}: summary #{result} created")
+                        else:
+                            st.error(f"Document #{document_id}: {result}")
+
                 # Create a dictionary for document selection
                 doc_options = {f"Document #{doc[0]}: {os.path.basename(doc[1])} (by {doc[2]})": doc[0] for doc in documents}
                 
@@ -1171,6 +1347,33 @@ with tab2:
                 
                 # Check if document already has a summary
                 existing_summary = db.get_summary(selected_doc_id)
+
+                # Stages run in the background after the document was added
+                pipeline = processing_status(db, selected_doc_id)
+                if pipeline:
+                    still_running = any(state in ("pending", "running") for state, _ in pipeline.values())
+                    with st.expander("Background Processing", expanded=still_running):
+                        st.table([
+                            {"Stage": stage.capitalize(), "Status": state, "Detail": detail or ""}
+                            for stage, (state, detail) in pipeline.items()
+                        ])
+                        if still_running and st.button("Refresh", key="pipeline_refresh"):
+                            st.rerun()
+
+                # Token counts of the prompts built from this document
+                token_stats = db.get_prompt_token_stats(selected_doc_id)
+                if token_stats:
+                    with st.expander("Prompt Token Statistics", expanded=False):
+                        st.table([
+                            {
+                                "Operation": row[1],
+                                "Prompts": row[2],
+                                "Tokens before": row[3],
+                                "Tokens after": row[4],
+                                "Saved": f"{row[5]:.0%}",
+                            }
+                            for row in token_stats
+                        ])
                 
                 # Get document details for potential JSON formatting
                 document = db.cursor.execute('''
@@ -1302,8 +1505,8 @@ with tab2:
                             db.cursor.execute("DELETE FROM summaries WHERE document_id = ?", (selected_doc_id,))
                             db.conn.commit()
                             
-                            # Generate new summary
-                            summary_id = create_summary_for_document(selected_doc_id)
+                            # Generate new summary, bypassing the cached one
+                            summary_id = create_summary_for_document(selected_doc_id, use_cache=False)
                             
                             if summary_id:
                                 st.success(f"Summary regenerated successfully! Summary ID: {summary_id}")
@@ -1311,9 +1514,20 @@ with tab2:
                 else:
                     st.info("This document doesn't have a summary yet.")
                     
+                    # Let the user restrict the summary to indexed topics
+                    summary_topics = None
+                    indexed_topics = db.get_document_topics(selected_doc_id)
+                    if indexed_topics:
+                        summary_topics = st.multiselect(
+                            "Topics to Summarize",
+                            options=["All Topics"] + indexed_topics,
+                            default=["All Topics"],
+                            key="summary_topics"
+                        )
+                    
                     if st.button("Generate Summary"):
                         with st.spinner("Generating summary..."):
-                            summary_id = create_summary_for_document(selected_doc_id)
+                            summary_id = create_summary_for_document(selected_doc_id, summary_topics)
                             
                             if summary_id:
                                 st.success(f"Summary generated successfully! Summary ID: {summary_id}")
@@ -1534,6 +1748,48 @@ with tab3:
                 # Format document options nicely
                 doc_options = {f"{doc[0]}: {os.path.basename(doc[1])} (by {doc[2]})": doc for doc in documents}
                 
+                # Batch mode: one quiz per selected document, generated concurrently
+                with st.expander("Batch Generate Quizzes", expanded=False):
+                    batch_docs = st.multiselect(
+                        "Documents",
+                        options=list(doc_options.keys()),
+                        key="batch_quiz_docs",
+                        help="A quiz is created and saved for each selected document"
+                    )
+                    batch_questions = st.number_input(
+                        "Questions per Document", min_value=3, max_value=20, value=5, step=1, key="batch_quiz_questions"
+                    )
+                    per_document = {}
+                    if batch_docs and st.checkbox("Set the number of questions per document", key="batch_quiz_custom"):
+                        for label in batch_docs:
+                            per_document[doc_options[label][0]] = st.number_input(
+                                label, min_value=3, max_value=20, value=int(batch_questions), step=1,
+                                key=f"batch_quiz_questions_{doc_options[label][0]}"
+                            )
+                    batch_concurrency = st.slider("Parallel Requests", min_value=1, max_value=8, value=4, key="batch_quiz_concurrency")
+                    
+                    if batch_docs and st.button("Generate Quizzes", key="batch_quiz_generate"):
+                        batch_ids = [doc_options[label][0] for label in batch_docs]
+                        progress_bar = st.progress(0.0, text=f"0 of {len(batch_ids)} quizzes")
+                        
+                        def show_progress(done, total, entry):
+                            progress_bar.progress(done / total, text=f"{done} of {total} quizzes")
+                            if entry["quiz_id"]:
+                                st.success(f"Document #{entry['document_id']}: quiz #{entry['quiz_id']} "
+                                           f"with {entry['questions']} questions")
+                            else:
+                                st.error(f"Document #{entry['document_id']}: {entry['error']}")
+                        
+                        report = generate_quiz_batch(
+                            batch_ids,
+                            {document_id: per_document.get(document_id, int(batch_questions)) for document_id in batch_ids},
+                            db_name="edumate.db",
+                            concurrency=batch_concurrency,
+                            on_progress=show_progress,
+                        )
+                        st.info(f"Created {report['created']} quizzes ({report['failed']} failed) "
+                                f"in {report['elapsed_seconds']}s")
+                
                 st.markdown('<div class="quiz-container">', unsafe_allow_html=True)
                 selected_doc = st.selectbox(
                     "Select Document", 
@@ -1566,60 +1822,154 @@ with tab3:
                     except:
                         pass
                     
+                    # Prefer the topics indexed from the document's sections
+                    indexed_topics = db.get_document_topics(document_id)
+                    if indexed_topics and not topics:
+                        topics = ", ".join(indexed_topics)
+                    
                     topic_input = st.text_input("Topic/Subject", value=topics, key="topic_input")
+                    
+                    quiz_topics = None
+                    if indexed_topics:
+                        quiz_topics = st.multiselect(
+                            "Topics to Include",
+                            options=["All Topics"] + indexed_topics,
+                            default=["All Topics"],
+                            key="quiz_topics"
+                        )
                     st.markdown('</div>', unsafe_allow_html=True)
                 
+                    fresh_quiz = st.checkbox(
+                        "Generate fresh questions",
+                        help="Ignore stored questions and any cached quiz generated earlier from the same document and settings",
+                        key="fresh_quiz"
+                    )
+                    quiz_context = CONTEXT_POLICY_LABELS[st.selectbox(
+                        "Context",
+                        options=list(CONTEXT_POLICY_LABELS.keys()),
+                        key="quiz_context",
+                        help="What the model reads: the document text, its stored summary, or the summary plus "
+                             "the key passages of each topic. Auto uses the full text when it fits the budget."
+                    )]
+                    
+                    # Questions this student has seen recently are not reused from the bank
+                    students = [user for user in db.get_all_users() if user[3] == 'student']
+                    student_options = {"No specific student": None}
+                    student_options.update({f"{user[1]} ({user[2]})": user[0] for user in students})
+                    quiz_student = student_options[st.selectbox(
+                        "Student",
+                        options=list(student_options.keys()),
+                        key="quiz_student",
+                        help="Stored questions this student has seen in the last two weeks are skipped"
+                    )]
+                    
                     # Generate Quiz button
                     if st.button("Generate Quiz", type="primary"):
-                        with st.spinner("Generating quiz questions..."):
-                            # Prepare text content
+                        # Prepare text content
+                        try:
+                            if text_content.strip().startswith('{') and text_content.strip().endswith('}'):
+                                ocr_data = json.loads(text_content)
+                                if 'text' in ocr_data:
+                                    text_content = ocr_data.get('text', '')
+                        except:
+                            pass
+                        
+                        # Only send the sections of the selected topics
+                        text_content = text_for_topics(document_id, quiz_topics) or text_content
+                        text_content, token_stats = compact_for_prompt(
+                            document_id, text_content, "quiz", QUIZ_PROMPT_TOKENS, quiz_topics, quiz_context
+                        )
+                        st.caption(f"Prompt text ({token_stats['context_policy']}): {token_stats['tokens_before']:,} → "
+                                   f"{token_stats['tokens_after']:,} estimated tokens")
+                        
+                        st.markdown('<div class="quiz-container">', unsafe_allow_html=True)
+                        st.markdown('<div class="quiz-title">Generated Quiz</div>', unsafe_allow_html=True)
+                        status = st.empty()
+                        status.info("Generating quiz questions...")
+                        
+                        # Use stored questions first and only generate the missing ones
+                        started = time.perf_counter()
+                        if fresh_quiz:
+                            plan = {"questions": [], "shortfall": num_questions, "exclude": []}
+                        else:
+                            plan = plan_quiz(db, document_id, num_questions, quiz_topics, quiz_student)
+                        
+                        def generate_and_store():
+                            # Runs once for every session asking for the same quiz at the same time,
+                            # on its own connection since it runs outside this session's thread
+                            generated = []
+                            for question in stream_quiz(text_content, topic_input, plan["shortfall"],
+                                                        use_cache=not fresh_quiz, exclude=plan["exclude"]):
+                                generated.append(question)
+                                yield question
+                            flight_db = Database(db.db_name)
                             try:
-                                if text_content.strip().startswith('{') and text_content.strip().endswith('}'):
-                                    ocr_data = json.loads(text_content)
-                                    if 'text' in ocr_data:
-                                        text_content = ocr_data.get('text', '')
-                            except:
-                                pass
-                            
-                            # Generate quiz using Qgen.py
-                            quiz_data = generate_quiz(text_content, topic_input, num_questions)
-                            
-                            if quiz_data:
-                                # Save quiz to file
-                                save_quiz_to_file(quiz_data)
-                                st.success(f"Generated {len(quiz_data)} quiz questions!")
-                                
-                                # Format and display the generated quiz JSON
-                                st.markdown('<div class="quiz-container">', unsafe_allow_html=True)
-                                st.markdown('<div class="quiz-title">Generated Quiz</div>', unsafe_allow_html=True)
+                                return store_generated(flight_db, document_id, plan, generated)
+                            finally:
+                                flight_db.close()
+                        
+                        # Sessions that ask for the same quiz at once share one generation
+                        quiz_settings = {
+                            "db": os.path.abspath(db.db_name), "text": text_content, "topic": topic_input, "count": plan["shortfall"],
+                            "exclude": plan["exclude"], "fresh": fresh_quiz,
+                        }
+                        stored = []
+                        def planned_then_generated():
+                            yield from plan["questions"]
+                            if plan["shortfall"] > 0:
+                                stored.extend((yield from coalesce_stream(
+                                    "quiz", document_id, quiz_settings, generate_and_store)) or [])
+                        
+                        # Show each question as soon as the model finishes writing it
+                        quiz_data = []
+                        first_question_at = None
+                        try:
+                            for question in planned_then_generated():
+                                if first_question_at is None:
+                                    first_question_at = time.perf_counter() - started
+                                quiz_data.append(question)
+                                i = len(quiz_data) - 1
                                 
-                                # Display the JSON in a better format
-                                with st.expander("View Raw JSON", expanded=False):
-                                    st.json(quiz_data)
+                                st.markdown(f'<div class="quiz-question">', unsafe_allow_html=True)
+                                st.markdown(f"**Q{i+1}.** {question.get('question', '')}")
                                 
-                                # Preview the quiz questions
-                                for i, question in enumerate(quiz_data):
-                                    st.markdown(f'<div class="quiz-question">', unsafe_allow_html=True)
-                                    st.markdown(f"**Q{i+1}.** {question['question']}")
+                                # Display options
+                                for j, option in enumerate(question.get('options', [])):
+                                    letter = chr(65 + j)  # A, B, C, D...
+                                    is_correct = option == question.get('answer')
                                     
-                                    # Display options
-                                    for j, option in enumerate(question['options']):
-                                        letter = chr(65 + j)  # A, B, C, D...
-                                        is_correct = option == question['answer']
-                                        
-                                        # Mark correct answers in the preview
-                                        if is_correct:
-                                            st.markdown(f"**{letter}. {option}** ✓")
-                                        else:
-                                            st.markdown(f"{letter}. {option}")
-                                    st.markdown('</div>', unsafe_allow_html=True)
+                                    # Mark correct answers in the preview
+                                    if is_correct:
+                                        st.markdown(f"**{letter}. {option}** ✓")
+                                    else:
+                                        st.markdown(f"{letter}. {option}")
                                 st.markdown('</div>', unsafe_allow_html=True)
-                                
-                                # Direct to take quiz tab
-                                st.session_state.show_quiz = True
-                                st.info("Quiz generated! Go to 'Take Quiz' tab to start the quiz.")
-                            else:
-                                st.error("Failed to generate quiz. Please try again.")
+                                status.info(f"Generated {len(quiz_data)} of {num_questions} questions...")
+                        except Exception as e:
+                            st.error(f"Error generating quiz: {str(e)}")
+                        st.markdown('</div>', unsafe_allow_html=True)
+                        
+                        if quiz_data:
+                            # The shared generation kept the new questions in the bank for the next request
+                            quiz_data = finish_quiz(db, plan, stored, quiz_student)
+                            
+                            # Save quiz to file
+                            save_quiz_to_file(quiz_data)
+                            status.success(f"Generated {len(quiz_data)} quiz questions!")
+                            st.caption(f"{len(plan['questions'])} from stored questions, "
+                                       f"{len(quiz_data) - len(plan['questions'])} newly generated")
+                            st.caption(f"First question after {first_question_at:.1f}s, "
+                                       f"all questions after {time.perf_counter() - started:.1f}s")
+                            
+                            # Display the JSON in a better format
+                            with st.expander("View Raw JSON", expanded=False):
+                                st.json(quiz_data)
+                            
+                            # Direct to take quiz tab
+                            st.session_state.show_quiz = True
+                            st.info("Quiz generated! Go to 'Take Quiz' tab to start the quiz.")
+                        else:
+                            status.error("Failed to generate quiz. Please try again.")
                 else:
                     st.warning("Selected document has no text content. Please choose another document.")
             else:
@@ -1737,6 +2087,67 @@ with tab3:
             else:
                 st.info("No quiz has been generated yet. Go to the 'Create Quiz' tab to generate a quiz.")
 
+def show_question_paper(questions, report=None, paper_id=None, key_prefix="paper"):
+    """Show a question paper with its answers marked, and offer it as JSON and printable Markdown."""
+    total_marks = sum(question.get("marks", 0) for question in questions)
+    name = f"Question Paper {paper_id}" if paper_id else "Question Paper"
+    title = f"{name} ({len(questions)} Questions" + (f", {total_marks} Marks)" if total_marks else ")")
+    st.markdown('<div class="qp-container">', unsafe_allow_html=True)
+    st.markdown(f'<div class="qp-title">{title}</div>', unsafe_allow_html=True)
+    if report:
+        time_limit = f" of {report['time_limit_minutes']:g}" if report["time_limit_minutes"] else ""
+        st.caption(f"{report['total_marks']}/{report['target_marks']} marks · about {report['minutes']:g}{time_limit} minutes · "
+                   + " · ".join(f"{difficulty} {got}/{wanted:g}" for difficulty, (got, wanted) in report["difficulty"].items()))
+        for problem in report["problems"]:
+            st.warning(problem)
+    
+    # Format the questions nicely
+    for i, question in enumerate(questions):
+        st.markdown(f'<div class="qp-question">', unsafe_allow_html=True)
+        marks = f" *({marks_label(question['marks'])}, {question['difficulty']})*" if "marks" in question else ""
+        st.markdown(f"**Q{i+1}.** {question['question']}{marks}")
+        
+        # Display options with letters
+        for j, option in enumerate(question['options']):
+            letter = chr(65 + j)  # A, B, C, D...
+            is_correct = option == question['answer']
+            
+            # Only mark correct answer in the admin view
+            if is_correct:
+                st.markdown(f"**{letter}. {option}** ✓")
+            else:
+                st.markdown(f"{letter}. {option}")
+        st.markdown('</div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Add download capability
+    question_paper_json = json.dumps(questions, indent=2)
+    st.download_button(
+        label="Download Question Paper (JSON)",
+        data=question_paper_json,
+        file_name=f"question_paper_{paper_id}.json" if paper_id else "question_paper.json",
+        mime="application/json",
+        key=f"{key_prefix}_json_{paper_id}"
+    )
+    
+    # Create a printable version
+    printable = f"## {name}\n\n"
+    for i, question in enumerate(questions):
+        marks = f" ({marks_label(question['marks'])})" if "marks" in question else ""
+        printable += f"**Q{i+1}.** {question['question']}{marks}\n\n"
+        for j, option in enumerate(question['options']):
+            letter = chr(65 + j)
+            printable += f"{letter}. {option}\n"
+        printable += "\n"
+    
+    st.download_button(
+        label="Download Printable Version (Markdown)",
+        data=printable,
+        file_name=f"question_paper_{paper_id}.md" if paper_id else "question_paper.md",
+        mime="text/markdown",
+        key=f"{key_prefix}_md_{paper_id}"
+    )
+
 # ---- QUESTION PAPERS TAB ----
 with tab4:
     st.header("Question Paper Generation")
@@ -1825,6 +2236,11 @@ with tab4:
                     except:
                         pass
                     
+                    # Prefer the topics indexed from the document's sections
+                    indexed_topics = db.get_document_topics(selected_doc_id)
+                    if indexed_topics:
+                        topics = indexed_topics
+                    
                     # Add a default "All Topics" option
                     if topics:
                         topics = ["All Topics"] + topics
@@ -1846,96 +2262,124 @@ with tab4:
                     
                     # Filter content based on selected topics
                     filtered_text = text_content
-                    if "All Topics" not in selected_topics and topics and len(topics) > 1:
-                        try:
-                            # Try to extract only the sections related to selected topics
-                            # This is a simplified approach - would need more sophistication for actual topic filtering
-                            filtered_sections = []
-                            
-                            # If we have JSON data, try to filter based on topics
-                            if text_content.strip().startswith('{') and text_content.strip().endswith('}'):
-                                ocr_data = json.loads(text_content)
-                                if 'text' in ocr_data:
-                                    # Extract just the text for now - more sophisticated filtering could be added
-                                    filtered_text = ocr_data.get('text', '')
-                        except:
-                            # Fall back to full text if filtering fails
-                            filtered_text = text_content
+                    try:
+                        if text_content.strip().startswith('{') and text_content.strip().endswith('}'):
+                            ocr_data = json.loads(text_content)
+                            if 'text' in ocr_data:
+                                filtered_text = ocr_data.get('text', '')
+                    except:
+                        pass
+                    
+                    # Keep only the sections indexed under the selected topics
+                    topic_text = text_for_topics(selected_doc_id, selected_topics)
+                    if topic_text:
+                        st.caption(f"Using {len(topic_text.split())} of {len(filtered_text.split())} words for the selected topics.")
+                        filtered_text = topic_text
+                    elif "All Topics" not in selected_topics:
+                        st.info("No indexed sections match the selected topics, using the full document.")
                 st.markdown('</div>', unsafe_allow_html=True)
                 
                 # Question paper generation modes
                 st.markdown('<div class="qp-options">', unsafe_allow_html=True)
                 st.subheader("Question Paper Settings")
                 
-                # Remove the mode selection radio buttons and keep only number of questions
-                num_questions = st.slider("Number of Questions", min_value=5, max_value=30, value=10, step=1)
+                # Papers are assembled from stored questions under the mode's constraints
+                paper_mode = st.selectbox(
+                    "Paper Mode",
+                    options=list(PAPER_MODES),
+                    format_func=lambda mode: PAPER_MODES[mode]["label"],
+                    key="paper_mode",
+                    help="Basic: 1-mark MCQs. Advanced: MCQ and true/false, marks by difficulty, every topic covered. "
+                         "Exam: as Advanced, under a time limit."
+                )
+                mode_settings = PAPER_MODES[paper_mode]
+                marks_col, time_col = st.columns(2)
+                with marks_col:
+                    total_marks = st.number_input("Total Marks", min_value=1, max_value=200,
+                                                  value=mode_settings["total_marks"], key=f"paper_marks_{paper_mode}")
+                with time_col:
+                    time_limit = st.number_input("Time Limit (minutes, 0 for none)", min_value=0, max_value=300,
+                                                 value=mode_settings["time_limit_minutes"] or 0,
+                                                 key=f"paper_time_{paper_mode}")
+                
+                num_questions = st.slider("Number of Questions (generated papers)", min_value=5, max_value=30, value=10, step=1)
+                fresh_paper = st.checkbox(
+                    "Generate fresh questions",
+                    help="Ignore a cached paper generated earlier from the same document and settings",
+                    key="fresh_paper"
+                )
+                paper_context = CONTEXT_POLICY_LABELS[st.selectbox(
+                    "Context",
+                    options=list(CONTEXT_POLICY_LABELS.keys()),
+                    key="paper_context",
+                    help="What the model reads: the document text, its stored summary, or the summary plus "
+                         "the key passages of each topic. Auto uses the full text when it fits the budget."
+                )]
                 
                 st.markdown('</div>', unsafe_allow_html=True)
                 
+                assemble_col, generate_col = st.columns(2)
+                with assemble_col:
+                    assemble_clicked = st.button("Assemble from Question Bank", type="primary",
+                                                 help="Select stored questions to fit the mode, without calling the model")
+                with generate_col:
+                    generate_clicked = st.button("Generate Question Paper")
+                
+                if assemble_clicked:
+                    paper = assemble_for_document(
+                        db, selected_doc_id, paper_mode, selected_topics,
+                        total_marks=int(total_marks), time_limit_minutes=time_limit or None
+                    )
+                    if paper["questions"]:
+                        st.session_state["paper_id"] = save_paper(db, selected_doc_id, paper["questions"], paper["settings"])
+                        st.success(f"Question paper saved (ID: {st.session_state['paper_id']})")
+                    else:
+                        st.error("No stored questions fit this paper. Generate a quiz or paper for the document first.")
+                
                 # Generate button
-                if st.button("Generate Question Paper", type="primary"):
+                if generate_clicked:
                     with st.spinner("Generating question paper..."):
                         try:
                             # Topic string for Qgen
                             topic_string = ", ".join(selected_topics) if "All Topics" not in selected_topics else "All Topics"
                             
-                            # Use the Qgen module to generate questions
-                            generated_questions = generate_quiz(filtered_text, topic_string, num_questions)
+                            filtered_text, token_stats = compact_for_prompt(
+                                selected_doc_id, filtered_text, "question_paper", PAPER_PROMPT_TOKENS,
+                                selected_topics, paper_context
+                            )
+                            st.caption(f"Prompt text ({token_stats['context_policy']}): {token_stats['tokens_before']:,} → "
+                                       f"{token_stats['tokens_after']:,} estimated tokens")
                             
-                            if generated_questions and len(generated_questions) > 0:
-                                # Save to file for reference
-                                save_quiz_to_file(generated_questions, "question_paper.json")
-                                
-                                # Display the generated question paper
-                                st.markdown('<div class="qp-container">', unsafe_allow_html=True)
-                                st.markdown(f'<div class="qp-title">Question Paper ({len(generated_questions)} Questions)</div>', unsafe_allow_html=True)
-                                
-                                # Format the questions nicely
-                                for i, question in enumerate(generated_questions):
-                                    st.markdown(f'<div class="qp-question">', unsafe_allow_html=True)
-                                    st.markdown(f"**Q{i+1}.** {question['question']}")
-                                    
-                                    # Display options with letters
-                                    for j, option in enumerate(question['options']):
-                                        letter = chr(65 + j)  # A, B, C, D...
-                                        is_correct = option == question['answer']
-                                        
-                                        # Only mark correct answer in the admin view
-                                        if is_correct:
-                                            st.markdown(f"**{letter}. {option}** ✓")
-                                        else:
-                                            st.markdown(f"{letter}. {option}")
-                                    st.markdown('</div>', unsafe_allow_html=True)
-                                st.markdown('</div>', unsafe_allow_html=True)
-                                
-                                # Add download capability
-                                question_paper_json = json.dumps(generated_questions, indent=2)
-                                st.download_button(
-                                    label="Download Question Paper (JSON)",
-                                    data=question_paper_json,
-                                    file_name="question_paper.json",
-                                    mime="application/json"
-                                )
-                                
-                                # Create a printable version
-                                printable = f"## Question Paper\n\n"
-                                for i, question in enumerate(generated_questions):
-                                    printable += f"**Q{i+1}.** {question['question']}\n\n"
-                                    for j, option in enumerate(question['options']):
-                                        letter = chr(65 + j)
-                                        printable += f"{letter}. {option}\n"
-                                    printable += "\n"
-                                
-                                st.download_button(
-                                    label="Download Printable Version (Markdown)",
-                                    data=printable,
-                                    file_name="question_paper.md",
-                                    mime="text/markdown"
+                            # Use stored questions first; the Qgen module only generates the shortfall
+                            if fresh_paper:
+                                generated_questions = generate_quiz(filtered_text, topic_string, num_questions, use_cache=False)
+                            else:
+                                generated_questions, sources = build_quiz(
+                                    db, selected_doc_id, num_questions, filtered_text, topic_string, selected_topics
                                 )
+                                st.caption(f"{sources['from_bank']} from stored questions, "
+                                           f"{sources['generated']} newly generated")
+                            
+                            if generated_questions and len(generated_questions) > 0:
+                                # Each paper gets its own rows, so sessions never overwrite each other's papers
+                                st.session_state["paper_id"] = save_paper(db, selected_doc_id, generated_questions, {
+                                    "source": "generated",
+                                    "topics": selected_topics,
+                                    "num_questions": num_questions,
+                                    "context_policy": paper_context,
+                                    "fresh": fresh_paper,
+                                })
+                                st.success(f"Question paper saved (ID: {st.session_state['paper_id']})")
                             else:
                                 st.error("Failed to generate questions. Please try different settings or another document.")
                         except Exception as e:
                             st.error(f"Error generating question paper: {str(e)}")
+                
+                # The paper made last in this session, loaded back by its ID
+                current_paper = load_paper(db, st.session_state["paper_id"]) if st.session_state.get("paper_id") else None
+                if current_paper and current_paper["document_id"] == selected_doc_id:
+                    show_question_paper(current_paper["questions"], current_paper["settings"].get("report"),
+                                        current_paper["paper_id"])
             else:
                 st.warning("Selected document has no summary. Please generate a summary first.")
         else:
@@ -1948,10 +2392,11 @@ with tab4:
         try:
             # List existing question papers
             papers = db.cursor.execute('''
-                SELECT p.paper_id, d.document_id, d.original_file_url, p.created_at
+                SELECT p.paper_id, d.document_id, d.original_file_url, p.created_at, p.settings,
+                       (SELECT COUNT(*) FROM paper_questions WHERE paper_id = p.paper_id)
                 FROM question_papers p
                 JOIN documents d ON p.document_id = d.document_id
-                ORDER BY p.created_at DESC
+                ORDER BY p.created_at DESC, p.paper_id DESC
             ''').fetchall()
             
             if papers and len(papers) > 0:
@@ -1960,12 +2405,27 @@ with tab4:
                     paper_id = paper[0]
                     document_name = os.path.basename(paper[2]) if paper[2] else f"Document {paper[1]}"
                     created_at = paper[3]
+                    settings = json.loads(paper[4]) if paper[4] else {}
+                    mode = PAPER_MODES.get(settings.get("mode"), {}).get("label") or settings.get("source", "").title()
+                    details = ", ".join(part for part in (
+                        mode,
+                        f"{paper[5]} questions",
+                        f"{settings['total_marks']} marks" if settings.get("total_marks") else "",
+                    ) if part)
                     
-                    st.markdown(f"**Paper ID: {paper_id}** - {document_name} (Created: {created_at})")
+                    st.markdown(f"**Paper ID: {paper_id}** - {document_name} ({details}; Created: {created_at})")
                     
-                    if st.button(f"Delete Paper {paper_id}", key=f"del_paper_{paper_id}"):
-                        db.cursor.execute("DELETE FROM question_papers WHERE paper_id = ?", (paper_id,))
-                        db.conn.commit()
+                    view_col, delete_col = st.columns(2)
+                    with view_col:
+                        view_clicked = st.button(f"View Paper {paper_id}", key=f"view_paper_{paper_id}")
+                    with delete_col:
+                        delete_clicked = st.button(f"Delete Paper {paper_id}", key=f"del_paper_{paper_id}")
+                    if view_clicked:
+                        stored_paper = load_paper(db, paper_id)
+                        show_question_paper(stored_paper["questions"], stored_paper["settings"].get("report"), paper_id,
+                                            key_prefix="stored_paper")
+                    if delete_clicked:
+                        db.delete_question_paper(paper_id)
                         st.success(f"Question paper (ID: {paper_id}) deleted.")
                         st.rerun()
             else:
@@ -1973,6 +2433,77 @@ with tab4:
         except Exception as e:
             st.error(f"Error loading question papers: {str(e)}")
 
+    # Shuffled versions of a stored paper for exam halls
+    with st.expander("Paper Variants (Sets A, B, C...)", expanded=False):
+        try:
+            paper_ids = [row[0] for row in db.cursor.execute(
+                'SELECT paper_id FROM question_papers ORDER BY paper_id DESC'
+            ).fetchall()]
+            if paper_ids:
+                variant_paper_id = st.selectbox("Paper", options=paper_ids, format_func=lambda paper_id: f"Paper {paper_id}",
+                                                key="variant_paper")
+                sets_col, seed_col = st.columns(2)
+                with sets_col:
+                    variant_count = st.number_input("Number of Sets", min_value=2, max_value=1000, value=4,
+                                                    key="variant_count")
+                with seed_col:
+                    variant_seed = st.number_input("Seed (0 for random)", min_value=0, value=0, key="variant_seed",
+                                                   help="The same seed always gives the same sets")
+                student_labels = st.text_area(
+                    "Or one set per student",
+                    key="variant_students",
+                    help="One name or roll number per line; each student gets their own order"
+                )
+                shuffle_options = st.checkbox("Shuffle options too", value=True, key="variant_shuffle_options")
+
+                if st.button("Create Variants", key="create_variants"):
+                    _, created, seed = create_variants(
+                        db, variant_paper_id, int(variant_count),
+                        labels=student_labels.splitlines() if student_labels.strip() else None,
+                        seed=int(variant_seed) or None, shuffle_options=shuffle_options
+                    )
+                    st.success(f"Created {len(created)} variants of paper {variant_paper_id} (seed {seed})")
+
+                variant_paper, variants = load_variants(db, variant_paper_id)
+                if variants:
+                    labels = [variant["label"] for variant in variants]
+                    st.caption(f"{len(variants)} variants stored: {', '.join(labels[:10])}"
+                               + (", ..." if len(labels) > 10 else ""))
+                    keys_col, print_col = st.columns(2)
+                    with keys_col:
+                        st.download_button(
+                            label="Download Answer Keys (CSV)",
+                            data=answer_keys_csv(variant_paper, variants),
+                            file_name=f"answer_keys_{variant_paper_id}.csv",
+                            mime="text/csv",
+                            key="variant_keys"
+                        )
+                    with print_col:
+                        st.download_button(
+                            label="Download Printable Sets (Markdown)",
+                            data=printable_set(variant_paper, variants),
+                            file_name=f"question_paper_{variant_paper_id}_sets.md",
+                            mime="text/markdown",
+                            key="variant_printable"
+                        )
+
+                    # Grade a response sheet against its own set
+                    grade_label = st.selectbox("Set", options=labels, key="grade_label")
+                    response_sheet = st.text_input(
+                        "Answers",
+                        key="grade_answers",
+                        help="One letter per question in the order of the set, '-' for a blank, e.g. CAB-D"
+                    )
+                    if st.button("Grade", key="grade_response") and response_sheet.strip():
+                        variant = variants[labels.index(grade_label)]
+                        result = grade_response(variant_paper, variant, response_sheet.strip().replace(" ", ""))
+                        st.metric("Score", f"{result['marks']}/{result['max_marks']} marks",
+                                  f"{result['correct']} of {result['total']} correct, {result['answered']} answered")
+            else:
+                st.info("No existing question papers found.")
+        except Exception as e:
+            st.error(f"Error creating paper variants: {str(e)}")
+
 # ---- CHATBOT TAB ----
 with tab5:
     st.header("Learning Assistant")
@@ -0,0 +1,127 @@
+# Per-call overhead of building a new Gemini client for every request versus
+# reusing the shared client from gemini_client, measured against a local
+# stand-in server so the numbers exclude model latency:
+#
+#     python benchmarks/client_overhead.py --calls 200
+#
+# The stand-in speaks plain HTTP, so the "new client" numbers do not include
+# the TLS handshake a real call to generativelanguage.googleapis.com pays on
+# every new connection; the real-world gap is larger.
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gemini_client  # noqa: E402
+
+MODEL = "gemini-2.5-flash-preview-04-17"
+RESPONSE = {
+    "candidates": [
+        {"content": {"role": "model", "parts": [{"text": "ok"}]}, "finishReason": "STOP"}
+    ]
+}
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers generateContent and streamGenerateContent with a fixed reply."""
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this Nagle's algorithm
+    # adds ~40 ms to every response on a kept-alive connection
+    disable_nagle_algorithm = True
+    connections = 0
+    connections_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StandInHandler.connections_lock:
+            StandInHandler.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if ":streamGenerateContent" in self.path:
+            body = f"data: {json.dumps(RESPONSE)}\r\n\r\n".encode()
+            content_type = "text/event-stream"
+        else:
+            body = json.dumps(RESPONSE).encode()
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stand_in():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def call(get):
+    """Time one call, including whatever it costs to obtain the client."""
+    start = time.perf_counter()
+    # Keep a reference: a dropped genai.Client closes its HTTP pool mid-call
+    client = get()
+    client.models.generate_content(model=MODEL, contents="ping")
+    return (time.perf_counter() - start) * 1000
+
+def summarize(name, timings, connections, wall_seconds):
+    timings = sorted(timings)
+    p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+    print(f"{name:<28} mean {statistics.mean(timings):7.2f} ms   p50 {statistics.median(timings):7.2f} ms   "
+          f"p95 {p95:7.2f} ms   {len(timings) / wall_seconds:8.1f} calls/s   {connections:4d} connections")
+
+def run(name, fn):
+    StandInHandler.connections = 0
+    start = time.perf_counter()
+    timings = fn()
+    summarize(name, timings, StandInHandler.connections, time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Gemini client reuse against a local stand-in server.")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    server = start_stand_in()
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault("GEMINI_API_KEY", "stand-in")
+    gemini_client.reset_clients()
+
+    # Warm up imports and the shared pool
+    call(gemini_client.get_client)
+
+    run("new client per call", lambda: [call(gemini_client.new_client) for _ in range(args.calls)])
+    run("shared client", lambda: [call(gemini_client.get_client) for _ in range(args.calls)])
+
+    def threaded():
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            return list(pool.map(lambda _: call(gemini_client.get_client), range(args.calls)))
+    run(f"shared client, {args.threads} threads", threaded)
+
+    async def async_calls():
+        async def one():
+            start = time.perf_counter()
+            await gemini_client.get_async_client().models.generate_content(model=MODEL, contents="ping")
+            return (time.perf_counter() - start) * 1000
+        semaphore = asyncio.Semaphore(args.threads)
+        async def bounded():
+            async with semaphore:
+                return await one()
+        return await asyncio.gather(*(bounded() for _ in range(args.calls)))
+    run(f"shared async client, {args.threads} tasks", lambda: asyncio.run(async_calls()))
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Compare prompt context policies (full text, summary only, hybrid) for quiz
+# generation on the documents of a database that have a stored summary:
+#
+#     python benchmarks/context_policy.py --db edumate.db --questions 5
+#     python benchmarks/context_policy.py --db edumate.db --live     # real API
+#
+# For each policy it reports the context size, generation latency and three
+# quality proxies that need no model to grade them:
+#   term recall  share of the document's 20 most distinctive terms present in the context
+#   coverage     share of the document's topics that at least one question is about
+#   grounding    share of questions whose answer's words all occur in the document
+# Without --live the Gemini stand-in answers (synthetic, "typical" profile), so
+# latency follows prompt size but the quality figures only reflect the context.
+
+import argparse
+import math
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+POLICIES = ("full", "summary", "hybrid")
+_WORD = re.compile(r"[a-z][a-z0-9]{3,}")
+
+def configure(args, scratch):
+    os.environ.update({
+        "LLM_CACHE_PATH": os.path.join(scratch, "cache.db"),
+        "LLM_RATE_LIMIT_PATH": os.path.join(scratch, "rate_limit.db"),
+        "LLM_TELEMETRY_PATH": os.path.join(scratch, "telemetry.db"),
+    })
+    if not args.live:
+        os.environ.update({
+            "GEMINI_STANDIN": "synthetic",
+            "GEMINI_STANDIN_PROFILE": args.profile,
+            "GEMINI_STANDIN_SEED": str(args.seed),
+            "GEMINI_REQUESTS_PER_MINUTE": "6000",
+        })
+        os.environ.pop("GEMINI_BASE_URL", None)
+
+def distinctive_terms(text, corpus, count=20):
+    """The terms of a document with the highest tf-idf against the other documents."""
+    words = Counter(_WORD.findall(text.lower()))
+    documents = [set(_WORD.findall(other.lower())) for other in corpus]
+    def score(word):
+        frequency = sum(1 for other in documents if word in other)
+        return words[word] * math.log(1 + len(documents) / max(1, frequency))
+    return sorted(words, key=score, reverse=True)[:count]
+
+def document_text(raw):
+    """The plain text of a stored document, unwrapping OCR JSON."""
+    import json
+    if raw and raw.strip().startswith("{") and raw.strip().endswith("}"):
+        try:
+            return json.loads(raw).get("text", raw)
+        except (ValueError, AttributeError):
+            pass
+    return raw or ""
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark full, summary and hybrid quiz prompt context.")
+    parser.add_argument("--db", default=os.path.join(ROOT, "edumate.db"))
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=None, help="Token budget (default: QUIZ_PROMPT_TOKENS)")
+    parser.add_argument("--live", action="store_true", help="Call the real Gemini API")
+    parser.add_argument("--profile", default="typical", help="Stand-in latency profile when not --live")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp(prefix="context_policy_")
+    configure(args, scratch)
+    # Work on a copy: select_context records prompt token stats in the database
+    db_path = os.path.join(scratch, "bench.db")
+    shutil.copy(args.db, db_path)
+
+    from context_selection import select_context
+    from database import Database
+    from prompt_compaction import QUIZ_PROMPT_TOKENS
+    from Qgen import generate_quiz
+
+    budget = args.budget or QUIZ_PROMPT_TOKENS
+    db = Database(db_path)
+    rows = db.cursor.execute('''
+        SELECT d.document_id, d.text_content FROM documents d
+        WHERE d.text_content IS NOT NULL AND d.text_content != ''
+          AND EXISTS (SELECT 1 FROM summaries s WHERE s.document_id = d.document_id)
+    ''').fetchall()
+    documents = [(document_id, document_text(raw)) for document_id, raw in rows]
+    documents = [(document_id, text) for document_id, text in documents if text.strip()]
+    if not documents:
+        print("No documents with both text and a stored summary.")
+        return 1
+    corpus = [text for _, text in documents]
+
+    results = {policy: {"tokens": [], "latency": [], "recall": [], "coverage": [], "grounding": []}
+               for policy in POLICIES}
+    for document_id, text in documents:
+        terms = distinctive_terms(text, corpus)
+        topics = db.get_document_topics(document_id)
+        document_words = set(_WORD.findall(text.lower()))
+        pages = [page[3] for page in db.get_document_pages(document_id)]
+        for policy in POLICIES:
+            context, stats = select_context(db, document_id, text, None, policy, budget, pages)
+            start = time.perf_counter()
+            questions = generate_quiz(context, None, args.questions, use_cache=False) or []
+            latency = time.perf_counter() - start
+
+            result = results[policy]
+            result["tokens"].append(stats["tokens_after"])
+            result["latency"].append(latency)
+            context_lower = context.lower()
+            result["recall"].append(sum(1 for term in terms if term in context_lower) / max(1, len(terms)))
+            question_text = " ".join(f"{q['question']} {q.get('topic') or ''}" for q in questions).lower()
+            if topics:
+                covered = sum(1 for topic in topics
+                              if set(_WORD.findall(topic.lower())) & set(_WORD.findall(question_text)))
+                result["coverage"].append(covered / len(topics))
+            if questions:
+                grounded = sum(1 for q in questions if set(_WORD.findall(q["answer"].lower())) <= document_words)
+                result["grounding"].append(grounded / len(questions))
+
+    mean = lambda values: statistics.mean(values) if values else float("nan")
+    print(f"{len(documents)} documents, {args.questions} questions each, budget {budget} tokens, "
+          f"{'live API' if args.live else 'stand-in ' + args.profile}\n")
+    print(f"{'policy':<9}{'tokens':>9}{'latency p50':>13}{'term recall':>13}{'coverage':>10}{'grounding':>11}")
+    for policy in POLICIES:
+        result = results[policy]
+        print(f"{policy:<9}{mean(result['tokens']):>9.0f}{statistics.median(result['latency']):>12.2f}s"
+              f"{mean(result['recall']):>13.2f}{mean(result['coverage']):>10.2f}{mean(result['grounding']):>11.2f}")
+    db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# Near-duplicate lookup latency against a large question index, using a
+# throwaway database filled with synthetic questions:
+#
+#     python benchmarks/dedup_lookup.py --questions 100000 --documents 50
+#
+# Reports the time to compute a signature and the time for the indexed
+# candidate lookup separately, for paraphrased (hit) and unrelated (miss) queries.
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dedup  # noqa: E402
+from database import Database  # noqa: E402
+
+VOCABULARY = [f"term{i}" for i in range(5000)]
+
+def synthetic_question(rng):
+    words = rng.sample(VOCABULARY, 9)
+    return "What is the relation between " + " ".join(words[:7]) + "?", " ".join(words[7:])
+
+def paraphrase(question, rng):
+    words = question.rstrip("?").split()
+    words[rng.randrange(5, len(words))] = rng.choice(VOCABULARY)
+    return "Which " + " ".join(words[1:]) + "?"
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time near-duplicate lookups against a synthetic index.")
+    parser.add_argument("--questions", type=int, default=100000, help="Questions in the index")
+    parser.add_argument("--documents", type=int, default=50, help="Documents the questions are spread over")
+    parser.add_argument("--lookups", type=int, default=1000, help="Lookups to time")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(7)
+    path = os.path.join(tempfile.mkdtemp(), "dedup_bench.db")
+    db = Database(path)
+
+    start = time.perf_counter()
+    stored = []
+    # One quiz per document holds the questions; lookups only match questions that exist
+    db.cursor.executemany('INSERT INTO quizzes (quiz_id, document_id) VALUES (?, ?)',
+                          [(document_id, document_id) for document_id in range(1, args.documents + 1)])
+    for question_id in range(1, args.questions + 1):
+        document_id = rng.randint(1, args.documents)
+        question, answer = synthetic_question(rng)
+        db.cursor.execute('INSERT INTO quiz_questions (question_id, quiz_id, question_text, correct_option) '
+                          'VALUES (?, ?, ?, ?)', (question_id, document_id, question, answer))
+        dedup.index_question(db, 'quiz', question_id, document_id, question, answer, commit=False)
+        if question_id <= args.lookups:
+            stored.append((document_id, question, answer))
+    db.conn.commit()
+    print(f"Indexed {args.questions} questions in {time.perf_counter() - start:.1f}s")
+
+    for label, queries in (
+        ("paraphrase", [(d, paraphrase(q, rng), a) for d, q, a in stored]),
+        ("unrelated", [(rng.randint(1, args.documents), *synthetic_question(rng)) for _ in stored]),
+    ):
+        signing, lookup = [], []
+        hits = 0
+        for document_id, question, answer in queries:
+            t0 = time.perf_counter()
+            sig = dedup.signature(dedup.question_text(question, answer))
+            t1 = time.perf_counter()
+            hits += dedup.find_near_duplicate(db, question, answer, document_id, sig=sig) is not None
+            t2 = time.perf_counter()
+            signing.append((t1 - t0) * 1000)
+            lookup.append((t2 - t1) * 1000)
+        print(f"{label:>10}: {hits}/{len(queries)} flagged | signature p50 {statistics.median(signing):.3f} ms"
+              f" | lookup p50 {statistics.median(lookup):.3f} ms, p99 {percentile(lookup, 0.99):.3f} ms")
+
+    db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
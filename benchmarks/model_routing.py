@@ -0,0 +1,94 @@
+# Compare quiz latency with a fixed model against latency-aware routing when
+# one model tier is slow or stalls, using the Gemini stand-in:
+#
+#     python benchmarks/model_routing.py --calls 40 --flash-profile slow
+#     python benchmarks/model_routing.py --flash-profile stall --timeout 2
+#
+# "fixed" sends every request to the flash tier, as the app did before routing;
+# "routed" uses the quiz route flash -> lite with the given p95 target and read
+# timeout. Telemetry goes to a temporary database and is summarised per model.
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# A stalled tier answers long after any sensible read timeout
+STALL_PROFILE = {"first_chunk_ms": 60000, "jitter": 0.0, "chunks": 1, "errors": {}}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark fixed-model against routed quiz generation.")
+    parser.add_argument("--calls", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--flash-profile", default="slow", help="Stand-in profile of the flash tier, or 'stall'")
+    parser.add_argument("--lite-profile", default="typical")
+    parser.add_argument("--target-ms", type=int, default=3000, help="p95 target of the quiz route")
+    parser.add_argument("--timeout", type=float, default=10, help="Read timeout of the flash tier in seconds")
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp(prefix="model_routing_")
+    flash_profile = args.flash_profile
+    if flash_profile == "stall":
+        flash_profile = os.path.join(scratch, "stall.json")
+        with open(flash_profile, "w", encoding="utf-8") as f:
+            json.dump(STALL_PROFILE, f)
+    os.environ.update({
+        "GEMINI_STANDIN": "synthetic",
+        "GEMINI_STANDIN_PROFILE": args.lite_profile,
+        "LLM_CACHE_PATH": os.path.join(scratch, "cache.db"),
+        "LLM_RATE_LIMIT_PATH": os.path.join(scratch, "rate_limit.db"),
+        "LLM_TELEMETRY_PATH": os.path.join(scratch, "telemetry.db"),
+        "GEMINI_REQUESTS_PER_MINUTE": "6000",
+        "MODEL_ROUTES": json.dumps({"quiz": {
+            "tiers": [["flash", None, args.timeout], ["lite", None, 60]],
+            "target_p95_ms": args.target_ms,
+        }}),
+    })
+    os.environ.pop("GEMINI_BASE_URL", None)
+
+    from model_routing import TIERS
+    os.environ["GEMINI_STANDIN_MODEL_PROFILES"] = f"{TIERS['flash']}={flash_profile},{TIERS['lite']}={args.lite_profile}"
+    import Qgen
+    import telemetry
+    from llm import generate_text
+    from model_routing import ROUTED
+
+    text = "Binary search trees keep keys in order so lookups halve the search space. " * 40
+
+    def run(model):
+        def one(index):
+            _, contents, config = Qgen._quiz_request(f"{text} ({model} {index})", "Trees", 5)
+            start = time.perf_counter()
+            try:
+                generate_text(model, contents, config, use_cache=False, operation="quiz")
+                return time.perf_counter() - start, None
+            except Exception as e:
+                return time.perf_counter() - start, e
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            return list(pool.map(one, range(args.calls)))
+
+    print(f"{args.calls} quizzes, concurrency {args.concurrency}, flash={args.flash_profile}, "
+          f"lite={args.lite_profile}, target p95 {args.target_ms}ms, flash timeout {args.timeout}s\n")
+    print(f"{'mode':<8}{'failed':>8}{'p50 s':>8}{'p95 s':>8}{'max s':>8}")
+    for mode, model in (("fixed", TIERS["flash"]), ("routed", ROUTED)):
+        results = run(model)
+        latencies = sorted(seconds for seconds, _ in results)
+        failed = sum(1 for _, error in results if error is not None)
+        print(f"{mode:<8}{failed:>8}{statistics.median(latencies):>8.2f}"
+              f"{telemetry.percentile(latencies, 0.95):>8.2f}{latencies[-1]:>8.2f}")
+
+    telemetry.get_writer().flush()
+    print(f"\n{'model':<34}{'calls':>7}{'errors':>8}{'fallbacks':>11}{'p95 ms':>9}")
+    for row in telemetry.latency_report(by_day=False, by_model=True):
+        print(f"{row['model']:<34}{row['calls']:>7}{row['errors']:>8}{row['fallbacks']:>11}{row['p95_ms'] or 0:>9}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
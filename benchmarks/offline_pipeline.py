@@ -0,0 +1,124 @@
+# Load-test the whole pipeline (OCR -> summaries -> quizzes -> chat turns)
+# without network access, against the Gemini stand-in:
+#
+#     python benchmarks/offline_pipeline.py --mode synthetic --profile typical --documents 8
+#     python benchmarks/offline_pipeline.py --mode replay --fixtures fixtures/gemini
+#
+# Fixtures for replay are recorded by running the app (or this script) once
+# with GEMINI_STANDIN=record and a real GEMINI_API_KEY. Cache, rate-limit and
+# telemetry databases go to a temporary directory, so runs do not touch the
+# app's files and every call reaches the stand-in. With the same --seed the
+# synthetic responses, delays and injected errors are the same on every run.
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def configure(args):
+    """Point every module at the stand-in and at throwaway state; must run before they are imported."""
+    scratch = tempfile.mkdtemp(prefix="offline_pipeline_")
+    os.environ.update({
+        "GEMINI_STANDIN": args.mode,
+        "GEMINI_STANDIN_FIXTURES": args.fixtures,
+        "GEMINI_STANDIN_SPEED": str(args.speed),
+        "GEMINI_STANDIN_SEED": str(args.seed),
+        "LLM_CACHE_PATH": os.path.join(scratch, "cache.db"),
+        "LLM_RATE_LIMIT_PATH": os.path.join(scratch, "rate_limit.db"),
+        "LLM_TELEMETRY_PATH": os.path.join(scratch, "telemetry.db"),
+        "GEMINI_REQUESTS_PER_MINUTE": str(args.requests_per_minute),
+        "GEMINI_BURST": str(args.concurrency),
+    })
+    if args.profile:
+        os.environ["GEMINI_STANDIN_PROFILE"] = args.profile
+    if args.fallback:
+        os.environ["GEMINI_STANDIN_FALLBACK"] = args.fallback
+    os.environ.pop("GEMINI_BASE_URL", None)
+    if args.mode != "record":
+        # The OCR module checks for a key itself; the stand-in ignores it
+        os.environ.setdefault("GEMINI_API_KEY", "stand-in")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the pipeline against the Gemini stand-in.")
+    parser.add_argument("--mode", choices=["synthetic", "replay", "record"], default="synthetic")
+    parser.add_argument("--profile", help="Latency/error profile (default: typical for synthetic, recorded timing for replay)")
+    parser.add_argument("--fixtures", default=os.path.join(ROOT, "fixtures", "gemini"))
+    parser.add_argument("--fallback", choices=["synthetic"], help="Replay: answer missing fixtures synthetically")
+    parser.add_argument("--pdf", default=os.path.join(ROOT, "ada_mod2.pdf"), help="PDF to OCR")
+    parser.add_argument("--documents", type=int, default=8, help="Documents pushed through the pipeline")
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--chat-turns", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--speed", type=float, default=1.0, help="Multiply stand-in delays")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests-per-minute", type=int, default=6000)
+    args = parser.parse_args(argv)
+    configure(args)
+
+    from gemini_client import get_client
+    from llm import tracked_call
+    from ocr import ocr_pdfs_many
+    from Qgen import generate_quizzes_many
+    from summerize import generate_summaries_many
+    import gemini_standin
+    import json
+    import telemetry
+
+    stages = []
+
+    def stage(name, run):
+        start = time.perf_counter()
+        results = run()
+        failed = sum(1 for result in results if isinstance(result, Exception) or result is None)
+        stages.append((name, len(results), failed, time.perf_counter() - start))
+        return results
+
+    ocr_results = stage("ocr", lambda: asyncio.run(
+        ocr_pdfs_many([args.pdf] * args.documents, args.concurrency, use_cache=False)))
+    documents = []
+    for result in ocr_results:
+        try:
+            documents.append(json.loads(result))
+        except (TypeError, ValueError):
+            continue
+
+    summaries = stage("summary", lambda: asyncio.run(generate_summaries_many(
+        [{"text": doc.get("text", ""), "subject": doc.get("subject"), "topics": doc.get("topics")}
+         for doc in documents], args.concurrency, use_cache=False)))
+
+    stage("quiz", lambda: asyncio.run(generate_quizzes_many(
+        [{"text": doc.get("text", ""), "topic": doc.get("subject")} for doc in documents],
+        args.questions, args.concurrency, use_cache=False)))
+
+    def chat():
+        session = get_client().chats.create(model="learnlm-2.0-flash-experimental")
+        replies = []
+        for turn in range(args.chat_turns):
+            message = f"Explain part {turn + 1} of {documents[0].get('subject') if documents else 'the notes'}"
+            replies.append(tracked_call("chat", "learnlm-2.0-flash-experimental",
+                                        lambda: session.send_message(message), message))
+        return replies
+    stage("chat", chat)
+
+    telemetry.get_writer().flush()
+    print(f"Stand-in mode {args.mode}, profile {args.profile or 'default'}, seed {args.seed}, "
+          f"{args.documents} documents, concurrency {args.concurrency}\n")
+    print(f"{'stage':<10}{'items':>7}{'failed':>8}{'wall s':>9}")
+    for name, items, failed, seconds in stages:
+        print(f"{name:<10}{items:>7}{failed:>8}{seconds:>9.2f}")
+
+    print(f"\n{'operation':<16}{'calls':>7}{'errors':>8}{'retries':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'first chunk':>13}")
+    for row in telemetry.latency_report(by_day=False):
+        print(f"{row['operation']:<16}{row['calls']:>7}{row['errors']:>8}{row['retries']:>9}"
+              f"{row['p50_ms'] or 0:>9}{row['p95_ms'] or 0:>9}{row['p99_ms'] or 0:>9}{row['first_chunk_p50_ms'] or 0:>13}")
+    if gemini_standin._server is not None:
+        print(f"\nStand-in: {json.dumps(gemini_standin._server.RequestHandlerClass.stand_in.stats)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+# Time the question paper assembler on synthetic question banks of growing
+# size and check how closely each mode's constraints are met:
+#
+#     python benchmarks/paper_assembly.py --sizes 100 1000 10000 --topics 8
+#
+# No database or model is involved; the bank is generated in memory with a
+# fixed seed, so runs are comparable.
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from paper_assembly import DIFFICULTIES, MODES, assemble_paper, paper_spec
+
+def synthetic_bank(size, topics, rng):
+    items = []
+    for index in range(size):
+        kind = "true_false" if rng.random() < 0.25 else "mcq"
+        topic = f"topic {rng.randrange(topics)}"
+        items.append({
+            "question": f"Question {index}",
+            "options": ["True", "False"] if kind == "true_false" else ["A", "B", "C", "D"],
+            "answer": "True" if kind == "true_false" else "A",
+            "topic": topic,
+            "topic_key": topic,
+            "source": "quiz",
+            "question_id": index,
+            "type": kind,
+            "difficulty": rng.choices(DIFFICULTIES, weights=(5, 3, 2))[0],
+        })
+    return items
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the question paper assembler.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--topics", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(f"{'bank':>7} {'mode':<9}{'p50 ms':>8}{'max ms':>8}{'marks':>8}{'minutes':>9}{'problems':>10}")
+    for size in args.sizes:
+        items = synthetic_bank(size, args.topics, random.Random(size))
+        for mode in MODES:
+            spec = paper_spec(mode)
+            timings, problems = [], 0
+            for run in range(args.runs):
+                start = time.perf_counter()
+                paper = assemble_paper(items, spec, rng=random.Random(run))
+                timings.append((time.perf_counter() - start) * 1000)
+                problems += len(paper["report"]["problems"])
+            report = paper["report"]
+            print(f"{size:>7} {mode:<9}{statistics.median(timings):>8.2f}{max(timings):>8.2f}"
+                  f"{report['total_marks']:>5}/{report['target_marks']:<3}{report['minutes']:>8g}"
+                  f"{problems / args.runs:>10.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+# Time a variant set for a large exam hall: create and store the variants of
+# a paper, then load them back and produce answer keys, the printable set and
+# grades for one response sheet per variant:
+#
+#     python benchmarks/paper_variants.py --variants 1000 --questions 50
+#
+# Runs against a temporary database holding one synthetic paper.
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import Database
+from paper_assembly import save_paper
+from paper_variants import (answer_key, answer_keys_csv, create_variants, grade_response, load_variants,
+                            printable_set)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark variant sets of a question paper.")
+    parser.add_argument("--variants", type=int, default=1000)
+    parser.add_argument("--questions", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(prefix="paper_variants_"), "bench.db")
+    db = Database(path)
+    db.cursor.execute("INSERT INTO users (name, email, role) VALUES ('Bench', 'bench@example.com', 'teacher')")
+    db.cursor.execute("INSERT INTO documents (user_id, original_file_url, source_type) VALUES (1, 'bench.pdf', 'text')")
+    db.conn.commit()
+    questions = [{
+        "question": f"Question {number}: which statement about concept {number} is correct?",
+        "options": [f"Statement {letter} about concept {number}" for letter in "ABCD"],
+        "answer": f"Statement A about concept {number}",
+        "marks": 1 + number % 3,
+        "difficulty": "medium",
+    } for number in range(args.questions)]
+    paper_id = save_paper(db, 1, questions, {"source": "benchmark"})
+
+    timings = {}
+    start = time.perf_counter()
+    create_variants(db, paper_id, args.variants, seed=1)
+    timings["create and store"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    paper, variants = load_variants(db, paper_id)
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    keys = answer_keys_csv(paper, variants)
+    timings["answer keys"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    printable = printable_set(paper, variants)
+    timings["printable set"] = time.perf_counter() - start
+
+    # Each student answers their own variant, getting about 70% right
+    rng = random.Random(2)
+    sheets = []
+    for variant in variants:
+        key = answer_key(paper, variant)
+        sheets.append("".join(letter if rng.random() < 0.7 else rng.choice("ABCD") for letter in key))
+    start = time.perf_counter()
+    grades = [grade_response(paper, variant, sheet) for variant, sheet in zip(variants, sheets)]
+    timings["grading"] = time.perf_counter() - start
+
+    stored = db.cursor.execute("SELECT SUM(LENGTH(question_order) + LENGTH(option_orders)) FROM paper_variants").fetchone()[0]
+    db.close()
+
+    print(f"{len(variants)} variants of a {args.questions}-question paper\n")
+    for step, seconds in timings.items():
+        print(f"{step:<18}{seconds * 1000:>9.1f} ms")
+    print(f"\nstored permutations {stored / 1024:.1f} KiB, answer keys {len(keys) / 1024:.1f} KiB, "
+          f"printable set {len(printable) / 1024 / 1024:.1f} MiB")
+    print(f"mean score {sum(g['correct'] for g in grades) / len(grades):.1f}/{args.questions}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+# Time prompt compaction on synthetic documents of different shapes and check
+# that every result is non-empty and within its token budget:
+#
+#     python benchmarks/prompt_compaction.py --chars 65000 --budget 8000
+#
+# Shapes: notes with headings and blank-line paragraphs, OCR text with single
+# newlines and no blank lines, and one run-on line. The exit status is 1 when
+# any shape comes back empty or over budget.
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from prompt_compaction import compact_text
+
+WORDS = ("photosynthesis chlorophyll light energy glucose oxygen carbon dioxide stomata membrane "
+         "respiration enzyme mitochondria nucleus protein diffusion osmosis transpiration xylem phloem").split()
+
+def sentence(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + "."
+
+def synthetic_documents(chars, rng):
+    lines = []
+    while sum(len(line) + 1 for line in lines) < chars:
+        lines.append(sentence(rng))
+    paragraphs = []
+    for start in range(0, len(lines), 6):
+        if start % 60 == 0:
+            paragraphs.append(f"## Topic {start // 60 + 1}")
+        paragraphs.append(" ".join(lines[start:start + 6]))
+    return {
+        "paragraphs": "\n\n".join(paragraphs),
+        "ocr_lines": "\n".join(lines),
+        "run_on": " ".join(lines),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark and check prompt compaction.")
+    parser.add_argument("--chars", type=int, default=65000, help="Size of each synthetic document")
+    parser.add_argument("--budget", type=int, nargs="+", default=[8000, 2000, 100])
+    args = parser.parse_args(argv)
+
+    failures = 0
+    print(f"{'shape':<12}{'budget':>8}{'before':>9}{'after':>8}{'passages':>10}{'ms':>8}  check")
+    for shape, text in synthetic_documents(args.chars, random.Random(args.chars)).items():
+        for budget in args.budget:
+            start = time.perf_counter()
+            compacted, stats = compact_text(text, budget)
+            elapsed = (time.perf_counter() - start) * 1000
+            problem = "empty" if not compacted.strip() else "over budget" if stats["tokens_after"] > budget else ""
+            failures += bool(problem)
+            kept = f"{stats['passages_kept']}/{stats['passages_total']}" if stats["passages_total"] else "-"
+            print(f"{shape:<12}{budget:>8}{stats['tokens_before']:>9}{stats['tokens_after']:>8}{kept:>10}"
+                  f"{elapsed:>8.1f}  {problem or 'ok'}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
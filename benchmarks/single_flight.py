@@ -0,0 +1,111 @@
+# Simulate a classroom burst: many students click "Summarize Document" or
+# "Generate Quiz" for the same document at the same moment, spread over
+# several worker processes, and count the model calls that reach the Gemini
+# stand-in with and without single-flight coalescing:
+#
+#     python benchmarks/single_flight.py --students 30 --processes 3
+#
+# Every run starts with an empty response cache, so without coalescing each
+# concurrent request is a cache miss and calls the model.
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEXT = ("Dynamic programming solves problems by combining the solutions of overlapping subproblems. "
+        "Memoization stores each subproblem's answer the first time it is computed. ") * 60
+
+def burst(operation, students, coalesced, barrier, latencies):
+    """Run one student's request per thread, all released at once."""
+    from Qgen import generate_quiz
+    from single_flight import coalesce
+    from summerize import generate_summary
+
+    def request():
+        if operation == "summary":
+            return generate_summary(TEXT, subject="Algorithms")
+        return generate_quiz(TEXT, "Dynamic programming", 5)
+
+    def student():
+        barrier.wait()
+        start = time.perf_counter()
+        if coalesced:
+            coalesce(operation, 1, {"bench": True}, request)
+        else:
+            request()
+        latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=student) for _ in range(students)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def worker(environment, operation, students, coalesced, barrier, results):
+    os.environ.update(environment)
+    latencies = []
+    burst(operation, students, coalesced, barrier, latencies)
+    results.extend(latencies)
+
+def run(args, operation, coalesced, base_url):
+    scratch = tempfile.mkdtemp(prefix="single_flight_")
+    environment = {
+        "GEMINI_BASE_URL": base_url,
+        "GEMINI_API_KEY": "stand-in",
+        "GEMINI_REQUESTS_PER_MINUTE": "60000",
+        "GEMINI_BURST": "1000",
+        "LLM_CACHE_PATH": os.path.join(scratch, "cache.db"),
+        "LLM_RATE_LIMIT_PATH": os.path.join(scratch, "rate_limit.db"),
+        "LLM_TELEMETRY_PATH": os.path.join(scratch, "telemetry.db"),
+        "LLM_FLIGHTS_PATH": os.path.join(scratch, "flights.db"),
+    }
+    context = multiprocessing.get_context("spawn")
+    manager = context.Manager()
+    barrier = manager.Barrier(args.students)
+    results = manager.list()
+    per_process = [args.students // args.processes + (1 if i < args.students % args.processes else 0)
+                   for i in range(args.processes)]
+    processes = [context.Process(target=worker, args=(environment, operation, count, coalesced, barrier, results))
+                 for count in per_process if count]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    latencies = sorted(results)
+    manager.shutdown()
+    return time.perf_counter() - start, latencies
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count model calls for a burst of identical requests.")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--profile", default="typical", help="Stand-in latency profile")
+    args = parser.parse_args(argv)
+
+    import gemini_standin
+
+    stand_in = gemini_standin.StandIn(mode="synthetic", profile=args.profile)
+    server = gemini_standin.start_server(stand_in)
+
+    print(f"{args.students} students over {args.processes} processes, stand-in profile {args.profile}\n")
+    print(f"{'operation':<10}{'coalesced':>10}{'model calls':>13}{'p50 s':>8}{'max s':>8}")
+    for operation in ("summary", "quiz"):
+        for coalesced in (False, True):
+            before = stand_in.stats["requests"]
+            _, latencies = run(args, operation, coalesced, server.base_url)
+            calls = stand_in.stats["requests"] - before
+            print(f"{operation:<10}{'yes' if coalesced else 'no':>10}{calls:>13}"
+                  f"{latencies[len(latencies) // 2]:>8.2f}{latencies[-1]:>8.2f}")
+    server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
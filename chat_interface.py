@@ -1,8 +1,10 @@
 import streamlit as st
 import os
 import re
-import google.generativeai as genai
+from google.genai import types
 from dotenv import load_dotenv
+from gemini_client import get_client
+from llm import tracked_call
 import requests
 import urllib.parse
 import json
@@ -10,12 +12,10 @@ import json
 # Load environment variables
 load_dotenv()
 
-# Get API keys
-gemini_api_key = os.environ.get("GEMINI_API_KEY")
+# Get API keys (the Gemini key is read by gemini_client)
 youtube_api_key = os.environ.get("YOUTUBE_API_KEY")
 
-# Configure the Gemini API
-genai.configure(api_key=gemini_api_key)
+CHAT_MODEL = "learnlm-2.0-flash-experimental"
 
 def search_youtube_videos(query, language, max_results=3):
     """Search for YouTube videos using direct API call or fallback to a simple search."""
@@ -142,19 +142,17 @@ def get_main_topic(text):
         return sorted_topics[0][0]  # Return the most frequent non-common word
     return None
 
-def initialize_chat_model():
-    """Initialize the LearnLM chat model"""
-    generation_config = genai.GenerationConfig(
+def start_chat_session():
+    """Start a LearnLM chat session on the shared Gemini client"""
+    generation_config = types.GenerateContentConfig(
         temperature=0.7,
         response_mime_type="text/plain",
     )
     
-    model = genai.GenerativeModel(
-        model_name="learnlm-2.0-flash-experimental",
-        generation_config=generation_config
+    return get_client().chats.create(
+        model=CHAT_MODEL,
+        config=generation_config
     )
-    
-    return model
 
 def create_chatbot_ui():
     """Create a Streamlit UI for the LearnLM chatbot styled like Gemini"""
@@ -364,9 +362,6 @@ def create_chatbot_ui():
         st.session_state.language_selected = False
         
     if "chat" not in st.session_state:
-        # Initialize the model and chat
-        model = initialize_chat_model()
-        
         # System instruction for the tutor behavior
         system_prompt = """Be a friendly, supportive tutor. Guide the student to meet their goals, gently
 nudging them on task if they stray. Ask guiding questions to help your students
@@ -378,10 +373,12 @@ once the student has shown evidence of understanding.
 Before starting ask the user their preferred language. (English, Kannada, Hinglish or Hindi)"""
 
         # Initialize the chat session
-        st.session_state.chat = model.start_chat()
+        st.session_state.chat = start_chat_session()
         
         # Send a system message to set up the behavior
-        initial_response = st.session_state.chat.send_message(system_prompt)
+        initial_response = tracked_call(
+            "chat", CHAT_MODEL, lambda: st.session_state.chat.send_message(system_prompt), system_prompt
+        )
         
         # Add the initial message to the chat history
         st.session_state.messages.append({"role": "assistant", "content": initial_response.text})
@@ -458,7 +455,9 @@ Before starting ask the user their preferred language. (English, Kannada, Hingli
             
             # Get response from model
             with st.spinner("Thinking..."):
-                response = st.session_state.chat.send_message(user_input)
+                response = tracked_call(
+                    "chat", CHAT_MODEL, lambda: st.session_state.chat.send_message(user_input), user_input
+                )
                 
             # Add assistant response to history
             st.session_state.messages.append({"role": "assistant", "content": response.text})
@@ -0,0 +1,82 @@
+import re
+
+# Rough size of a token for English notes; close enough to budget prompts
+# without calling the tokenizer endpoint
+CHARS_PER_TOKEN = 4
+
+_SECTION_BREAK = re.compile(r"\n(?=#{1,6} )")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a piece of text."""
+    if not text:
+        return 0
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+def _split_oversized(piece, max_tokens):
+    """Split a piece that is over budget on sentences, then on whitespace."""
+    if estimate_tokens(piece) <= max_tokens:
+        return [piece]
+    parts = _SENTENCE_BREAK.split(piece)
+    if len(parts) == 1:
+        # One huge run-on block (common in OCR output), cut on words
+        parts = piece.split()
+    if len(parts) == 1:
+        # No whitespace at all, cut at the character budget
+        size = max_tokens * CHARS_PER_TOKEN
+        return [piece[i:i + size] for i in range(0, len(piece), size)]
+    return _pack(parts, max_tokens, " ")
+
+def _pack(pieces, max_tokens, separator):
+    """Greedily pack pieces into chunks that stay within max_tokens."""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for piece in pieces:
+        piece = piece.strip()
+        if not piece:
+            continue
+        piece_tokens = estimate_tokens(piece)
+        if piece_tokens > max_tokens:
+            if current:
+                chunks.append(separator.join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized(piece, max_tokens))
+            continue
+        if current and current_tokens + piece_tokens > max_tokens:
+            chunks.append(separator.join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+def split_text(text, max_tokens):
+    """
+    Split text into chunks of at most max_tokens (estimated).
+    Markdown headings ("## Title", as written by sections_to_text) are preferred
+    as boundaries, then blank-line paragraphs, then sentences.
+
+    Args:
+        text (str): The text to split
+        max_tokens (int): Token budget per chunk
+
+    Returns:
+        list: The chunks, in document order
+    """
+    if not text or not text.strip():
+        return []
+    if estimate_tokens(text) <= max_tokens:
+        return [text.strip()]
+
+    chunks = []
+    for section in _SECTION_BREAK.split(text):
+        if estimate_tokens(section) <= max_tokens:
+            chunks.append(section.strip())
+        else:
+            chunks.extend(_pack(_PARAGRAPH_BREAK.split(section), max_tokens, "\n\n"))
+    # Merge neighbouring small sections back together so we don't send
+    # dozens of tiny prompts for a document with many short headings
+    return _pack(chunks, max_tokens, "\n\n")
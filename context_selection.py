@@ -0,0 +1,165 @@
+import re
+
+from chunking import estimate_tokens
+from prompt_compaction import compact_text, select_passages
+
+# Context policies for quiz and paper prompts:
+#   full     the document text, cleaned up and cut to the budget by passage selection
+#   summary  the stored summary: overview plus one entry per topic
+#   hybrid   the summary plus the most informative passages of each topic's sections
+#   auto     full when the cleaned text fits the budget, hybrid otherwise (full if there is no summary)
+POLICIES = ("auto", "full", "summary", "hybrid")
+DEFAULT_POLICY = "auto"
+
+# Below this many tokens a topic's share of the budget is not worth a passage
+MIN_PASSAGE_TOKENS = 150
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+
+def parse_stored_summary(summary_text):
+    """
+    Split a stored summary (as written by store_summary) into its parts.
+
+    Returns:
+        tuple: (overview text, [(topic name, topic text)])
+    """
+    overview, topics = [], []
+    section = None
+    for line in (summary_text or "").split("\n"):
+        heading = _HEADING.match(line.strip())
+        if heading and len(heading.group(1)) == 1:
+            section = heading.group(2).strip().lower()
+            continue
+        if heading and section == "topics":
+            topics.append([heading.group(2).strip(), []])
+            continue
+        if section == "topics" and topics:
+            topics[-1][1].append(line)
+        elif section == "topics" and line.strip().startswith("- "):
+            topics.append([line.strip()[2:].strip(), []])
+        else:
+            overview.append(line)
+    return (
+        "\n".join(overview).strip(),
+        [(name, "\n".join(lines).strip()) for name, lines in topics],
+    )
+
+def _topic_keys(db, topics):
+    return {db.topic_key(topic) for topic in topics or [] if topic and topic != "All Topics"}
+
+def summary_context(db, document_id, topics=None):
+    """
+    The stored summary of a document as prompt context, keeping only the
+    selected topics' entries when topics are given. The newest summary that
+    covers the selected topics (or the whole document, without topics) is used.
+    Returns None when there is no such summary or it has no entry for one of
+    the selected topics, so the caller falls back to the full text.
+    """
+    wanted = _topic_keys(db, topics)
+    summary_text = None
+    for text, covered in db.get_document_summaries(document_id):
+        # OCR stores a "Subject: ...\nTopics: ..." placeholder until a generated summary exists
+        if not text.startswith("# Summary"):
+            continue
+        if covered is None or (wanted and wanted <= _topic_keys(db, covered)):
+            summary_text = text
+            break
+    if summary_text is None:
+        return None
+    overview, summary_topics = parse_stored_summary(summary_text)
+    if wanted:
+        summary_topics = [(name, text) for name, text in summary_topics if db.topic_key(name) in wanted]
+        if {db.topic_key(name) for name, _ in summary_topics} != wanted:
+            return None
+
+    parts = []
+    if overview:
+        parts.append(f"# Overview\n\n{overview}")
+    for name, text in summary_topics:
+        parts.append(f"## {name}\n\n{text}" if text else f"## {name}")
+    return "\n\n".join(parts) or None
+
+def topic_passages(db, document_id, text, topics, max_tokens):
+    """
+    The most informative passages of each topic's indexed sections, sharing
+    max_tokens equally between topics. Without sections, passages are taken
+    from the whole text instead.
+    """
+    if max_tokens < MIN_PASSAGE_TOKENS:
+        return ""
+    wanted = _topic_keys(db, topics)
+    sections = db.get_sections_for_topics(document_id, wanted) if wanted else db.get_document_sections(document_id)
+
+    grouped = {}
+    for _, _, _, title, content, topic in sections:
+        block = f"{title}\n\n{content}" if title else content
+        grouped.setdefault(topic or "General", []).append(block)
+
+    if not grouped:
+        heading = "# Key Passages"
+        passages, _, _ = select_passages(text, max_tokens - estimate_tokens(heading) - 1)
+        return f"{heading}\n\n{passages}" if passages else ""
+
+    share = max_tokens // len(grouped)
+    parts = []
+    for topic, blocks in grouped.items():
+        if share < MIN_PASSAGE_TOKENS:
+            break
+        heading = f"# Key Passages: {topic}"
+        # The heading and the blank lines joining the parts count against the share
+        passages, _, _ = select_passages("\n\n".join(blocks), share - estimate_tokens(heading) - 1)
+        if passages:
+            parts.append(f"{heading}\n\n{passages}")
+    return "\n\n".join(parts)
+
+def select_context(db, document_id, text, topics=None, policy=DEFAULT_POLICY, max_tokens=None, pages=None):
+    """
+    Choose the document context for a quiz or paper prompt.
+
+    Args:
+        db (Database): Open database
+        document_id (int): Document the prompt is about
+        text (str): The document (or selected topics') text
+        topics (list, optional): Selected topics; narrows the summary and the passages
+        policy (str): One of POLICIES
+        max_tokens (int, optional): Token budget for the context
+        pages (list, optional): Page texts, used to strip running headers from the full text
+
+    Returns:
+        tuple: (context text, stats dict as returned by compact_text, plus
+                "context_policy" naming the policy actually used)
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown context policy {policy!r}; expected one of {', '.join(POLICIES)}")
+    full_text, stats = compact_text(text, max_tokens=max_tokens, pages=pages)
+
+    if policy == "auto":
+        fits = not max_tokens or stats["tokens_cleaned"] <= max_tokens
+        policy = "full" if fits else "hybrid"
+
+    context = None
+    if policy in ("summary", "hybrid"):
+        context = summary_context(db, document_id, topics)
+    if context is None:
+        # Without a stored summary every policy falls back to the full text
+        stats["context_policy"] = "full"
+        return full_text, stats
+
+    if max_tokens and estimate_tokens(context) > max_tokens:
+        context, _, _ = select_passages(context, max_tokens)
+
+    if policy == "hybrid":
+        # Never more than the cleaned full text would have cost
+        budget = min(max_tokens or stats["tokens_cleaned"], stats["tokens_cleaned"]) - estimate_tokens(context)
+        cleaned, _ = compact_text(text, pages=pages)
+        passages = topic_passages(db, document_id, cleaned, topics, budget)
+        if passages:
+            context = f"{context}\n\n{passages}"
+
+    stats["context_policy"] = policy
+    stats["tokens_after"] = estimate_tokens(context)
+    stats["chars_after"] = len(context)
+    stats["reduction"] = (
+        round(1 - stats["tokens_after"] / stats["tokens_before"], 3) if stats["tokens_before"] else 0.0
+    )
+    return context, stats
@@ -65,6 +65,8 @@ class Database:
                 quiz_id INTEGER NOT NULL,
                 question_text TEXT NOT NULL,
                 correct_option TEXT NOT NULL,
+                topic TEXT,
+                topic_key TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (quiz_id) REFERENCES quizzes(quiz_id) ON DELETE CASCADE
             )
@@ -123,6 +125,10 @@ class Database:
                 paper_id INTEGER NOT NULL,
                 question_text TEXT NOT NULL,
                 correct_option TEXT NOT NULL,
+                topic TEXT,
+                topic_key TEXT,
+                marks INTEGER,
+                difficulty TEXT,
                 FOREIGN KEY (paper_id) REFERENCES question_papers(paper_id) ON DELETE CASCADE
             )
         ''')
@@ -151,8 +157,158 @@ class Database:
             )
         ''')
         
+        # Document pages table
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS document_pages (
+                page_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id INTEGER NOT NULL,
+                page_number INTEGER NOT NULL,
+                text_content TEXT,
+                extraction_method TEXT CHECK(extraction_method IN ('text_layer', 'ocr')) NOT NULL,
+                confidence REAL,
+                extracted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (document_id, page_number),
+                FOREIGN KEY (document_id) REFERENCES documents(document_id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Document sections table
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS document_sections (
+                section_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                title TEXT,
+                content TEXT NOT NULL,
+                topic TEXT,
+                topic_key TEXT,
+                FOREIGN KEY (document_id) REFERENCES documents(document_id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Ingestion files table (bulk ingestion state, one row per distinct file content)
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ingestion_files (
+                file_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                content_hash TEXT UNIQUE NOT NULL,
+                file_path TEXT NOT NULL,
+                status TEXT CHECK(status IN ('pending', 'processing', 'done', 'failed')) NOT NULL DEFAULT 'pending',
+                method TEXT,
+                document_id INTEGER,
+                page_count INTEGER,
+                error TEXT,
+                attempts INTEGER DEFAULT 0,
+                latency_ms REAL,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                FOREIGN KEY (document_id) REFERENCES documents(document_id) ON DELETE SET NULL
+            )
+        ''')
+        
+        # Prompt token statistics (document text before and after compaction)
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS prompt_token_stats (
+                stat_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id INTEGER NOT NULL,
+                operation TEXT NOT NULL,
+                tokens_before INTEGER NOT NULL,
+                tokens_after INTEGER NOT NULL,
+                token_budget INTEGER,
+                lines_removed INTEGER,
+                passages_total INTEGER,
+                passages_kept INTEGER,
+                context_policy TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (document_id) REFERENCES documents(document_id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Question exposures table (questions served to a student, to avoid repeats)
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS question_exposures (
+                exposure_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                source TEXT CHECK(source IN ('quiz', 'paper')) NOT NULL,
+                question_id INTEGER NOT NULL,
+                served_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # MinHash signatures of stored questions, for near-duplicate detection
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS question_signatures (
+                source TEXT CHECK(source IN ('quiz', 'paper')) NOT NULL,
+                question_id INTEGER NOT NULL,
+                document_id INTEGER,
+                signature BLOB NOT NULL,
+                PRIMARY KEY (source, question_id)
+            )
+        ''')
+        
+        # LSH bands of the signatures; questions sharing a band key are duplicate candidates
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS question_lsh (
+                band_key INTEGER NOT NULL,
+                source TEXT NOT NULL,
+                question_id INTEGER NOT NULL,
+                document_id INTEGER
+            )
+        ''')
+        
+        # Processing jobs table (background stages run after a document is added)
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS processing_jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id INTEGER NOT NULL,
+                stage TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                status TEXT CHECK(status IN ('pending', 'running', 'done', 'skipped', 'failed')) NOT NULL DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                UNIQUE (document_id, stage),
+                FOREIGN KEY (document_id) REFERENCES documents(document_id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Paper variants table (question and option orders of one version of a paper)
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS paper_variants (
+                variant_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                paper_id INTEGER NOT NULL,
+                label TEXT NOT NULL,
+                seed INTEGER NOT NULL,
+                question_order BLOB NOT NULL,
+                option_orders BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (paper_id, label),
+                FOREIGN KEY (paper_id) REFERENCES question_papers(paper_id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Columns added after the first release
+        self._add_column_if_missing('quiz_questions', 'topic', 'TEXT')
+        self._add_column_if_missing('quiz_questions', 'topic_key', 'TEXT')
+        self._add_column_if_missing('paper_questions', 'topic', 'TEXT')
+        self._add_column_if_missing('paper_questions', 'topic_key', 'TEXT')
+        self._add_column_if_missing('prompt_token_stats', 'context_policy', 'TEXT')
+        self._add_column_if_missing('paper_questions', 'marks', 'INTEGER')
+        self._add_column_if_missing('paper_questions', 'difficulty', 'TEXT')
+        self._add_column_if_missing('processing_jobs', 'not_before', 'TIMESTAMP')
+        self._add_column_if_missing('documents', 'content_hash', 'TEXT')
+        # Set on paper questions taken from the bank: the (source, question_id) they copy
+        self._add_column_if_missing('paper_questions', 'bank_source', 'TEXT')
+        self._add_column_if_missing('paper_questions', 'bank_question_id', 'INTEGER')
+        # JSON list of the topics a summary was restricted to; NULL for the whole document
+        self._add_column_if_missing('summaries', 'topics', 'TEXT')
+        
         # Create indexes
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_documents_user ON documents(user_id)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(content_hash)')
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_summaries_doc ON summaries(document_id)')
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_quizzes_doc ON quizzes(document_id)')
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_questions_quiz ON quiz_questions(quiz_id)')
@@ -161,10 +317,24 @@ class Database:
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_attempts_user ON quiz_attempts(user_id)')
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_responses_attempt ON attempt_responses(attempt_id)')
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_papers_doc ON question_papers(document_id)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_paper_questions_paper ON paper_questions(paper_id)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_paper_options_question ON paper_options(paper_question_id)')
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_revision_user ON revision_queue(user_id)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_sections_doc_topic ON document_sections(document_id, topic_key)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_token_stats_doc ON prompt_token_stats(document_id)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_exposures_user ON question_exposures(user_id, served_at)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_lsh_band ON question_lsh(band_key, document_id)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_lsh_question ON question_lsh(source, question_id)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_processing_status ON processing_jobs(status, document_id)')
         
         self.conn.commit()
 
+    def _add_column_if_missing(self, table, column, definition):
+        """Add a column to a table created by an older version of the schema."""
+        columns = [row[1] for row in self.cursor.execute(f'PRAGMA table_info({table})')]
+        if column not in columns:
+            self.cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
     # User operations
     def add_user(self, name, email, role):
         """Add a new user to the database."""
@@ -190,23 +360,311 @@ class Database:
         return self.cursor.fetchall()
 
     # Document operations
-    def add_document(self, user_id, original_file_url, source_type, text_content=None):
-        """Add a new document."""
+    def add_document(self, user_id, original_file_url, source_type, text_content=None, content_hash=None, commit=True):
+        """Add a new document; content_hash is the SHA-256 of the file it came from, if known."""
         self.cursor.execute('''
-            INSERT INTO documents (user_id, original_file_url, source_type, text_content)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, original_file_url, source_type, text_content))
-        self.conn.commit()
-        return self.cursor.lastrowid
+            INSERT INTO documents (user_id, original_file_url, source_type, text_content, content_hash)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (user_id, original_file_url, source_type, text_content, content_hash))
+        document_id = self.cursor.lastrowid
+        if commit:
+            self.conn.commit()
+        return document_id
 
-    def update_document_processed(self, document_id):
+    def update_document_processed(self, document_id, commit=True):
         """Mark a document as processed."""
         self.cursor.execute('''
             UPDATE documents 
             SET processed_at = CURRENT_TIMESTAMP
             WHERE document_id = ?
         ''', (document_id,))
+        if commit:
+            self.conn.commit()
+
+    def update_document_text(self, document_id, text_content, commit=True):
+        """Replace the concatenated text content of a document."""
+        self.cursor.execute('''
+            UPDATE documents
+            SET text_content = ?
+            WHERE document_id = ?
+        ''', (text_content, document_id))
+        if commit:
+            self.conn.commit()
+
+    # Document page operations
+    def add_document_page(self, document_id, page_number, text_content, extraction_method, confidence=None, commit=True):
+        """Store the extracted text of a single page, replacing any earlier extraction."""
+        self.cursor.execute('''
+            INSERT INTO document_pages (document_id, page_number, text_content, extraction_method, confidence)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (document_id, page_number) DO UPDATE SET
+                text_content = excluded.text_content,
+                extraction_method = excluded.extraction_method,
+                confidence = excluded.confidence,
+                extracted_at = CURRENT_TIMESTAMP
+        ''', (document_id, page_number, text_content, extraction_method, confidence))
+        page_id = self.cursor.lastrowid
+        if commit:
+            self.conn.commit()
+        return page_id
+
+    def get_document_pages(self, document_id):
+        """Get all extracted pages of a document in page order."""
+        self.cursor.execute('''
+            SELECT page_id, document_id, page_number, text_content, extraction_method, confidence, extracted_at
+            FROM document_pages
+            WHERE document_id = ?
+            ORDER BY page_number
+        ''', (document_id,))
+        return self.cursor.fetchall()
+
+    def get_document_page(self, document_id, page_number):
+        """Get a single extracted page of a document."""
+        self.cursor.execute('''
+            SELECT page_id, document_id, page_number, text_content, extraction_method, confidence, extracted_at
+            FROM document_pages
+            WHERE document_id = ? AND page_number = ?
+        ''', (document_id, page_number))
+        return self.cursor.fetchone()
+
+    def get_processed_page_numbers(self, document_id, min_confidence=None):
+        """Get the page numbers already extracted for a document.
+
+        When min_confidence is given, pages extracted with a lower confidence
+        are treated as unprocessed so they can be retried (e.g. with OCR).
+        """
+        if min_confidence is None:
+            self.cursor.execute('''
+                SELECT page_number FROM document_pages WHERE document_id = ?
+            ''', (document_id,))
+        else:
+            self.cursor.execute('''
+                SELECT page_number FROM document_pages
+                WHERE document_id = ? AND COALESCE(confidence, 1.0) >= ?
+            ''', (document_id, min_confidence))
+        return {row[0] for row in self.cursor.fetchall()}
+
+    # Document section operations
+    @staticmethod
+    def topic_key(topic):
+        """Normalise a topic name for lookups."""
+        return " ".join(str(topic).split()).lower() if topic else None
+
+    def replace_document_sections(self, document_id, sections, commit=True):
+        """Replace the sections of a document.
+
+        sections is a list of (title, content, topic) tuples in document order.
+        Pass commit=False to make this part of the caller's transaction.
+        """
+        self.cursor.execute('DELETE FROM document_sections WHERE document_id = ?', (document_id,))
+        self.cursor.executemany('''
+            INSERT INTO document_sections (document_id, position, title, content, topic, topic_key)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (document_id, position, title, content, topic, self.topic_key(topic))
+            for position, (title, content, topic) in enumerate(sections)
+        ])
+        if commit:
+            self.conn.commit()
+
+    def get_document_sections(self, document_id):
+        """Get all sections of a document in document order."""
+        self.cursor.execute('''
+            SELECT section_id, document_id, position, title, content, topic
+            FROM document_sections
+            WHERE document_id = ?
+            ORDER BY position
+        ''', (document_id,))
+        return self.cursor.fetchall()
+
+    def get_document_topics(self, document_id):
+        """Get the distinct section topics of a document in order of first appearance."""
+        self.cursor.execute('''
+            SELECT topic
+            FROM document_sections
+            WHERE document_id = ? AND topic IS NOT NULL
+            GROUP BY topic_key
+            ORDER BY MIN(position)
+        ''', (document_id,))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def get_sections_for_topics(self, document_id, topics):
+        """Get the sections of a document that belong to any of the given topics."""
+        keys = [self.topic_key(topic) for topic in topics if topic]
+        if not keys:
+            return []
+        placeholders = ", ".join("?" for _ in keys)
+        self.cursor.execute(f'''
+            SELECT section_id, document_id, position, title, content, topic
+            FROM document_sections
+            WHERE document_id = ? AND topic_key IN ({placeholders})
+            ORDER BY position
+        ''', (document_id, *keys))
+        return self.cursor.fetchall()
+
+    # Ingestion operations
+    def get_ingestion_file(self, content_hash):
+        """Get the ingestion state of a file by content hash."""
+        self.cursor.execute('''
+            SELECT file_id, content_hash, file_path, status, method, document_id, page_count, error, attempts, latency_ms
+            FROM ingestion_files
+            WHERE content_hash = ?
+        ''', (content_hash,))
+        return self.cursor.fetchone()
+
+    def get_document_by_hash(self, content_hash):
+        """Get the latest document stored from a file as (document_id, processed_at), or None."""
+        self.cursor.execute('''
+            SELECT document_id, processed_at
+            FROM documents
+            WHERE content_hash = ?
+            ORDER BY document_id DESC
+            LIMIT 1
+        ''', (content_hash,))
+        return self.cursor.fetchone()
+
+    def start_ingestion(self, content_hash, file_path):
+        """Record that a file is being processed, registering it if it is new."""
+        self.cursor.execute('''
+            INSERT INTO ingestion_files (content_hash, file_path, status, attempts, started_at)
+            VALUES (?, ?, 'processing', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (content_hash) DO UPDATE SET
+                file_path = excluded.file_path,
+                status = 'processing',
+                error = NULL,
+                attempts = attempts + 1,
+                started_at = CURRENT_TIMESTAMP,
+                finished_at = NULL
+        ''', (content_hash, file_path))
+        self.conn.commit()
+
+    def finish_ingestion(self, content_hash, document_id, method, page_count, latency_ms):
+        """Mark a file as successfully ingested."""
+        self.cursor.execute('''
+            UPDATE ingestion_files
+            SET status = 'done', document_id = ?, method = ?, page_count = ?,
+                latency_ms = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE content_hash = ?
+        ''', (document_id, method, page_count, latency_ms, content_hash))
+        self.conn.commit()
+
+    def fail_ingestion(self, content_hash, error, latency_ms):
+        """Mark a file as failed so the next run retries it."""
+        self.cursor.execute('''
+            UPDATE ingestion_files
+            SET status = 'failed', error = ?, latency_ms = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE content_hash = ?
+        ''', (error, latency_ms, content_hash))
+        self.conn.commit()
+
+    # Processing job operations
+    def enqueue_processing(self, document_id, stages):
+        """
+        Queue background stages for a document, in the given order.
+        Stages already queued or finished for the document are left alone.
+        """
+        self.cursor.executemany('''
+            INSERT OR IGNORE INTO processing_jobs (document_id, stage, position)
+            VALUES (?, ?, ?)
+        ''', [(document_id, stage, position) for position, stage in enumerate(stages)])
+        self.conn.commit()
+
+    def claim_processing_job(self):
+        """
+        Take the next pending job whose earlier stages have all finished and
+        whose retry, if it failed before, is due. The status check in the UPDATE makes the claim safe across processes.
+
+        Returns:
+            tuple: (job_id, document_id, stage) or None if nothing is ready
+        """
+        candidates = self.cursor.execute('''
+            SELECT j.job_id, j.document_id, j.stage
+            FROM processing_jobs j
+            WHERE j.status = 'pending'
+              AND (j.not_before IS NULL OR j.not_before <= datetime('now'))
+              AND NOT EXISTS (SELECT 1 FROM processing_jobs e
+                              WHERE e.document_id = j.document_id AND e.position < j.position
+                                AND e.status IN ('pending', 'running'))
+            ORDER BY j.created_at, j.position
+            LIMIT 5
+        ''').fetchall()
+        for job in candidates:
+            self.cursor.execute('''
+                UPDATE processing_jobs
+                SET status = 'running', attempts = attempts + 1, started_at = CURRENT_TIMESTAMP, error = NULL
+                WHERE job_id = ? AND status = 'pending'
+            ''', (job[0],))
+            self.conn.commit()
+            if self.cursor.rowcount == 1:
+                return job
+        return None
+
+    def finish_processing_job(self, job_id, status, result=None, error=None, retry_in=None):
+        """
+        Record the outcome of a job: 'done', 'skipped' or 'failed', or 'pending'
+        to retry it, not before retry_in seconds from now.
+        """
+        not_before = f'+{int(retry_in)} seconds' if retry_in else None
+        self.cursor.execute('''
+            UPDATE processing_jobs
+            SET status = ?, result = ?, error = ?, finished_at = CURRENT_TIMESTAMP,
+                not_before = CASE WHEN ? IS NULL THEN NULL ELSE datetime('now', ?) END
+            WHERE job_id = ?
+        ''', (status, result, error, not_before, not_before, job_id))
+        self.conn.commit()
+
+    def requeue_stale_processing_jobs(self, max_age_seconds):
+        """Put jobs left 'running' by a worker that died back in the queue. Returns the count."""
+        self.cursor.execute('''
+            UPDATE processing_jobs
+            SET status = 'pending'
+            WHERE status = 'running' AND started_at < datetime('now', ?)
+        ''', (f'-{int(max_age_seconds)} seconds',))
+        self.conn.commit()
+        return self.cursor.rowcount
+
+    def get_processing_jobs(self, document_id=None):
+        """Get processing jobs as (job_id, document_id, stage, status, attempts, result, error, finished_at)."""
+        query = '''
+            SELECT job_id, document_id, stage, status, attempts, result, error, finished_at
+            FROM processing_jobs
+        '''
+        params = ()
+        if document_id is not None:
+            query += ' WHERE document_id = ?'
+            params = (document_id,)
+        query += ' ORDER BY document_id DESC, position'
+        self.cursor.execute(query, params)
+        return self.cursor.fetchall()
+
+    # Prompt token statistics
+    def add_prompt_token_stats(self, document_id, operation, stats, token_budget=None):
+        """Record the token counts of a document's text before and after prompt compaction."""
+        self.cursor.execute('''
+            INSERT INTO prompt_token_stats (document_id, operation, tokens_before, tokens_after,
+                                            token_budget, lines_removed, passages_total, passages_kept,
+                                            context_policy)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (document_id, operation, stats["tokens_before"], stats["tokens_after"], token_budget,
+              stats.get("lines_removed"), stats.get("passages_total"), stats.get("passages_kept"),
+              stats.get("context_policy")))
         self.conn.commit()
+        return self.cursor.lastrowid
+
+    def get_prompt_token_stats(self, document_id=None):
+        """Get per-document token totals: prompts, tokens before and after, and the saving."""
+        query = '''
+            SELECT document_id, operation, COUNT(*), SUM(tokens_before), SUM(tokens_after),
+                   ROUND(1.0 - CAST(SUM(tokens_after) AS REAL) / MAX(SUM(tokens_before), 1), 3)
+            FROM prompt_token_stats
+        '''
+        params = ()
+        if document_id is not None:
+            query += ' WHERE document_id = ?'
+            params = (document_id,)
+        query += ' GROUP BY document_id, operation ORDER BY document_id, operation'
+        self.cursor.execute(query, params)
+        return self.cursor.fetchall()
 
     # Quiz operations
     def create_quiz(self, document_id):
@@ -236,6 +694,182 @@ class Database:
         self.conn.commit()
         return question_id
 
+    def add_quiz_with_questions(self, document_id, questions):
+        """Create a quiz and all of its questions and options in one transaction.
+
+        questions is a list of (question_text, correct_option, options) or
+        (question_text, correct_option, options, topic) tuples.
+        Returns the new quiz_id.
+        """
+        try:
+            self.cursor.execute('INSERT INTO quizzes (document_id) VALUES (?)', (document_id,))
+            quiz_id = self.cursor.lastrowid
+            option_rows = []
+            for question_text, correct_option, options, *rest in questions:
+                topic = rest[0] if rest else None
+                self.cursor.execute('''
+                    INSERT INTO quiz_questions (quiz_id, question_text, correct_option, topic, topic_key)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (quiz_id, question_text, correct_option, topic, self.topic_key(topic)))
+                question_id = self.cursor.lastrowid
+                option_rows.extend((question_id, option) for option in options)
+            self.cursor.executemany('''
+                INSERT INTO question_options (question_id, option_text)
+                VALUES (?, ?)
+            ''', option_rows)
+            self.conn.commit()
+            return quiz_id
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def get_quiz_questions(self, quiz_id):
+        """Get the questions of a quiz in order as (question_id, question_text, correct_option, topic)."""
+        self.cursor.execute('''
+            SELECT question_id, question_text, correct_option, topic
+            FROM quiz_questions
+            WHERE quiz_id = ?
+            ORDER BY question_id
+        ''', (quiz_id,))
+        return self.cursor.fetchall()
+
+    # Question bank operations
+    def get_question_bank(self, document_id, topics=None):
+        """Get the stored quiz and paper questions of a document.
+
+        With topics, only questions tagged with one of them are returned.
+        Rows are (source, question_id, question_text, correct_option, topic, options)
+        where source is 'quiz' or 'paper' and options is a list. Paper questions
+        that were taken from the bank are left out; their originals are returned.
+        """
+        topic_filter = ''
+        params = [document_id]
+        keys = [self.topic_key(topic) for topic in topics or []]
+        if keys:
+            topic_filter = f' AND qq.topic_key IN ({", ".join("?" for _ in keys)})'
+            params += keys
+        params.append(document_id)
+        params += keys
+        self.cursor.execute(f'''
+            SELECT 'quiz', qq.question_id, qq.question_text, qq.correct_option, qq.topic,
+                   (SELECT json_group_array(option_text) FROM
+                       (SELECT option_text FROM question_options o WHERE o.question_id = qq.question_id ORDER BY o.option_id))
+            FROM quiz_questions qq
+            JOIN quizzes q ON q.quiz_id = qq.quiz_id
+            WHERE q.document_id = ?{topic_filter}
+            UNION ALL
+            SELECT 'paper', qq.paper_question_id, qq.question_text, qq.correct_option, qq.topic,
+                   (SELECT json_group_array(option_text) FROM
+                       (SELECT option_text FROM paper_options o WHERE o.paper_question_id = qq.paper_question_id ORDER BY o.paper_option_id))
+            FROM paper_questions qq
+            JOIN question_papers p ON p.paper_id = qq.paper_id
+            WHERE p.document_id = ? AND qq.bank_source IS NULL{topic_filter}
+        ''', params)
+        return [row[:5] + (json.loads(row[5]),) for row in self.cursor.fetchall()]
+
+    def get_question_response_stats(self, document_id):
+        """Get {(source, question_id): (responses, correct responses)} for the answered questions of a document."""
+        self.cursor.execute('''
+            SELECT r.question_id, COUNT(*), SUM(CASE WHEN r.is_correct THEN 1 ELSE 0 END)
+            FROM attempt_responses r
+            JOIN quiz_questions qq ON qq.question_id = r.question_id
+            JOIN quizzes q ON q.quiz_id = qq.quiz_id
+            WHERE q.document_id = ?
+            GROUP BY r.question_id
+        ''', (document_id,))
+        return {('quiz', question_id): (responses, correct) for question_id, responses, correct in self.cursor.fetchall()}
+
+    def get_recently_seen_questions(self, user_id, days=14):
+        """Get the (source, question_id) pairs served to or answered by a user in the last days."""
+        since = f'-{int(days)} days'
+        self.cursor.execute('''
+            SELECT source, question_id FROM question_exposures
+            WHERE user_id = ? AND served_at >= datetime('now', ?)
+            UNION
+            SELECT 'quiz', r.question_id FROM attempt_responses r
+            JOIN quiz_attempts a ON a.attempt_id = r.attempt_id
+            WHERE a.user_id = ? AND a.submitted_at >= datetime('now', ?)
+        ''', (user_id, since, user_id, since))
+        return set(self.cursor.fetchall())
+
+    def record_question_exposures(self, user_id, questions):
+        """Record that (source, question_id) pairs were served to a user."""
+        self.cursor.executemany('''
+            INSERT INTO question_exposures (user_id, source, question_id)
+            VALUES (?, ?, ?)
+        ''', [(user_id, source, question_id) for source, question_id in questions])
+        self.conn.commit()
+
+    # Near-duplicate index operations
+    def add_question_signature(self, source, question_id, document_id, signature, band_keys, commit=True):
+        """Store a question's MinHash signature and its LSH band keys, replacing any earlier ones."""
+        self.cursor.execute('DELETE FROM question_lsh WHERE source = ? AND question_id = ?', (source, question_id))
+        self.cursor.execute('''
+            INSERT OR REPLACE INTO question_signatures (source, question_id, document_id, signature)
+            VALUES (?, ?, ?, ?)
+        ''', (source, question_id, document_id, signature))
+        self.cursor.executemany('''
+            INSERT INTO question_lsh (band_key, source, question_id, document_id)
+            VALUES (?, ?, ?, ?)
+        ''', [(key, source, question_id, document_id) for key in band_keys])
+        if commit:
+            self.conn.commit()
+
+    def find_question_candidates(self, band_keys, document_id=None):
+        """Get (source, question_id, signature) of questions sharing any band key, optionally within a document.
+
+        Signatures of questions that have since been deleted (with their quiz, paper
+        or document) are never returned.
+        """
+        placeholders = ", ".join("?" for _ in band_keys)
+        document_filter = ' AND l.document_id = ?' if document_id is not None else ''
+        params = list(band_keys) + ([document_id] if document_id is not None else [])
+        self.cursor.execute(f'''
+            SELECT DISTINCT s.source, s.question_id, s.signature
+            FROM question_lsh l
+            JOIN question_signatures s ON s.source = l.source AND s.question_id = l.question_id
+            WHERE l.band_key IN ({placeholders}){document_filter}
+              AND CASE s.source
+                  WHEN 'quiz' THEN EXISTS (SELECT 1 FROM quiz_questions qq JOIN quizzes q ON q.quiz_id = qq.quiz_id
+                                           WHERE qq.question_id = s.question_id)
+                  ELSE EXISTS (SELECT 1 FROM paper_questions pq JOIN question_papers p ON p.paper_id = pq.paper_id
+                               WHERE pq.paper_question_id = s.question_id)
+              END
+        ''', params)
+        return self.cursor.fetchall()
+
+    def prune_question_signatures(self, commit=True):
+        """Remove the signatures and LSH bands of deleted questions. Returns the number of signatures removed."""
+        live = '''
+            (source = 'quiz' AND question_id IN (SELECT qq.question_id FROM quiz_questions qq
+                                                 JOIN quizzes q ON q.quiz_id = qq.quiz_id)
+             OR source = 'paper' AND question_id IN (SELECT pq.paper_question_id FROM paper_questions pq
+                                                     JOIN question_papers p ON p.paper_id = pq.paper_id))
+        '''
+        self.cursor.execute(f'DELETE FROM question_lsh WHERE NOT {live}')
+        self.cursor.execute(f'DELETE FROM question_signatures WHERE NOT {live}')
+        removed = self.cursor.rowcount
+        if commit:
+            self.conn.commit()
+        return removed
+
+    def get_unindexed_questions(self):
+        """Get stored questions without a signature as (source, question_id, document_id, question_text, correct_option)."""
+        self.cursor.execute('''
+            SELECT 'quiz', qq.question_id, q.document_id, qq.question_text, qq.correct_option
+            FROM quiz_questions qq
+            JOIN quizzes q ON q.quiz_id = qq.quiz_id
+            WHERE NOT EXISTS (SELECT 1 FROM question_signatures s
+                              WHERE s.source = 'quiz' AND s.question_id = qq.question_id)
+            UNION ALL
+            SELECT 'paper', pq.paper_question_id, p.document_id, pq.question_text, pq.correct_option
+            FROM paper_questions pq
+            JOIN question_papers p ON p.paper_id = pq.paper_id
+            WHERE NOT EXISTS (SELECT 1 FROM question_signatures s
+                              WHERE s.source = 'paper' AND s.question_id = pq.paper_question_id)
+        ''')
+        return self.cursor.fetchall()
+
     # Quiz attempt operations
     def record_quiz_attempt(self, quiz_id, user_id):
         """Record a new quiz attempt."""
@@ -283,6 +917,67 @@ class Database:
         self.conn.commit()
         return question_id
 
+    def add_question_paper_with_questions(self, document_id, settings, questions):
+        """Create a question paper with its settings and all of its questions and options in one transaction.
+
+        questions is a list of (question_text, correct_option, options, topic, marks, difficulty,
+        bank_source, bank_question_id) tuples; all but the first three may be None. A question
+        with a bank_source copies that bank question and is not added to the bank again.
+        Questions keep their order. Returns the new paper_id.
+        """
+        try:
+            self.cursor.execute('''
+                INSERT INTO question_papers (document_id, settings)
+                VALUES (?, ?)
+            ''', (document_id, json.dumps(settings) if settings else None))
+            paper_id = self.cursor.lastrowid
+            self.cursor.executemany('''
+                INSERT INTO paper_questions (paper_id, question_text, correct_option, topic, topic_key, marks, difficulty,
+                                             bank_source, bank_question_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(paper_id, question_text, correct_option, topic, self.topic_key(topic), marks, difficulty,
+                   bank_source, bank_question_id)
+                  for question_text, correct_option, _, topic, marks, difficulty, bank_source, bank_question_id
+                  in questions])
+            question_ids = [row[0] for row in self.cursor.execute(
+                'SELECT paper_question_id FROM paper_questions WHERE paper_id = ? ORDER BY paper_question_id',
+                (paper_id,)
+            ).fetchall()]
+            self.cursor.executemany('''
+                INSERT INTO paper_options (paper_question_id, option_text)
+                VALUES (?, ?)
+            ''', [(question_id, option)
+                  for question_id, (_, _, options, *_) in zip(question_ids, questions)
+                  for option in options])
+            self.conn.commit()
+            return paper_id
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def get_paper_settings(self, paper_id):
+        """Get (document_id, settings dict, created_at) of a question paper, or None if it does not exist."""
+        row = self.cursor.execute(
+            'SELECT document_id, settings, created_at FROM question_papers WHERE paper_id = ?', (paper_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]) if row[1] else {}, row[2]
+
+    def get_paper_questions_with_options(self, paper_id):
+        """Get the questions of a paper in order as
+        (paper_question_id, question_text, correct_option, topic, marks, difficulty, options list)."""
+        self.cursor.execute('''
+            SELECT pq.paper_question_id, pq.question_text, pq.correct_option, pq.topic, pq.marks, pq.difficulty,
+                   (SELECT json_group_array(option_text) FROM
+                       (SELECT option_text FROM paper_options o
+                        WHERE o.paper_question_id = pq.paper_question_id ORDER BY o.paper_option_id))
+            FROM paper_questions pq
+            WHERE pq.paper_id = ?
+            ORDER BY pq.paper_question_id
+        ''', (paper_id,))
+        return [row[:6] + (json.loads(row[6]),) for row in self.cursor.fetchall()]
+
     def get_question_paper(self, paper_id):
         """Get question paper details."""
         self.cursor.execute('''
@@ -325,13 +1020,58 @@ class Database:
         ''')
         return self.cursor.fetchall()
 
+    def delete_question_paper(self, paper_id):
+        """Delete a question paper with its questions, options, variants and near-duplicate signatures."""
+        questions = 'SELECT paper_question_id FROM paper_questions WHERE paper_id = ?'
+        try:
+            self.cursor.execute(f"DELETE FROM question_lsh WHERE source = 'paper' AND question_id IN ({questions})",
+                                (paper_id,))
+            self.cursor.execute(f"DELETE FROM question_signatures WHERE source = 'paper' AND question_id IN ({questions})",
+                                (paper_id,))
+            self.cursor.execute(f'DELETE FROM paper_options WHERE paper_question_id IN ({questions})', (paper_id,))
+            self.cursor.execute('DELETE FROM paper_questions WHERE paper_id = ?', (paper_id,))
+            self.cursor.execute('DELETE FROM paper_variants WHERE paper_id = ?', (paper_id,))
+            self.cursor.execute('DELETE FROM question_papers WHERE paper_id = ?', (paper_id,))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def replace_paper_variants(self, paper_id, seed, variants):
+        """Replace the variants of a paper in one transaction.
+
+        variants is a list of (label, question_order, option_orders) with the orders as bytes.
+        """
+        try:
+            self.cursor.execute('DELETE FROM paper_variants WHERE paper_id = ?', (paper_id,))
+            self.cursor.executemany('''
+                INSERT INTO paper_variants (paper_id, label, seed, question_order, option_orders)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(paper_id, label, seed, question_order, option_orders)
+                  for label, question_order, option_orders in variants])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def get_paper_variants(self, paper_id, label=None):
+        """Get (label, seed, question_order, option_orders) of a paper's variants in creation order, or of one label."""
+        label_filter = ' AND label = ?' if label is not None else ''
+        self.cursor.execute(f'''
+            SELECT label, seed, question_order, option_orders
+            FROM paper_variants
+            WHERE paper_id = ?{label_filter}
+            ORDER BY variant_id
+        ''', (paper_id,) + ((label,) if label is not None else ()))
+        return self.cursor.fetchall()
+
     # Summary operations
-    def add_summary(self, document_id, summary_text):
-        """Add a summary for a document."""
+    def add_summary(self, document_id, summary_text, topics=None):
+        """Add a summary for a document; topics lists the topics it was restricted to, if any."""
         self.cursor.execute('''
-            INSERT INTO summaries (document_id, summary_text)
-            VALUES (?, ?)
-        ''', (document_id, summary_text))
+            INSERT INTO summaries (document_id, summary_text, topics)
+            VALUES (?, ?, ?)
+        ''', (document_id, summary_text, json.dumps(list(topics)) if topics else None))
         self.conn.commit()
         return self.cursor.lastrowid
     
@@ -342,6 +1082,26 @@ class Database:
         ''', (document_id,))
         return self.cursor.fetchone()
     
+    def get_latest_summary(self, document_id):
+        """Get the text of the most recent summary of a document, or None."""
+        self.cursor.execute('''
+            SELECT summary_text FROM summaries
+            WHERE document_id = ?
+            ORDER BY generated_at DESC, summary_id DESC
+            LIMIT 1
+        ''', (document_id,))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+    
+    def get_document_summaries(self, document_id):
+        """Get (summary_text, topics list or None for the whole document) of a document's summaries, newest first."""
+        self.cursor.execute('''
+            SELECT summary_text, topics FROM summaries
+            WHERE document_id = ?
+            ORDER BY generated_at DESC, summary_id DESC
+        ''', (document_id,))
+        return [(text, json.loads(topics) if topics else None) for text, topics in self.cursor.fetchall()]
+
     def get_all_summaries(self):
         """Get all summaries."""
         self.cursor.execute('''
@@ -0,0 +1,169 @@
+# Near-duplicate detection for stored questions.
+#
+# Every question gets a MinHash signature over its content words (question
+# plus answer), stored in question_signatures. The signature is cut into bands
+# and each band is hashed into question_lsh, so candidates for a new question
+# are found with one indexed lookup instead of a scan; candidates are then
+# checked against the estimated Jaccard similarity.
+#
+# Backfill signatures for questions stored before this existed:
+#     python dedup.py --db edumate.db
+
+import argparse
+import hashlib
+import random
+import re
+import struct
+import sys
+
+from database import Database
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Estimated Jaccard similarity of content words above which two questions are duplicates
+DUPLICATE_THRESHOLD = 0.7
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(1729)  # fixed so signatures stay comparable across runs
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+STOPWORDS = set("""
+a an and are as at be by does do for from has have how in is it its of on or that the
+this to was were what which who whom why when where will with can following not
+""".split())
+
+def shingles(text):
+    """Content words of a question, lightly stemmed so plurals and -ing forms match."""
+    words = set()
+    for word in re.findall(r"[a-z0-9]+", (text or "").lower()):
+        if word in STOPWORDS:
+            continue
+        for suffix in ("ing", "es", "s"):
+            if len(word) > len(suffix) + 2 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+        words.add(word)
+    return words
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "little")
+
+def signature(text):
+    """MinHash signature of a text as a tuple of NUM_PERM integers."""
+    hashes = [_hash(word) for word in shingles(text)]
+    if not hashes:
+        return (_MAX_HASH,) * NUM_PERM
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes) & _MAX_HASH
+        for a, b in _PERMUTATIONS
+    )
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_PERM
+
+def band_keys(sig):
+    """One 63-bit key per band; questions sharing any key are candidates."""
+    keys = []
+    for band in range(BANDS):
+        rows = sig[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(struct.pack(f"<I{ROWS}I", band, *rows), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "little") >> 1)  # fits a signed SQLite integer
+    return keys
+
+def pack(sig):
+    return struct.pack(f"<{NUM_PERM}I", *sig)
+
+def unpack(blob):
+    return struct.unpack(f"<{NUM_PERM}I", blob)
+
+def question_text(question, answer=None):
+    """The text a question is compared on."""
+    return f"{question} {answer or ''}"
+
+def find_near_duplicate(db, question, answer=None, document_id=None, threshold=DUPLICATE_THRESHOLD, sig=None):
+    """
+    Find a stored question that is a near-duplicate of this one.
+
+    Returns:
+        tuple: (source, question_id, similarity) of the closest match, or None
+    """
+    sig = sig or signature(question_text(question, answer))
+    best = None
+    for source, question_id, blob in db.find_question_candidates(band_keys(sig), document_id):
+        score = similarity(sig, unpack(blob))
+        if score >= threshold and (best is None or score > best[2]):
+            best = (source, question_id, score)
+    return best
+
+def index_question(db, source, question_id, document_id, question, answer=None, commit=True):
+    """Store the signature and LSH bands of a question."""
+    sig = signature(question_text(question, answer))
+    db.add_question_signature(source, question_id, document_id, pack(sig), band_keys(sig), commit=commit)
+
+def filter_near_duplicates(db, rows, document_id=None, threshold=DUPLICATE_THRESHOLD):
+    """
+    Drop questions that repeat a stored question or an earlier one in the same batch.
+
+    Args:
+        rows (list): (question_text, correct_option, options[, topic]) tuples
+
+    Returns:
+        tuple: (kept rows, dropped rows)
+    """
+    kept, dropped = [], []
+    batch = []
+    for row in rows:
+        sig = signature(question_text(row[0], row[1]))
+        if find_near_duplicate(db, row[0], row[1], document_id, threshold, sig) or any(
+            similarity(sig, other) >= threshold for other in batch
+        ):
+            dropped.append(row)
+            continue
+        batch.append(sig)
+        kept.append(row)
+    return kept, dropped
+
+def add_quiz_deduplicated(db, document_id, rows, threshold=DUPLICATE_THRESHOLD):
+    """
+    Store a quiz after dropping near-duplicates of the document's stored questions.
+
+    Returns:
+        tuple: (quiz_id or None if nothing was left, kept rows, dropped rows)
+    """
+    kept, dropped = filter_near_duplicates(db, rows, document_id, threshold)
+    if not kept:
+        return None, kept, dropped
+    quiz_id = db.add_quiz_with_questions(document_id, kept)
+    for question_id, text, answer, _ in db.get_quiz_questions(quiz_id):
+        index_question(db, 'quiz', question_id, document_id, text, answer, commit=False)
+    db.conn.commit()
+    return quiz_id, kept, dropped
+
+def backfill(db):
+    """
+    Index every stored quiz and paper question that has no signature yet, after
+    dropping the signatures of deleted questions. Returns the number indexed.
+    """
+    db.prune_question_signatures(commit=False)
+    count = 0
+    for source, question_id, document_id, text, answer in db.get_unindexed_questions():
+        index_question(db, source, question_id, document_id, text, answer, commit=False)
+        count += 1
+    db.conn.commit()
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index stored questions for near-duplicate detection.")
+    parser.add_argument("--db", default="edumate.db", help="SQLite database file (default: edumate.db)")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    print(f"Indexed {backfill(db)} questions")
+    db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
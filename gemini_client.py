@@ -0,0 +1,97 @@
+import asyncio
+import os
+import threading
+import weakref
+import httpx
+from google import genai
+from google.genai import types
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Connection pool shared by every Gemini call in the process.
+# Idle connections are kept open so repeated calls skip the TCP and TLS handshakes.
+MAX_CONNECTIONS = int(os.environ.get("GEMINI_MAX_CONNECTIONS", "32"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("GEMINI_MAX_KEEPALIVE_CONNECTIONS", "16"))
+KEEPALIVE_EXPIRY = float(os.environ.get("GEMINI_KEEPALIVE_EXPIRY", "300"))
+
+_lock = threading.Lock()
+_client = None
+# httpx async pools are tied to the event loop that opened them, so async
+# clients are kept per loop and dropped when the loop is garbage collected
+_async_clients = weakref.WeakKeyDictionary()
+
+def _http_options():
+    """Build the HTTP options used by every client."""
+    limits = httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+    return types.HttpOptions(
+        # Lets benchmarks and offline runs point the SDK at a local stand-in server
+        base_url=_base_url(),
+        client_args={"limits": limits},
+        async_client_args={"limits": limits},
+    )
+
+def _base_url():
+    """
+    GEMINI_BASE_URL if set; otherwise, with GEMINI_STANDIN=record|replay|synthetic,
+    the URL of an in-process stand-in (see gemini_standin.py); otherwise the real API.
+    """
+    if os.environ.get("GEMINI_BASE_URL"):
+        return os.environ["GEMINI_BASE_URL"]
+    if os.environ.get("GEMINI_STANDIN"):
+        from gemini_standin import ensure_started
+        return ensure_started()
+    return None
+
+def new_client():
+    """
+    Build a new Gemini client.
+    Prefer get_client(); this exists for callers that need an isolated client.
+    """
+    api_key = os.environ.get("GEMINI_API_KEY")
+    # Replayed and synthetic responses need no key; recording forwards the real one
+    if not api_key and os.environ.get("GEMINI_STANDIN") in ("replay", "synthetic"):
+        api_key = "stand-in"
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY environment variable not set. Please add it to your .env file or set it in your environment.")
+    return genai.Client(api_key=api_key, http_options=_http_options())
+
+def get_client():
+    """
+    Get the process-wide Gemini client.
+    The client and its connection pool are created on first use and shared by
+    all threads; httpx clients are thread-safe.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = new_client()
+    return _client
+
+def get_async_client():
+    """
+    Get the async Gemini client (client.aio) for the running event loop.
+    Must be called from inside a coroutine.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        with _lock:
+            client = _async_clients.get(loop)
+            if client is None:
+                client = new_client()
+                _async_clients[loop] = client
+    return client.aio
+
+def reset_clients():
+    """Drop the cached clients, e.g. after changing GEMINI_API_KEY or GEMINI_BASE_URL."""
+    global _client
+    with _lock:
+        _client = None
+        _async_clients.clear()
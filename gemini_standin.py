@@ -0,0 +1,416 @@
+# Local stand-in for the Gemini API, for offline benchmarks and load tests.
+#
+# Modes:
+#   record     forward every request to the real API and save the response,
+#              with the arrival time of each streamed chunk, as a fixture file
+#   replay     answer from the fixture files with the recorded chunk timing
+#   synthetic  answer with generated responses shaped like the app expects
+#              (quiz arrays, summaries, OCR results), timed by a latency profile
+#
+# In replay and synthetic mode a latency/error profile can add delays and
+# inject 429/503 errors, so retry and rate-limit behaviour can be load-tested.
+# Models can be given their own profiles (GEMINI_STANDIN_MODEL_PROFILES=
+# "gemini-2.5-flash-preview-04-17=slow,gemini-2.0-flash-lite=typical") to
+# exercise model routing and fallback.
+#
+# The app uses it through gemini_client: setting GEMINI_STANDIN=replay (or
+# record/synthetic) starts a stand-in inside the process on first use and
+# points every client at it. It can also run on its own:
+#     python gemini_standin.py synthetic --profile degraded --port 8765
+#     GEMINI_BASE_URL=http://127.0.0.1:8765 streamlit run app.py
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+MODES = ("record", "replay", "synthetic")
+FIXTURES_DIR = os.environ.get("GEMINI_STANDIN_FIXTURES", os.path.join("fixtures", "gemini"))
+UPSTREAM_URL = os.environ.get("GEMINI_STANDIN_UPSTREAM", "https://generativelanguage.googleapis.com")
+
+# Latency and error profiles. Delays are medians in milliseconds; the first
+# chunk also waits "prompt_ms_per_1k_tokens" for every thousand prompt tokens,
+# so longer prompts answer later. "jitter" is the sigma of a log-normal factor
+# applied to each delay, and "errors" maps an HTTP status to the probability
+# that an attempt fails with it.
+PROFILES = {
+    "instant": {"first_chunk_ms": 0, "prompt_ms_per_1k_tokens": 0, "chunk_ms": 0, "chunks": 1,
+                "jitter": 0.0, "errors": {}},
+    "typical": {"first_chunk_ms": 700, "prompt_ms_per_1k_tokens": 40, "chunk_ms": 60, "chunks": 8,
+                "jitter": 0.3, "errors": {}},
+    "slow": {"first_chunk_ms": 2500, "prompt_ms_per_1k_tokens": 120, "chunk_ms": 150, "chunks": 12,
+             "jitter": 0.5, "errors": {}},
+    "degraded": {"first_chunk_ms": 1500, "prompt_ms_per_1k_tokens": 80, "chunk_ms": 120, "chunks": 8,
+                 "jitter": 0.6, "errors": {"429": 0.10, "503": 0.05}},
+}
+
+ERROR_STATUS = {400: "INVALID_ARGUMENT", 404: "NOT_FOUND", 429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED"}
+
+def load_profile(profile):
+    """Get a profile by name, from a JSON file, or as a dict; missing keys come from "typical"."""
+    if profile is None or isinstance(profile, dict):
+        overrides = profile or {}
+    elif profile in PROFILES:
+        overrides = PROFILES[profile]
+    else:
+        with open(profile, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+    merged = dict(PROFILES["typical"])
+    merged.update(overrides)
+    merged["errors"] = {int(status): float(rate) for status, rate in merged.get("errors", {}).items()}
+    return merged
+
+def request_key(path, body):
+    """Fixture key of a request: its model and method plus the canonical JSON body."""
+    endpoint = path.split("?")[0].rsplit("/", 1)[-1]
+    canonical = json.dumps(body, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(f"{endpoint}\n{canonical}".encode("utf-8")).hexdigest()[:24]
+
+def _texts(value):
+    """All text fields in a request body, in order."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == "text" and isinstance(item, str):
+                yield item
+            else:
+                yield from _texts(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _texts(item)
+
+def _words(text, count, rng):
+    words = [word for word in re.findall(r"[A-Za-z]{4,}", text)] or ["concept", "process", "example", "method"]
+    return [rng.choice(words) for _ in range(count)]
+
+def synthetic_text(body, rng):
+    """
+    Build a response of the shape the app expects for this request, recognised
+    from the system instruction: quiz questions, OCR output, summaries, or plain text.
+    """
+    system = " ".join(_texts(body.get("systemInstruction") or body.get("system_instruction") or {}))
+    prompt = " ".join(_texts(body.get("contents") or []))
+    config = body.get("generationConfig") or body.get("generation_config") or {}
+    wants_json = (config.get("responseMimeType") or config.get("response_mime_type")) == "application/json"
+
+    if "question paper setter" in system or "quiz" in system.lower():
+        match = re.search(r"quiz with (\d+)", prompt)
+        count = int(match.group(1)) if match else 5
+        questions = []
+        for index in range(count):
+            terms = _words(prompt, 4, rng)
+            options = [f"{term} {index + 1}" for term in terms]
+            questions.append({
+                "question": f"Which statement about {terms[0]} is correct? ({index + 1})",
+                "options": options,
+                "answer": rng.choice(options),
+                "topic": terms[0].title(),
+            })
+        return json.dumps(questions, indent=2)
+
+    if "handwritten" in system.lower() or "pdf" in system.lower():
+        topics = [word.title() for word in _words(system, 3, rng)]
+        text = "\n\n".join(f"## {topic}\n" + " ".join(_words(system, 60, rng)) for topic in topics)
+        return json.dumps({
+            "subject": "Synthetic Notes",
+            "topics": topics,
+            "text": text,
+            "sections": [{"title": topic, "content": " ".join(_words(system, 40, rng)), "topic": topic}
+                         for topic in topics],
+            "pages": [{"page_number": 1, "text": text, "confidence": 0.9}],
+        }, indent=2)
+
+    if "summar" in system.lower() or "overview" in system.lower():
+        topics = [word.title() for word in _words(prompt, 3, rng)]
+        return json.dumps({
+            "summary": " ".join(_words(prompt, 80, rng)),
+            "topics": [{"name": topic, "content": " ".join(_words(prompt, 40, rng))} for topic in topics],
+        }, indent=2)
+
+    reply = " ".join(_words(prompt, 40, rng))
+    return json.dumps({"text": reply}) if wants_json else reply.capitalize() + "."
+
+def _split(text, count):
+    size = max(1, math.ceil(len(text) / max(1, count)))
+    return [text[start:start + size] for start in range(0, len(text), size)] or [""]
+
+def _event(text, finish=False, usage=None):
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}}
+    if finish:
+        candidate["finishReason"] = "STOP"
+    event = {"candidates": [candidate]}
+    if usage:
+        event["usageMetadata"] = usage
+    return event
+
+class StandIn:
+    """Request handling shared by every connection: fixtures, profile and per-request randomness."""
+
+    def __init__(self, mode="replay", fixtures_dir=FIXTURES_DIR, profile=None, speed=1.0,
+                 upstream=UPSTREAM_URL, fallback=None, seed=0, model_profiles=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown stand-in mode {mode!r}; expected one of {', '.join(MODES)}")
+        self.mode = mode
+        self.fixtures_dir = fixtures_dir
+        # Replay keeps the recorded timing unless a profile is given explicitly
+        self.profile = load_profile(profile) if profile or mode == "synthetic" else None
+        # Per-model overrides of the profile, e.g. to make one model tier slow
+        self.model_profiles = {model: load_profile(model_profile)
+                               for model, model_profile in (model_profiles or {}).items()}
+        self.speed = speed
+        self.upstream = upstream.rstrip("/")
+        self.fallback = fallback
+        self.seed = seed
+        self.attempts = {}
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "replayed": 0, "recorded": 0, "synthetic": 0, "errors": 0, "missing": 0}
+
+    def _count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def _rng(self, key):
+        """Randomness that depends only on the request and how often it has been seen, not on timing."""
+        with self.lock:
+            attempt = self.attempts.get(key, 0)
+            self.attempts[key] = attempt + 1
+        return random.Random(f"{self.seed}:{key}:{attempt}")
+
+    def _delay(self, median_ms, rng, profile):
+        if not median_ms or not profile:
+            return 0.0
+        return median_ms * math.exp(rng.gauss(0, profile["jitter"])) / 1000
+
+    def profile_for(self, path):
+        """The profile of the model a request path names (.../models/{model}:method)."""
+        model = path.split("?")[0].rsplit("/", 1)[-1].split(":")[0]
+        return self.model_profiles.get(model, self.profile)
+
+    def fixture_path(self, key):
+        return os.path.join(self.fixtures_dir, f"{key}.json")
+
+    def respond(self, handler, body):
+        """Answer one generateContent or streamGenerateContent request."""
+        self._count("requests")
+        key = request_key(handler.path, body)
+        streaming = ":streamGenerateContent" in handler.path
+
+        if self.mode == "record":
+            return self._record(handler, body, key, streaming)
+
+        rng = self._rng(key)
+        profile = self.profile_for(handler.path)
+        if profile:
+            for status, rate in sorted(profile["errors"].items()):
+                if rng.random() < rate:
+                    time.sleep(self._delay(profile["first_chunk_ms"], rng, profile) / 4)
+                    self._count("errors")
+                    return handler.send_error_json(status, f"Stand-in injected {status}")
+
+        fixture = None
+        if self.mode == "replay":
+            try:
+                with open(self.fixture_path(key), "r", encoding="utf-8") as f:
+                    fixture = json.load(f)
+            except FileNotFoundError:
+                self._count("missing")
+                if self.fallback != "synthetic":
+                    return handler.send_error_json(404, f"No stand-in fixture {key} for {handler.path}")
+
+        if fixture is not None:
+            self._count("replayed")
+            if fixture.get("status", 200) != 200:
+                return handler.send_json(fixture["status"], fixture["events"][0]["data"])
+            events = [(event["t_ms"] / 1000 * self.speed, event["data"]) for event in fixture["events"]]
+        else:
+            self._count("synthetic")
+            text = synthetic_text(body, rng)
+            pieces = _split(text, profile["chunks"] if profile else 1)
+            usage = {"promptTokenCount": sum(len(t) for t in _texts(body)) // 4,
+                     "candidatesTokenCount": len(text) // 4}
+            at = self._delay(
+                profile["first_chunk_ms"]
+                + profile["prompt_ms_per_1k_tokens"] * usage["promptTokenCount"] / 1000, rng, profile
+            ) if profile else 0.0
+            events = []
+            for index, piece in enumerate(pieces):
+                last = index == len(pieces) - 1
+                events.append((at * self.speed, _event(piece, finish=last, usage=usage if last else None)))
+                at += self._delay(profile["chunk_ms"], rng, profile) if profile else 0.0
+
+        if streaming:
+            handler.send_stream(events)
+        else:
+            time.sleep(max(0.0, events[-1][0]))
+            handler.send_json(200, _merge_events([data for _, data in events]))
+
+    def _record(self, handler, body, key, streaming):
+        """Forward the request upstream, relay the answer as it arrives and save it as a fixture."""
+        headers = {name: value for name, value in handler.headers.items()
+                   if name.lower() in ("x-goog-api-key", "content-type", "x-goog-api-client", "user-agent")}
+        start = time.perf_counter()
+        events = []
+        with httpx.Client(timeout=httpx.Timeout(600.0, connect=30.0)) as client:
+            with client.stream("POST", self.upstream + handler.path, headers=headers, json=body) as response:
+                if response.status_code != 200 or not streaming:
+                    data = json.loads(response.read() or b"{}")
+                    events.append({"t_ms": round((time.perf_counter() - start) * 1000, 1), "data": data})
+                    handler.send_json(response.status_code, data)
+                else:
+                    handler.start_stream()
+                    for line in response.iter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = json.loads(line[len("data:"):].strip())
+                        events.append({"t_ms": round((time.perf_counter() - start) * 1000, 1), "data": data})
+                        handler.write_event(data)
+                    handler.end_stream()
+                status = response.status_code
+
+        os.makedirs(self.fixtures_dir, exist_ok=True)
+        with open(self.fixture_path(key), "w", encoding="utf-8") as f:
+            json.dump({
+                "key": key,
+                "path": handler.path.split("?")[0],
+                "prompt_preview": " ".join(_texts(body.get("contents") or []))[:200],
+                "status": status,
+                "recorded_at": time.time(),
+                "events": events,
+            }, f, indent=1, ensure_ascii=False)
+        self._count("recorded")
+
+def _merge_events(events):
+    """Join streamed chunks into one non-streaming response."""
+    text = "".join(part.get("text", "") for event in events
+                   for candidate in event.get("candidates", [])[:1]
+                   for part in candidate.get("content", {}).get("parts", []))
+    usage = next((event["usageMetadata"] for event in reversed(events) if "usageMetadata" in event), None)
+    return _event(text, finish=True, usage=usage)
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Chunks are written one at a time; without this Nagle's algorithm delays them
+    disable_nagle_algorithm = True
+    stand_in = None
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self.send_error_json(400, "Request body is not JSON")
+        if ":generateContent" not in self.path and ":streamGenerateContent" not in self.path:
+            return self.send_error_json(404, f"The stand-in does not serve {self.path}")
+        try:
+            self.stand_in.respond(self, body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, e.g. on a read timeout
+            self.close_connection = True
+
+    def send_json(self, status, data):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_error_json(self, status, message):
+        self.send_json(status, {"error": {"code": status, "message": message,
+                                          "status": ERROR_STATUS.get(status, "UNKNOWN")}})
+
+    def start_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_event(self, data):
+        event = f"data: {json.dumps(data)}\r\n\r\n".encode("utf-8")
+        self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+        self.wfile.flush()
+
+    def end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def send_stream(self, events):
+        """Write (seconds after the request, event) pairs at their times."""
+        start = time.perf_counter()
+        self.start_stream()
+        for at, data in events:
+            wait = at - (time.perf_counter() - start)
+            if wait > 0:
+                time.sleep(wait)
+            self.write_event(data)
+        self.end_stream()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server(stand_in, host="127.0.0.1", port=0):
+    """Serve a StandIn from a background thread. Returns the server; its URL is server.base_url."""
+    handler = type("BoundStandInHandler", (StandInHandler,), {"stand_in": stand_in})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name="gemini-stand-in", daemon=True).start()
+    return server
+
+def from_environment():
+    """Build a StandIn from the GEMINI_STANDIN* environment variables."""
+    return StandIn(
+        mode=os.environ.get("GEMINI_STANDIN", "replay"),
+        fixtures_dir=os.environ.get("GEMINI_STANDIN_FIXTURES", FIXTURES_DIR),
+        profile=os.environ.get("GEMINI_STANDIN_PROFILE") or None,
+        speed=float(os.environ.get("GEMINI_STANDIN_SPEED", "1.0")),
+        fallback=os.environ.get("GEMINI_STANDIN_FALLBACK") or None,
+        seed=int(os.environ.get("GEMINI_STANDIN_SEED", "0")),
+        model_profiles=dict(
+            item.strip().split("=", 1)
+            for item in os.environ.get("GEMINI_STANDIN_MODEL_PROFILES", "").split(",") if "=" in item
+        ),
+    )
+
+_server = None
+_server_lock = threading.Lock()
+
+def ensure_started():
+    """Start the in-process stand-in configured by the environment, once. Returns its base URL."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = start_server(from_environment())
+        return _server.base_url
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Gemini API.")
+    parser.add_argument("mode", choices=MODES)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help=f"Fixture directory (default: {FIXTURES_DIR})")
+    parser.add_argument("--profile", help=f"Latency/error profile: {', '.join(PROFILES)} or a JSON file")
+    parser.add_argument("--speed", type=float, default=1.0, help="Multiply all delays, e.g. 0 for no delay")
+    parser.add_argument("--fallback", choices=["synthetic"], help="Replay: answer missing fixtures synthetically")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for synthetic responses and injected errors")
+    args = parser.parse_args(argv)
+
+    stand_in = StandIn(args.mode, args.fixtures, args.profile, args.speed, fallback=args.fallback, seed=args.seed)
+    server = start_server(stand_in, port=args.port)
+    print(f"Gemini stand-in ({args.mode}) on {server.base_url}; set GEMINI_BASE_URL={server.base_url}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        print(json.dumps(stand_in.stats))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
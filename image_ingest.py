@@ -0,0 +1,110 @@
+import io
+import os
+from PIL import Image, ImageOps
+
+# Photos of notes are resampled so the long edge of a letter/A4 page
+# (about 11 inches) lands at this resolution. 200 DPI keeps handwriting
+# legible while cutting a 12 MP phone photo down to roughly 4 MP.
+OCR_DPI = 200
+PAGE_LONG_EDGE_INCHES = 11
+JPEG_QUALITY = 70
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+def is_image_file(filename):
+    """Check whether a file name looks like an image we can ingest."""
+    return filename.lower().endswith(IMAGE_EXTENSIONS)
+
+def prepare_image(image_file, dpi=OCR_DPI):
+    """
+    Decode a photo and normalise it for OCR.
+
+    Args:
+        image_file: A path, bytes, or file-like object containing a PNG or JPEG
+        dpi (int): Target resolution for the long edge of the page
+
+    Returns:
+        PIL.Image.Image: An upright, grayscale image no larger than the target resolution
+    """
+    if isinstance(image_file, (bytes, bytearray)):
+        image_file = io.BytesIO(image_file)
+
+    with Image.open(image_file) as img:
+        # Let JPEG decoding skip detail we would throw away anyway
+        max_edge = dpi * PAGE_LONG_EDGE_INCHES
+        img.draft("L", (max_edge, max_edge))
+
+        # Phones store the orientation in EXIF instead of rotating pixels
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("L")
+
+    scale = max_edge / max(img.size)
+    if scale < 1:
+        new_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        img = img.resize(new_size, Image.LANCZOS)
+
+    img.info["dpi"] = (dpi, dpi)
+    return img
+
+def compress_image(img, quality=JPEG_QUALITY):
+    """Encode a prepared image as an optimised JPEG and return the bytes."""
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, optimize=True, dpi=img.info.get("dpi", (OCR_DPI, OCR_DPI)))
+    return buffer.getvalue()
+
+def images_to_pdf(image_files, output_path, dpi=OCR_DPI, quality=JPEG_QUALITY):
+    """
+    Prepare a list of photos and bundle them into one multi-page PDF, one photo per page.
+
+    Args:
+        image_files (list): Paths, bytes, or file-like objects in page order
+        output_path (str): Where to write the PDF
+        dpi (int): Target resolution for the long edge of each page
+        quality (int): JPEG quality used for the embedded pages
+
+    Returns:
+        dict: Sizes before and after, in the format:
+             {"pages": 3, "input_bytes": 24000000, "output_bytes": 900000, "path": "..."}
+    """
+    if not image_files:
+        raise ValueError("No images to convert.")
+
+    pages = []
+    input_bytes = 0
+    for image_file in image_files:
+        if isinstance(image_file, str):
+            input_bytes += os.path.getsize(image_file)
+        elif isinstance(image_file, (bytes, bytearray)):
+            input_bytes += len(image_file)
+        elif hasattr(image_file, "getbuffer"):
+            input_bytes += image_file.getbuffer().nbytes
+
+        # Re-open the recompressed JPEG so the PDF embeds it as-is
+        jpeg_bytes = compress_image(prepare_image(image_file, dpi), quality)
+        pages.append(Image.open(io.BytesIO(jpeg_bytes)))
+
+    pages[0].save(
+        output_path,
+        format="PDF",
+        save_all=True,
+        append_images=pages[1:],
+        resolution=dpi,
+    )
+
+    return {
+        "pages": len(pages),
+        "input_bytes": input_bytes,
+        "output_bytes": os.path.getsize(output_path),
+        "path": output_path,
+    }
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        print("Usage: python image_ingest.py OUTPUT.pdf IMAGE [IMAGE ...]")
+        sys.exit(1)
+
+    stats = images_to_pdf(sys.argv[2:], sys.argv[1])
+    print(f"Wrote {stats['pages']} pages to {stats['path']}: "
+          f"{stats['input_bytes'] / 1024:.0f} KB -> {stats['output_bytes'] / 1024:.0f} KB")
@@ -0,0 +1,238 @@
+# Bulk ingestion of a directory of PDFs and photos of notes:
+#     python ingest.py uploads/ --workers 4 --db edumate.db
+#
+# Every file is identified by the SHA-256 of its contents and its state is kept
+# in the ingestion_files table, so files that were already ingested are skipped
+# and an interrupted run picks up the remaining files when started again.
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from database import Database
+from image_ingest import images_to_pdf, is_image_file
+from ocr import default_user_id, extract_pdf_pages, ocr_pdf, store_ocr_result
+from processing_pipeline import enqueue_document
+
+# Average text-layer confidence below which a PDF is sent to OCR instead
+OCR_CONFIDENCE_THRESHOLD = 0.8
+
+def find_files(directory):
+    """List the PDFs and images under a directory, in a stable order."""
+    found = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(".pdf") or is_image_file(name):
+                found.append(os.path.join(root, name))
+    return sorted(found)
+
+def file_hash(path):
+    """Return the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def extract_file(path, ocr_threshold=OCR_CONFIDENCE_THRESHOLD):
+    """
+    Extract the text of one file. Runs in a worker thread and does not touch the database.
+
+    Returns:
+        dict: {"method": "text_layer" or "ocr", "pages": [(page_number, text, confidence)],
+               "ocr_response": raw OCR JSON or None, "latency_ms": float}
+    """
+    start = time.perf_counter()
+    pages = []
+    ocr_response = None
+
+    if is_image_file(path):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_path = os.path.join(tmp_dir, "notes.pdf")
+            images_to_pdf([path], pdf_path)
+            ocr_response = ocr_pdf(pdf_path, echo=False)
+    else:
+        pages = list(extract_pdf_pages(path))
+        confidence = sum(page[2] for page in pages) / len(pages) if pages else 0.0
+        if confidence < ocr_threshold:
+            # Scanned or handwritten PDF, the text layer is not worth keeping
+            pages = []
+            ocr_response = ocr_pdf(path, echo=False)
+
+    return {
+        "method": "ocr" if ocr_response is not None else "text_layer",
+        "pages": pages,
+        "ocr_response": ocr_response,
+        "latency_ms": (time.perf_counter() - start) * 1000,
+    }
+
+def store_text_layer(db, path, pages, user_id, content_hash=None):
+    """
+    Store a text-layer extraction as a new document with its pages, or complete
+    the document an interrupted run started for the same file.
+    """
+    text = "".join(page_text + "\n\n" for _, page_text, _ in pages if page_text)
+    existing = db.get_document_by_hash(content_hash) if content_hash else None
+    if existing:
+        document_id = existing[0]
+        db.update_document_text(document_id, text)
+    else:
+        document_id = db.add_document(user_id, path, 'text', text, content_hash)
+    for page_number, page_text, confidence in pages:
+        db.add_document_page(document_id, page_number, page_text, 'text_layer', confidence)
+    db.update_document_processed(document_id)
+    enqueue_document(db, document_id, start=False)
+    return document_id
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def ingest_directory(directory, db_name="edumate.db", workers=4, user_id=None,
+                     ocr_threshold=OCR_CONFIDENCE_THRESHOLD, retry_failed=True):
+    """
+    Ingest every PDF and image under a directory with a pool of worker threads.
+
+    Returns:
+        dict: The run report (counts, throughput and per-file latency statistics)
+    """
+    db = Database(db_name)
+    if user_id is None:
+        user_id = default_user_id(db)
+        db.conn.commit()
+
+    run_started = time.perf_counter()
+    report = {
+        "directory": directory,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "workers": workers,
+        "files": [],
+        "skipped": [],
+        "failed": [],
+    }
+
+    # Decide what to process; duplicates within the run are skipped by hash too
+    pending = []
+    seen_hashes = set()
+    for path in find_files(directory):
+        content_hash = file_hash(path)
+        state = db.get_ingestion_file(content_hash)
+        already_done = state and state[3] == 'done'
+        gave_up = state and state[3] == 'failed' and not retry_failed
+        if content_hash in seen_hashes or already_done or gave_up:
+            report["skipped"].append(path)
+            continue
+        seen_hashes.add(content_hash)
+        pending.append((path, content_hash))
+
+    print(f"{len(pending)} files to ingest, {len(report['skipped'])} already processed")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for path, content_hash in pending:
+            db.start_ingestion(content_hash, path)
+            futures[pool.submit(extract_file, path, ocr_threshold)] = (path, content_hash)
+
+        for done_count, future in enumerate(as_completed(futures), start=1):
+            path, content_hash = futures[future]
+            try:
+                result = future.result()
+                # The document carries the file's hash, so a run that stopped before
+                # finish_ingestion is picked up here instead of storing the file twice
+                existing = db.get_document_by_hash(content_hash)
+                if existing and existing[1]:
+                    document_id = existing[0]
+                    enqueue_document(db, document_id, start=False)
+                    page_count = len(db.get_document_pages(document_id))
+                elif result["method"] == "ocr":
+                    document_id = store_ocr_result(path, result["ocr_response"], db_name, user_id, content_hash)
+                    if document_id is None:
+                        raise ValueError("OCR response could not be stored")
+                    page_count = len(db.get_document_pages(document_id))
+                else:
+                    document_id = store_text_layer(db, path, result["pages"], user_id, content_hash)
+                    page_count = len(result["pages"])
+
+                db.finish_ingestion(content_hash, document_id, result["method"], page_count, result["latency_ms"])
+                report["files"].append({
+                    "path": path,
+                    "document_id": document_id,
+                    "method": result["method"],
+                    "pages": page_count,
+                    "latency_ms": round(result["latency_ms"], 1),
+                })
+                print(f"[{done_count}/{len(futures)}] {path}: document {document_id} "
+                      f"({result['method']}, {result['latency_ms'] / 1000:.1f}s)")
+            except Exception as e:
+                db.fail_ingestion(content_hash, str(e), None)
+                report["failed"].append({"path": path, "error": str(e)})
+                print(f"[{done_count}/{len(futures)}] {path}: failed ({e})")
+
+    db.close()
+
+    elapsed = time.perf_counter() - run_started
+    latencies = [f["latency_ms"] for f in report["files"]]
+    total_pages = sum(f["pages"] for f in report["files"])
+    report.update({
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "elapsed_seconds": round(elapsed, 2),
+        "ingested": len(report["files"]),
+        "total_pages": total_pages,
+        "files_per_minute": round(len(report["files"]) / elapsed * 60, 2) if elapsed else None,
+        "pages_per_second": round(total_pages / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": max(latencies) if latencies else None,
+        },
+    })
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest a directory of PDFs and photos of notes.")
+    parser.add_argument("directory", help="Directory to walk, e.g. uploads/")
+    parser.add_argument("--db", default="edumate.db", help="SQLite database file (default: edumate.db)")
+    parser.add_argument("--workers", type=int, default=4, help="Number of files processed in parallel")
+    parser.add_argument("--user-id", type=int, default=None, help="Owner of the new documents (default user if omitted)")
+    parser.add_argument("--ocr-threshold", type=float, default=OCR_CONFIDENCE_THRESHOLD,
+                        help="Average text-layer confidence below which PDFs are OCR'd")
+    parser.add_argument("--no-retry-failed", action="store_true", help="Skip files that failed in an earlier run")
+    parser.add_argument("--report", default="ingest_report.json", help="Where to write the run report")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: directory not found: {args.directory}")
+        return 1
+
+    report = ingest_directory(
+        args.directory,
+        db_name=args.db,
+        workers=args.workers,
+        user_id=args.user_id,
+        ocr_threshold=args.ocr_threshold,
+        retry_failed=not args.no_retry_failed,
+    )
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\nIngested {report['ingested']} files ({report['total_pages']} pages) in {report['elapsed_seconds']}s, "
+          f"{len(report['skipped'])} skipped, {len(report['failed'])} failed")
+    print(f"Throughput: {report['files_per_minute']} files/min, {report['pages_per_second']} pages/s; "
+          f"latency p50 {report['latency_ms']['p50']} ms, p95 {report['latency_ms']['p95']} ms")
+    print(f"Report written to {args.report}")
+    return 0 if not report["failed"] else 2
+
+if __name__ == "__main__":
+    sys.exit(main())
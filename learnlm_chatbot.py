@@ -1,7 +1,11 @@
 import os
 import re
-import google.generativeai as genai
+from google.genai import types
 from dotenv import load_dotenv
+from gemini_client import get_client
+from llm import tracked_call
+from rate_limit import call_with_retry
+from telemetry import start_call
 import googleapiclient.discovery
 import googleapiclient.errors
 import requests
@@ -15,6 +19,8 @@ load_dotenv()
 gemini_api_key = os.environ.get("GEMINI_API_KEY")
 youtube_api_key = os.environ.get("YOUTUBE_API_KEY")
 
+CHAT_MODEL = "learnlm-2.0-flash-experimental"
+
 if not gemini_api_key:
     print("Error: GEMINI_API_KEY not found in environment variables.")
     print("Please create a .env file with GEMINI_API_KEY=your_api_key_here")
@@ -24,9 +30,6 @@ if not youtube_api_key:
     print("Warning: YOUTUBE_API_KEY not found in environment variables.")
     print("YouTube recommendations will not be available.")
 
-# Configure the Google Generative AI library
-genai.configure(api_key=gemini_api_key)
-
 def search_youtube_videos(query, language, max_results=3):
     """Search for YouTube videos using direct API call."""
     if not youtube_api_key:
@@ -109,17 +112,12 @@ def get_main_topic(text):
     return None
 
 def create_chatbot():
-    # Create a model instance
-    generation_config = genai.GenerationConfig(
+    # Chat settings
+    generation_config = types.GenerateContentConfig(
         temperature=0.7,
         response_mime_type="text/plain",
     )
     
-    model = genai.GenerativeModel(
-        model_name="learnlm-2.0-flash-experimental",
-        generation_config=generation_config
-    )
-    
     # System instruction for the tutor behavior
     system_prompt = """Be a friendly, supportive tutor. Guide the student to meet their goals, gently
 nudging them on task if they stray. Ask guiding questions to help your students
@@ -131,10 +129,13 @@ once the student has shown evidence of understanding.
 Before starting ask the user their preferred language. (English, Kannada, Hinglish or Hindi)"""
     
     # Initialize the chat session
-    chat = model.start_chat()
+    chat = get_client().chats.create(
+        model=CHAT_MODEL,
+        config=generation_config
+    )
     
     # Send a system message to set up the behavior
-    initial_response = chat.send_message(system_prompt)
+    initial_response = tracked_call("chat", CHAT_MODEL, lambda: chat.send_message(system_prompt), system_prompt)
     
     # Track user's preferred language
     preferred_language = "English"  # Default
@@ -182,13 +183,25 @@ Before starting ask the user their preferred language. (English, Kannada, Hingli
         # Send message and get response
         print("\nChatbot: ", end="")
         
-        response = chat.send_message(user_input, stream=True)
-        
-        response_text = ""
-        for chunk in response:
-            if hasattr(chunk, "text"):
-                print(chunk.text, end="")
-                response_text += chunk.text
+        chunks = []
+        call = start_call("chat", CHAT_MODEL, user_input)
+
+        def stream_reply():
+            call.attempt()
+            for chunk in chat.send_message_stream(user_input):
+                call.chunk(chunk.text, chunk.usage_metadata)
+                if chunk.text:
+                    print(chunk.text, end="")
+                    chunks.append(chunk.text)
+
+        # Retry quota errors only before anything has been printed
+        try:
+            call_with_retry(stream_reply, can_retry=lambda: not chunks)
+        except Exception as e:
+            call.finish(error=e)
+            raise
+        call.finish()
+        response_text = "".join(chunks)
         
         # Check for language detection in the first few exchanges
         if not language_detected and len(last_user_message) == 0:
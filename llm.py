@@ -0,0 +1,265 @@
+import asyncio
+import json
+import queue
+import threading
+import httpx
+from google.genai import types
+from gemini_client import get_async_client, get_client
+from llm_cache import get_cache, make_key
+from model_routing import ROUTED, Tier, get_stats, plan_route
+from rate_limit import acall_with_retry, call_with_retry
+from telemetry import start_call
+
+class StreamCancelled(Exception):
+    """Raised from on_chunk to stop a streamed generation the caller no longer needs."""
+
+def is_json(text):
+    """Check whether a response parses as JSON, used to avoid caching broken output."""
+    try:
+        json.loads(text)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def generate_text(model, contents, config, use_cache=True, validate=None, on_chunk=None, operation="generate"):
+    """
+    Run a streamed Gemini generation and return the full response text.
+    Every generation call in the app goes through here, so each one is
+    cached, held to the shared rate limit, retried on quota or server errors
+    and recorded in the llm_calls telemetry table.
+
+    Args:
+        model (str): Model name, or model_routing.ROUTED to pick a model tier
+            for the operation and fall back to the next tier on timeouts and errors
+        contents: Prompt contents, as accepted by generate_content_stream
+        config (types.GenerateContentConfig): Generation config, including the system instruction
+        use_cache (bool): Read from the response cache; pass False to force a fresh
+            generation (the fresh response still replaces the cached one)
+        validate (callable, optional): Only responses for which validate(text) is true are cached
+        on_chunk (callable, optional): Called with each text chunk as it arrives
+            (once with the whole text on a cache hit); raising StreamCancelled from it
+            aborts the model stream, and the exception propagates
+        operation (str): What the call is for ("quiz", "summary", "ocr", ...), for
+            telemetry and routing
+
+    Returns:
+        str: The concatenated response text
+    """
+    cache = get_cache()
+    # Routed calls are cached under ROUTED, so a response is reused whichever tier wrote it
+    key = make_key(model, contents, config)
+
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            call = start_call(operation, model, contents)
+            call.chunk(cached)
+            call.finish(cache_hit=True)
+            if on_chunk:
+                on_chunk(cached)
+            return cached
+
+    tiers = _tiers(model, operation, contents)
+    response_text = ""
+    for index, tier in enumerate(tiers):
+        call = _start_tier_call(operation, tier, index, tiers, contents)
+        tier_config = _tier_config(config, tier)
+        can_fall_back = index + 1 < len(tiers)
+
+        def stream():
+            nonlocal response_text
+            response_text = ""
+            call.attempt()
+            for chunk in get_client().models.generate_content_stream(
+                model=tier.model,
+                contents=contents,
+                config=tier_config,
+            ):
+                call.chunk(chunk.text, chunk.usage_metadata)
+                if chunk.text:
+                    response_text += chunk.text
+                    if on_chunk:
+                        on_chunk(chunk.text)
+
+        # Once chunks have been shown a retry (or another tier) would repeat them,
+        # so only retry or fall back before that
+        try:
+            call_with_retry(stream, can_retry=lambda: not (on_chunk and response_text),
+                            give_up=lambda error: can_fall_back and _falls_back_at_once(error))
+        except Exception as e:
+            _finish_tier_call(call, operation, tier, e)
+            if not can_fall_back or (on_chunk and response_text):
+                raise
+            print(f"{tier.model} failed for {operation} ({e}); falling back to {tiers[index + 1].model}")
+            continue
+        _finish_tier_call(call, operation, tier)
+        break
+
+    if response_text and (validate is None or validate(response_text)):
+        cache.set(key, tier.model, response_text)
+    return response_text
+
+def stream_text(model, contents, config, use_cache=True, validate=None, operation="generate"):
+    """
+    Generator version of generate_text: yields text chunks as they arrive
+    (the whole text at once on a cache hit). The request runs in a background
+    thread through generate_text, so caching, rate limiting and retries still apply.
+    Closing the generator early aborts the model stream at its next chunk.
+    """
+    chunks = queue.Queue()
+    done = object()
+    cancelled = threading.Event()
+
+    def put(chunk):
+        if cancelled.is_set():
+            raise StreamCancelled("The reader closed the stream")
+        chunks.put(chunk)
+
+    def run():
+        try:
+            generate_text(model, contents, config, use_cache=use_cache, validate=validate,
+                          on_chunk=put, operation=operation)
+            chunks.put(done)
+        except Exception as e:
+            chunks.put(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+
+async def agenerate_text(model, contents, config, use_cache=True, validate=None, on_chunk=None, operation="generate"):
+    """
+    Async version of generate_text, streaming through the async Gemini client.
+    Takes the same arguments and shares the same response cache and routing.
+    Cache reads and writes run in a worker thread, since SQLite can block on
+    other processes' locks and would stall every call sharing the event loop.
+    """
+    cache = await asyncio.to_thread(get_cache)
+    key = make_key(model, contents, config)
+
+    if use_cache:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            call = start_call(operation, model, contents)
+            call.chunk(cached)
+            call.finish(cache_hit=True)
+            if on_chunk:
+                on_chunk(cached)
+            return cached
+
+    tiers = _tiers(model, operation, contents)
+    response_text = ""
+    for index, tier in enumerate(tiers):
+        call = _start_tier_call(operation, tier, index, tiers, contents)
+        tier_config = _tier_config(config, tier)
+        can_fall_back = index + 1 < len(tiers)
+
+        async def stream():
+            nonlocal response_text
+            response_text = ""
+            call.attempt()
+            async for chunk in await get_async_client().models.generate_content_stream(
+                model=tier.model,
+                contents=contents,
+                config=tier_config,
+            ):
+                call.chunk(chunk.text, chunk.usage_metadata)
+                if chunk.text:
+                    response_text += chunk.text
+                    if on_chunk:
+                        on_chunk(chunk.text)
+
+        try:
+            await acall_with_retry(stream, can_retry=lambda: not (on_chunk and response_text),
+                                   give_up=lambda error: can_fall_back and _falls_back_at_once(error))
+        except Exception as e:
+            _finish_tier_call(call, operation, tier, e)
+            if not can_fall_back or (on_chunk and response_text):
+                raise
+            print(f"{tier.model} failed for {operation} ({e}); falling back to {tiers[index + 1].model}")
+            continue
+        _finish_tier_call(call, operation, tier)
+        break
+
+    if response_text and (validate is None or validate(response_text)):
+        await asyncio.to_thread(cache.set, key, tier.model, response_text)
+    return response_text
+
+def _tiers(model, operation, contents):
+    """The models to try for a call: the routed tiers, or just the model asked for."""
+    if model == ROUTED:
+        return plan_route(operation, contents)
+    return [Tier(None, model, None, None)]
+
+def _tier_config(config, tier):
+    """The generation config with the tier's read timeout, if it has one."""
+    if not tier.timeout_seconds or config is None:
+        return config
+    return config.model_copy(update={"http_options": types.HttpOptions(timeout=int(tier.timeout_seconds * 1000))})
+
+def _falls_back_at_once(error):
+    """Timeouts and overload are not retried on the same model when another tier is left."""
+    code = getattr(error, "code", None)
+    return isinstance(error, httpx.TimeoutException) or code in (503, 504)
+
+def _start_tier_call(operation, tier, index, tiers, contents):
+    call = start_call(operation, tier.model, contents)
+    if tier.name is not None:
+        call.route = (f"{tier.name}: {tier.reason}" if index == 0
+                      else f"fallback from {tiers[index - 1].name} to {tier.name}: {tier.reason}")
+    return call
+
+def _finish_tier_call(call, operation, tier, error=None):
+    if isinstance(error, StreamCancelled):
+        error = None  # Stopped by the caller, not a failure of the model
+    if tier.name is not None:
+        get_stats().observe(operation, tier.model, call.elapsed_ms(), error is None)
+    call.finish(error=error)
+
+def tracked_call(operation, model, fn, contents=None):
+    """
+    Run a non-streaming SDK call (e.g. chat.send_message) under the rate limit
+    and retries, recording it in telemetry like generate_text does.
+
+    Returns:
+        The SDK response
+    """
+    call = start_call(operation, model, contents)
+
+    def attempt():
+        call.attempt()
+        return fn()
+
+    try:
+        response = call_with_retry(attempt)
+    except Exception as e:
+        call.finish(error=e)
+        raise
+    call.chunk(getattr(response, "text", None) or "", getattr(response, "usage_metadata", None))
+    call.finish()
+    return response
+
+async def gather_bounded(coroutine_fn, items, concurrency=4):
+    """
+    Run coroutine_fn(item) for every item with at most `concurrency` running at once.
+
+    Returns:
+        list: One entry per item, in input order. A failed item holds the
+        exception it raised instead of a result, so one failure does not
+        discard the others.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def bounded(item):
+        async with semaphore:
+            return await coroutine_fn(item)
+
+    return await asyncio.gather(*(bounded(item) for item in items), return_exceptions=True)
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Cache location and limits, overridable from the environment
+CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "llm_cache.db")
+CACHE_TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_MAX_BYTES = int(float(os.environ.get("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+def _fingerprint(value):
+    """Convert SDK objects into JSON-friendly data, hashing binary payloads."""
+    if isinstance(value, type) and hasattr(value, "model_json_schema"):
+        # A response_schema class: a changed schema must not reuse responses cached under the old one
+        value = value.model_json_schema()
+    elif hasattr(value, "model_dump"):
+        value = value.model_dump(exclude_none=True)
+    if isinstance(value, (bytes, bytearray)):
+        return {"sha256": hashlib.sha256(value).hexdigest(), "size": len(value)}
+    if isinstance(value, dict):
+        return {str(k): _fingerprint(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_fingerprint(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+def make_key(model, contents, config):
+    """
+    Build the cache key for a generation request.
+    The key covers the model name, the prompt contents and the full generation
+    config, which includes the system instruction.
+    """
+    payload = json.dumps(
+        {"model": model, "contents": _fingerprint(contents), "config": _fingerprint(config)},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """Disk-backed cache of model responses with TTL expiry and LRU eviction by size."""
+
+    def __init__(self, path=CACHE_PATH, ttl_seconds=CACHE_TTL_SECONDS, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.metrics = {"hits": 0, "misses": 0, "writes": 0, "expired": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # WAL lets Streamlit sessions and API workers read while one process writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL,
+                hits INTEGER DEFAULT 0
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(last_accessed)')
+        self.conn.commit()
+
+    def get(self, key):
+        """Return the cached response for a key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT response, created_at FROM llm_cache WHERE cache_key = ?', (key,)
+            ).fetchone()
+            if row and now - row[1] > self.ttl_seconds:
+                self.conn.execute('DELETE FROM llm_cache WHERE cache_key = ?', (key,))
+                self.conn.commit()
+                self.metrics["expired"] += 1
+                row = None
+            if row is None:
+                self.metrics["misses"] += 1
+                return None
+            self.conn.execute(
+                'UPDATE llm_cache SET last_accessed = ?, hits = hits + 1 WHERE cache_key = ?', (now, key)
+            )
+            self.conn.commit()
+            self.metrics["hits"] += 1
+            return row[0]
+
+    def set(self, key, model, response):
+        """Store a response and evict least recently used entries beyond the size limit."""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO llm_cache (cache_key, model, response, size_bytes, created_at, last_accessed)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (key, model, response, size, now, now))
+            self.metrics["writes"] += 1
+            self._evict()
+            self.conn.commit()
+
+    def delete(self, key):
+        """Remove a single entry."""
+        with self._lock:
+            self.conn.execute('DELETE FROM llm_cache WHERE cache_key = ?', (key,))
+            self.conn.commit()
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self.conn.execute('DELETE FROM llm_cache')
+            self.conn.commit()
+
+    def _evict(self):
+        """Drop expired entries, then the least recently used ones until under max_bytes."""
+        cursor = self.conn.execute(
+            'DELETE FROM llm_cache WHERE created_at < ?', (time.time() - self.ttl_seconds,)
+        )
+        self.metrics["expired"] += max(cursor.rowcount, 0)
+
+        total = self.conn.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM llm_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        to_delete = []
+        for key, size in self.conn.execute('SELECT cache_key, size_bytes FROM llm_cache ORDER BY last_accessed'):
+            if total <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            total -= size
+        self.conn.executemany('DELETE FROM llm_cache WHERE cache_key = ?', to_delete)
+        self.metrics["evictions"] += len(to_delete)
+
+    def stats(self):
+        """Return hit/miss counters for this process plus the current cache size."""
+        with self._lock:
+            entries, total = self.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM llm_cache'
+            ).fetchone()
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "hit_rate": round(self.metrics["hits"] / lookups, 3) if lookups else None,
+            "entries": entries,
+            "size_bytes": total,
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Get the process-wide cache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
@@ -1,10 +1,14 @@
-from fastapi import FastAPI, HTTPException, UploadFile, Form, File
+from fastapi import FastAPI, HTTPException, UploadFile, Form, File, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from database import Database
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
 import shutil
+import uuid
+from quiz_batch import generate_quiz_batch
+from dedup import find_near_duplicate, index_question
+from processing_pipeline import enqueue_document, ensure_worker, processing_status
 
 app = FastAPI()
 
@@ -19,6 +23,9 @@ app.add_middleware(
 
 db = Database("eduplatform.db")
 
+# Work off documents queued by earlier runs or by ingestion scripts
+ensure_worker(db.db_name)
+
 # Ensure uploads directory exists
 os.makedirs("uploads", exist_ok=True)
 
@@ -32,6 +39,16 @@ class QuizQuestionCreate(BaseModel):
     correct_option: str
     options: List[str]
 
+class QuizBatchCreate(BaseModel):
+    document_ids: List[int]
+    num_questions: int = 5
+    questions_per_document: Optional[Dict[int, int]] = None  # overrides num_questions per document
+    concurrency: int = 4
+    use_cache: bool = True
+
+# Progress of batch quiz jobs, kept in memory by job id
+quiz_batch_jobs = {}
+
 @app.post("/users/")
 def create_user(user: UserCreate):
     user_id = db.add_user(user.name, user.email, user.role)
@@ -72,21 +89,90 @@ async def upload_document(
     # Add document to database
     document_id = db.add_document(user_id, file_path, source_type)
     
-    return {"document_id": document_id, "file_path": file_path}
+    # Extract, summarize, index topics and build a first quiz in the background
+    stages = enqueue_document(db, document_id)
+    
+    return {"document_id": document_id, "file_path": file_path, "processing": stages}
+
+@app.get("/documents/{document_id}/processing/")
+def get_document_processing(document_id: int):
+    status = processing_status(db, document_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="No processing queued for this document")
+    return {
+        "document_id": document_id,
+        "stages": [{"stage": stage, "status": state, "detail": detail} for stage, (state, detail) in status.items()],
+    }
 
 @app.post("/quizzes/")
 def create_quiz(document_id: int):
     quiz_id = db.create_quiz(document_id)
     return {"quiz_id": quiz_id}
 
+@app.post("/quizzes/batch/")
+def create_quiz_batch(batch: QuizBatchCreate, background_tasks: BackgroundTasks):
+    if not batch.document_ids:
+        raise HTTPException(status_code=400, detail="document_ids must not be empty")
+    
+    job_id = uuid.uuid4().hex
+    job = {"job_id": job_id, "status": "running", "done": 0, "total": len(batch.document_ids), "quizzes": []}
+    quiz_batch_jobs[job_id] = job
+    
+    def progress(done, total, entry):
+        job["done"] = done
+        job["quizzes"].append(entry)
+    
+    # A plain function runs in the threadpool, so the batch gets its own event loop
+    # and its blocking database, cache and rate limiter I/O stays off the API's loop
+    def run():
+        num_questions = {
+            document_id: (batch.questions_per_document or {}).get(document_id, batch.num_questions)
+            for document_id in batch.document_ids
+        }
+        try:
+            report = generate_quiz_batch(
+                batch.document_ids,
+                num_questions,
+                db_name="eduplatform.db",
+                concurrency=batch.concurrency,
+                use_cache=batch.use_cache,
+                on_progress=progress,
+            )
+            job.update(report, status="finished")
+        except Exception as e:
+            job.update(status="failed", error=str(e))
+    
+    background_tasks.add_task(run)
+    return {"job_id": job_id}
+
+@app.get("/quizzes/batch/{job_id}")
+def get_quiz_batch(job_id: str):
+    job = quiz_batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job
+
 @app.post("/quizzes/{quiz_id}/questions/")
 def add_quiz_question(quiz_id: int, question: QuizQuestionCreate):
+    quiz = db.cursor.execute('SELECT document_id FROM quizzes WHERE quiz_id = ?', (quiz_id,)).fetchone()
+    if quiz is None:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    
+    # Reject near-duplicates of questions already stored for the document
+    duplicate = find_near_duplicate(db, question.question_text, question.correct_option, quiz[0])
+    if duplicate:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Question is a near-duplicate of stored {duplicate[0]} question {duplicate[1]}"
+        )
+    
     question_id = db.add_quiz_question(
         quiz_id, 
         question.question_text, 
         question.correct_option, 
         question.options
     )
+    index_question(db, 'quiz', question_id, quiz[0], question.question_text, question.correct_option)
     return {"question_id": question_id}
 
 @app.post("/quiz-attempts/")
@@ -0,0 +1,176 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+
+from chunking import CHARS_PER_TOKEN
+from telemetry import TELEMETRY_PATH, measure_contents, percentile
+
+# Callers pass ROUTED as the model to let llm.generate_text pick one per call
+ROUTED = "routed"
+
+# Model tiers, fastest first. Each can be pointed at another model from the environment.
+TIERS = {
+    "lite": os.environ.get("GEMINI_MODEL_LITE", "gemini-2.0-flash-lite"),
+    "flash": os.environ.get("GEMINI_MODEL_FLASH", "gemini-2.5-flash-preview-04-17"),
+    "pro": os.environ.get("GEMINI_MODEL_PRO", "gemini-2.5-pro-preview-05-06"),
+}
+
+# Routes per operation: tiers in order of preference as
+# (tier, largest input in tokens it is used for or None, read timeout in seconds),
+# plus the p95 latency in milliseconds a tier has to stay under to keep its place.
+# Override with MODEL_ROUTES, JSON of the same shape or the path of a JSON file, e.g.
+#     MODEL_ROUTES='{"quiz": {"tiers": [["lite", 4000, 30], ["flash", null, 90]], "target_p95_ms": 15000}}'
+DEFAULT_ROUTES = {
+    "summary": {"tiers": [["lite", 4000, 30], ["flash", None, 120], ["pro", None, 300]], "target_p95_ms": 20000},
+    "summary_chunk": {"tiers": [["lite", 8000, 30], ["flash", None, 90]], "target_p95_ms": 15000},
+    "summary_reduce": {"tiers": [["flash", None, 60], ["lite", None, 30]], "target_p95_ms": 15000},
+    "quiz": {"tiers": [["flash", None, 90], ["lite", None, 30]], "target_p95_ms": 20000},
+    "ocr": {"tiers": [["flash", None, 300], ["pro", None, 600]], "target_p95_ms": 120000},
+    "default": {"tiers": [["flash", None, 120], ["lite", None, 60]], "target_p95_ms": 30000},
+}
+
+# Binary input (PDF pages, images) is counted at roughly this many bytes per token
+BINARY_BYTES_PER_TOKEN = 200
+# Recent calls kept per (operation, model), and how long they count
+WINDOW_CALLS = 50
+WINDOW_SECONDS = 15 * 60
+# Fewer recent calls than this and a tier keeps its configured place
+MIN_SAMPLES = 5
+# A tier failing more often than this goes to the back of the route
+MAX_ERROR_RATE = 0.5
+
+def load_routes():
+    """DEFAULT_ROUTES with the operations in MODEL_ROUTES replaced."""
+    routes = dict(DEFAULT_ROUTES)
+    configured = os.environ.get("MODEL_ROUTES", "").strip()
+    if configured:
+        if not configured.startswith("{"):
+            with open(configured, "r", encoding="utf-8") as f:
+                configured = f.read()
+        routes.update(json.loads(configured))
+    return routes
+
+ROUTES = load_routes()
+
+def estimate_input_tokens(contents):
+    """Rough prompt size in tokens: text by characters, PDFs and images by bytes."""
+    chars, size = measure_contents(contents)
+    return chars // CHARS_PER_TOKEN + size // BINARY_BYTES_PER_TOKEN
+
+class Tier:
+    """One step of a route: the model to call and how long a stalled response is waited for."""
+
+    def __init__(self, name, model, timeout_seconds, reason):
+        self.name = name
+        self.model = model
+        self.timeout_seconds = timeout_seconds
+        self.reason = reason
+
+class RouteStats:
+    """
+    Recent latency and errors per (operation, model), from this process's calls
+    and, on first use, from the calls in the telemetry database.
+    """
+
+    def __init__(self, telemetry_path=TELEMETRY_PATH):
+        self.telemetry_path = telemetry_path
+        self.calls = defaultdict(lambda: deque(maxlen=WINDOW_CALLS))
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        if not os.path.exists(self.telemetry_path):
+            return
+        try:
+            conn = sqlite3.connect(self.telemetry_path, timeout=5)
+            try:
+                rows = conn.execute('''
+                    SELECT operation, model, started_at, latency_ms, status FROM llm_calls
+                    WHERE started_at >= ? AND cache_hit = 0
+                    ORDER BY started_at
+                ''', (time.time() - WINDOW_SECONDS,)).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return
+        for operation, model, started_at, latency_ms, status in rows:
+            self.calls[(operation, model)].append((started_at, latency_ms, status == "ok"))
+
+    def observe(self, operation, model, latency_ms, ok):
+        """Record a call that reached the model."""
+        with self._lock:
+            self.calls[(operation, model)].append((time.time(), latency_ms, ok))
+
+    def summary(self, operation, model):
+        """
+        Returns:
+            tuple: (calls in the window, error rate, p95 latency of successful calls in ms or None)
+        """
+        with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                self._load()
+            cutoff = time.time() - WINDOW_SECONDS
+            recent = [call for call in self.calls[(operation, model)] if call[0] >= cutoff]
+        if not recent:
+            return 0, 0.0, None
+        errors = sum(1 for _, _, ok in recent if not ok)
+        latencies = [latency for _, latency, ok in recent if ok]
+        return len(recent), errors / len(recent), percentile(latencies, 0.95) if latencies else None
+
+_stats = None
+_stats_lock = threading.Lock()
+
+def get_stats():
+    """Return the process-wide route statistics."""
+    global _stats
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                _stats = RouteStats()
+    return _stats
+
+def plan_route(operation, contents, routes=None, stats=None):
+    """
+    Order the tiers of an operation's route for one call.
+
+    Tiers too small for the input are left out. Of the rest, those failing
+    more than MAX_ERROR_RATE of recent calls go last, and those whose recent
+    p95 latency is over the route's target go after the ones within it;
+    otherwise the configured order is kept.
+
+    Returns:
+        list: Tier objects to try in order; each carries the reason it is where it is
+    """
+    routes = routes or ROUTES
+    stats = stats or get_stats()
+    route = routes.get(operation) or routes["default"]
+    target = route.get("target_p95_ms")
+    tokens = estimate_input_tokens(contents)
+
+    fitting = [(name, max_tokens, timeout) for name, max_tokens, timeout in route["tiers"]
+               if max_tokens is None or tokens <= max_tokens]
+    if not fitting:
+        # Nothing is configured for inputs this large; the last tier is the biggest
+        fitting = [route["tiers"][-1]]
+
+    healthy, slow, failing = [], [], []
+    for name, max_tokens, timeout in fitting:
+        model = TIERS.get(name, name)
+        calls, error_rate, p95 = stats.summary(operation, model)
+        if calls >= MIN_SAMPLES and error_rate > MAX_ERROR_RATE:
+            failing.append(Tier(name, model, timeout, f"{error_rate:.0%} of {calls} recent calls failed"))
+        elif calls >= MIN_SAMPLES and target and p95 is not None and p95 > target:
+            slow.append(Tier(name, model, timeout, f"p95 {p95:.0f}ms over the {target}ms target"))
+        else:
+            size = f"~{tokens} tokens" + (f" within {max_tokens}" if max_tokens else "")
+            healthy.append(Tier(name, model, timeout, size if p95 is None else f"{size}, p95 {p95:.0f}ms"))
+
+    ordered = healthy + slow + failing
+    if ordered[0].name != fitting[0][0]:
+        demoted = next(tier for tier in ordered if tier.name == fitting[0][0])
+        ordered[0].reason = f"{ordered[0].reason}; {demoted.name} skipped, {demoted.reason}"
+    return ordered
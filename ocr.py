@@ -1,25 +1,67 @@
 import base64
 import os
+import re
 import json
 import sqlite3
-from google import genai
+import sys
+import PyPDF2
 from google.genai import types
 from dotenv import load_dotenv
+from llm import agenerate_text, gather_bounded, generate_text, is_json
+from model_routing import ROUTED
+from database import Database
+from processing_pipeline import enqueue_document
 
 # Load environment variables from .env file
 load_dotenv()
 
-def generate_from_pdf(pdf_file_path: str):
+def ocr_pdf(pdf_file_path: str, echo=True, use_cache=True):
+    """
+    Send a PDF to Gemini for OCR and return the raw JSON response text.
+    Identical PDFs are served from the response cache unless use_cache is False.
+    Raises on API errors so callers can decide how to record the failure.
+    """
+    model, contents, generate_content_config = _ocr_request(pdf_file_path)
+
+    if echo:
+        print(f"Generating content from PDF: {pdf_file_path}")
+    return generate_text(
+        model,
+        contents,
+        generate_content_config,
+        use_cache=use_cache,
+        validate=is_json,
+        on_chunk=(lambda text: print(text, end="")) if echo else None,
+        operation="ocr",
+    )
+
+async def aocr_pdf(pdf_file_path: str, use_cache=True):
+    """Async version of ocr_pdf built on the async Gemini client."""
+    model, contents, generate_content_config = _ocr_request(pdf_file_path)
+    return await agenerate_text(
+        model, contents, generate_content_config, use_cache=use_cache, validate=is_json, operation="ocr"
+    )
+
+async def ocr_pdfs_many(pdf_file_paths, concurrency=4, use_cache=True):
+    """
+    OCR many PDFs concurrently.
+
+    Returns:
+        list: The raw JSON response text per PDF, in input order; PDFs that
+        failed hold the exception instead
+    """
+    return await gather_bounded(
+        lambda path: aocr_pdf(path, use_cache=use_cache), pdf_file_paths, concurrency
+    )
+
+def _ocr_request(pdf_file_path):
+    """Build the model, contents and config for an OCR request."""
     api_key = os.environ.get("GEMINI_API_KEY")
     
     if not api_key:
         raise ValueError("GEMINI_API_KEY environment variable not set. Please add it to your .env file or set it in your environment.")
-        
-    client = genai.Client(
-        api_key=api_key,
-    )
 
-    model = "gemini-2.5-flash-preview-04-17"  # Your specified model
+    model = ROUTED  # Tier picked per call, see model_routing
 
     # Read the PDF file in binary mode
     with open(pdf_file_path, "rb") as f:
@@ -42,58 +84,162 @@ def generate_from_pdf(pdf_file_path: str):
             types.Part.from_text(text="""You will be given a pdf of notes: Handwritten or Typed.
         Your task is to convert handwritten notes to clear text.
         If the pdf is in typed format, just parse the text.
-        The return should be a json file with the fields: subject, topics, text.
+        The return should be a json file with the fields: subject, topics, text, sections, pages.
+        "sections" is a list of objects with the fields title, content and topic
+        (the entry of "topics" the section belongs to).
+        "pages" is a list of objects with the fields page_number, text and confidence
+        (your confidence in the transcription of that page, from 0.0 to 1.0).
         Structure the JSON output with proper readability for formulas and examples."""),
         ],
     )
+    return model, contents, generate_content_config
 
-    print(f"Generating content from PDF: {pdf_file_path} using model {model}")
-    full_response = ""
+def generate_from_pdf(pdf_file_path: str, db_name='database.db'):
     try:
-        for chunk in client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
-        ):
-            if chunk.text:
-                print(chunk.text, end="")
-                full_response += chunk.text
+        full_response = ocr_pdf(pdf_file_path)
         
         # After completion, store the result in the database
-        store_ocr_result(pdf_file_path, full_response)
+        store_ocr_result(pdf_file_path, full_response, db_name)
         return full_response
     except Exception as e:
         print(f"An error occurred: {e}")
         return None
 
-def store_ocr_result(pdf_file_path, json_response):
-    """Store the OCR result in the database."""
+def text_layer_confidence(page_text):
+    """
+    Score extracted text-layer output between 0.0 and 1.0.
+    Scanned pages usually have no text layer or one full of stray symbols,
+    so the score is the share of non-space characters that are letters,
+    digits or common punctuation.
+    """
+    if not page_text or not page_text.strip():
+        return 0.0
+    visible = [c for c in page_text if not c.isspace()]
+    readable = sum(1 for c in visible if c.isalnum() or c in ".,;:!?()[]{}'\"-+=*/%<>_&")
+    return round(readable / len(visible), 3)
+
+def extract_pdf_pages(pdf_path, skip_pages=()):
+    """
+    Read the text layer of a PDF page by page.
+    Yields (page_number, text, confidence) tuples, skipping the given page numbers.
+    """
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for page_number, page in enumerate(reader.pages, start=1):
+            if page_number in skip_pages:
+                continue
+            page_text = page.extract_text() or ""
+            yield page_number, page_text, text_layer_confidence(page_text)
+
+def ocr_pages(ocr_data):
+    """
+    Return (page_number, text, confidence) tuples from an OCR result.
+    Falls back to a single page holding the full text when the model
+    did not return a page breakdown.
+    """
+    pages = []
+    for index, page in enumerate(ocr_data.get('pages') or [], start=1):
+        if not isinstance(page, dict):
+            continue
+        try:
+            page_number = int(page.get('page_number', index))
+        except (TypeError, ValueError):
+            page_number = index
+        try:
+            confidence = float(page['confidence']) if page.get('confidence') is not None else None
+        except (TypeError, ValueError):
+            confidence = None
+        pages.append((page_number, page.get('text', ''), confidence))
+    
+    if not pages and ocr_data.get('text'):
+        pages.append((1, ocr_data['text'], None))
+    return pages
+
+def _match_topic(title, content, topics):
+    """Pick the topic from the list that best fits a section."""
+    title_lower = (title or "").lower()
+    for topic in topics:
+        topic_lower = topic.lower()
+        if title_lower and (topic_lower in title_lower or title_lower in topic_lower):
+            return topic
+    
+    # Otherwise pick the topic whose words overlap most with the start of the section
+    section_words = set(re.findall(r'\w+', f"{title or ''} {(content or '')[:500]}".lower()))
+    best_topic, best_overlap = None, 0
+    for topic in topics:
+        overlap = len(section_words & set(re.findall(r'\w+', topic.lower())))
+        if overlap > best_overlap:
+            best_topic, best_overlap = topic, overlap
+    return best_topic
+
+def ocr_sections(ocr_data):
+    """
+    Return (title, content, topic) tuples from an OCR result.
+    Sections without a usable topic are matched against the document's
+    topic list, and fall back to their own title.
+    """
+    topics = ocr_data.get('topics') or []
+    if isinstance(topics, str):
+        topics = [t.strip() for t in topics.split(',')]
+    topics = [str(t) for t in topics if t]
+    
+    sections = []
+    for section in ocr_data.get('sections') or []:
+        if not isinstance(section, dict) or not section.get('content'):
+            continue
+        title = section.get('title') or None
+        content = section['content']
+        topic = section.get('topic')
+        if not isinstance(topic, str) or not topic.strip():
+            topic = _match_topic(title, content, topics) or title
+        sections.append((title, content, topic))
+    return sections
+
+def sections_to_text(sections):
+    """Join document_sections rows back into prompt text."""
+    parts = []
+    for section in sections:
+        title, content = section[3], section[4]
+        parts.append(f"## {title}\n\n{content}" if title else content)
+    return "\n\n".join(parts)
+
+def default_user_id(db):
+    """Get the default user's ID, creating the user if needed."""
+    db.cursor.execute('SELECT user_id FROM users WHERE email = ?', ('default@example.com',))
+    user = db.cursor.fetchone()
+    
+    if not user:
+        db.cursor.execute('''
+            INSERT INTO users (name, email, role)
+            VALUES (?, ?, ?)
+        ''', ('Default User', 'default@example.com', 'student'))
+        return db.cursor.lastrowid
+    return user[0]
+
+def store_ocr_result(pdf_file_path, json_response, db_name='database.db', user_id=None, content_hash=None):
+    """
+    Store the OCR result in the database, with the SHA-256 of the file if known.
+    Returns the new document ID, or None if the result could not be stored.
+    """
+    db = None
     try:
         # Parse the JSON response
         data = json.loads(json_response)
         
-        # Connect to the database
-        conn = sqlite3.connect('database.db')
-        cursor = conn.cursor()
+        # Connect to the database (creates any missing tables)
+        db = Database(db_name)
+        conn = db.conn
+        cursor = db.cursor
         
-        # First check if user exists, if not create a default user
-        cursor.execute('SELECT user_id FROM users WHERE email = ?', ('default@example.com',))
-        user = cursor.fetchone()
-        
-        if not user:
-            cursor.execute('''
-                INSERT INTO users (name, email, role)
-                VALUES (?, ?, ?)
-            ''', ('Default User', 'default@example.com', 'student'))
-            user_id = cursor.lastrowid
-        else:
-            user_id = user[0]
+        # Fall back to the default user when no user is given
+        if user_id is None:
+            user_id = default_user_id(db)
         
         # Add document to the database
         cursor.execute('''
-            INSERT INTO documents (user_id, original_file_url, source_type, text_content)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, pdf_file_path, 'text', data.get('text', '')))
+            INSERT INTO documents (user_id, original_file_url, source_type, text_content, content_hash)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (user_id, pdf_file_path, 'text', data.get('text', ''), content_hash))
         
         document_id = cursor.lastrowid
         
@@ -105,6 +251,16 @@ def store_ocr_result(pdf_file_path, json_response):
             VALUES (?, ?)
         ''', (document_id, summary_text))
         
+        # Store the per-page text
+        for page_number, page_text, confidence in ocr_pages(data):
+            cursor.execute('''
+                INSERT OR REPLACE INTO document_pages (document_id, page_number, text_content, extraction_method, confidence)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (document_id, page_number, page_text, 'ocr', confidence))
+        
+        # Store the sections so topic filters can select them (committed with the rest below)
+        db.replace_document_sections(document_id, ocr_sections(data), commit=False)
+        
         # Mark document as processed
         cursor.execute('''
             UPDATE documents 
@@ -113,7 +269,13 @@ def store_ocr_result(pdf_file_path, json_response):
         ''', (document_id,))
         
         conn.commit()
+        
+        # Queue the summary, topic index and first quiz; the app or
+        # "python processing_pipeline.py" works the queue off
+        enqueue_document(db, document_id, start=False)
+        db.close()
         print(f"\nSuccessfully stored OCR result in database with document_id: {document_id}")
+        return document_id
         
     except json.JSONDecodeError:
         print("Failed to parse JSON from the API response")
@@ -121,10 +283,18 @@ def store_ocr_result(pdf_file_path, json_response):
         print(f"Database error: {e}")
     except Exception as e:
         print(f"Error storing OCR result: {e}")
+    if db is not None:
+        # Keep nothing of a document that could not be stored completely
+        db.conn.rollback()
+        db.close()
+    return None
 
 if __name__ == "__main__":
-    # Path to your PDF file
-    pdf_path = "/Users/chethanar/newamx/QP-AMC/uploads/ada_mod2.pdf"
+    # Path to your PDF file (use ingest.py for whole directories)
+    if len(sys.argv) != 2:
+        print("Usage: python ocr.py PATH_TO_PDF")
+        sys.exit(1)
+    pdf_path = sys.argv[1]
     if not os.path.exists(pdf_path):
         print(f"Error: PDF file not found at {pdf_path}")
     else:
@@ -0,0 +1,401 @@
+# Question papers assembled from the stored question bank, without a model call.
+#
+# A paper mode (Basic, Advanced, Exam) sets the constraints: total marks,
+# the share of marks per difficulty and per question type, marks and minutes
+# per question, an optional time limit and whether every topic must appear.
+# Questions carry an estimated difficulty: the share of students answering
+# them correctly once enough have, otherwise cues in the wording.
+#
+# The solver is greedy over buckets of interchangeable questions (same
+# difficulty, type and topic), so its cost depends on the number of buckets
+# rather than the size of the bank: first one question per uncovered topic,
+# then the bucket that closes the largest difficulty and type gaps, then swaps
+# that close what is left of the marks gap.
+#
+#     python paper_assembly.py --db edumate.db --document 3 --mode exam
+
+import argparse
+import copy
+import random
+import re
+import sys
+from collections import defaultdict
+
+from database import Database
+
+DIFFICULTIES = ("easy", "medium", "hard")
+QUESTION_TYPES = ("mcq", "true_false")
+
+# Minutes a student needs per question, by type and difficulty
+MINUTES = {
+    "mcq": {"easy": 1, "medium": 1.5, "hard": 2.5},
+    "true_false": {"easy": 0.5, "medium": 0.75, "hard": 1},
+}
+
+MODES = {
+    "basic": {
+        "label": "Basic",
+        "total_marks": 10,
+        "time_limit_minutes": None,
+        "difficulty_mix": {"easy": 0.5, "medium": 0.4, "hard": 0.1},
+        "type_mix": {"mcq": 1.0},
+        "marks": {"easy": 1, "medium": 1, "hard": 1},
+        "cover_topics": False,
+    },
+    "advanced": {
+        "label": "Advanced",
+        "total_marks": 30,
+        "time_limit_minutes": None,
+        "difficulty_mix": {"easy": 0.3, "medium": 0.4, "hard": 0.3},
+        "type_mix": {"mcq": 0.7, "true_false": 0.3},
+        "marks": {"easy": 1, "medium": 2, "hard": 3},
+        "cover_topics": True,
+    },
+    "exam": {
+        "label": "Exam",
+        "total_marks": 50,
+        "time_limit_minutes": 60,
+        "difficulty_mix": {"easy": 0.2, "medium": 0.5, "hard": 0.3},
+        "type_mix": {"mcq": 0.8, "true_false": 0.2},
+        "marks": {"easy": 1, "medium": 2, "hard": 4},
+        "cover_topics": True,
+    },
+}
+
+# Responses needed before a question's difficulty comes from how often it is answered correctly
+MIN_RESPONSES = 5
+# Share of correct answers at or above which a question is easy, and at or below which it is hard
+EASY_CORRECT = 0.75
+HARD_CORRECT = 0.4
+# Weight of an uncovered topic against the difficulty and type gaps when picking the next question
+TOPIC_WEIGHT = 0.5
+
+_HARD_CUES = re.compile(r"\b(not|except|least|calculate|compute|derive|evaluate|analy[sz]e|justify|predict|why)\b",
+                        re.IGNORECASE)
+_EASY_CUES = re.compile(r"^\s*(what is|what are|define|name|who|when|which of the following is an?)\b", re.IGNORECASE)
+
+def paper_spec(mode="basic", **overrides):
+    """
+    The constraints of a paper mode, with any of its settings overridden.
+
+    Args:
+        mode (str): One of MODES
+        **overrides: Settings to replace, e.g. total_marks=40, or time_limit_minutes=None
+            for no time limit; ... (Ellipsis) leaves a setting as the mode has it
+
+    Returns:
+        dict: The mode's settings plus "mode" and "minutes"
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown paper mode {mode!r}, expected one of {', '.join(MODES)}")
+    spec = copy.deepcopy(MODES[mode])
+    spec.update({key: value for key, value in overrides.items() if value is not ...})
+    spec.setdefault("minutes", copy.deepcopy(MINUTES))
+    spec["mode"] = mode
+    return spec
+
+def marks_label(marks):
+    """"1 mark", "2 marks", ..."""
+    return f"{marks} mark" if marks == 1 else f"{marks} marks"
+
+def question_type(options):
+    """"true_false" for a True/False question, "mcq" otherwise."""
+    if len(options) == 2 and {str(option).strip().lower() for option in options} == {"true", "false"}:
+        return "true_false"
+    return "mcq"
+
+def estimate_difficulty(question_text, kind="mcq", responses=0, correct=0):
+    """
+    Estimate a question's difficulty: from the share of correct answers once it
+    has MIN_RESPONSES responses, otherwise from its wording.
+    """
+    if responses >= MIN_RESPONSES:
+        share = correct / responses
+        if share >= EASY_CORRECT:
+            return "easy"
+        return "hard" if share <= HARD_CORRECT else "medium"
+    score = min(2, len(_HARD_CUES.findall(question_text or "")))
+    if _EASY_CUES.match(question_text or ""):
+        score -= 1
+    if len((question_text or "").split()) > 30:
+        score += 1
+    if kind == "true_false":
+        score -= 1
+    if score < 0:
+        return "easy"
+    return "hard" if score >= 2 else "medium"
+
+def bank_items(db, document_id, topics=None):
+    """
+    The stored questions of a document as paper items, each with its type,
+    estimated difficulty and topic key. Questions with the same wording are kept once.
+    """
+    topics = [topic for topic in topics or [] if topic and topic != "All Topics"]
+    stats = db.get_question_response_stats(document_id)
+    items, seen = [], set()
+    for source, question_id, question_text, answer, topic, options in db.get_question_bank(document_id, topics or None):
+        key = " ".join(re.findall(r"\w+", (question_text or "").lower()))
+        if not key or key in seen or not options:
+            continue
+        seen.add(key)
+        kind = question_type(options)
+        responses, correct = stats.get((source, question_id), (0, 0))
+        items.append({
+            "question": question_text,
+            "options": options,
+            "answer": answer,
+            "topic": topic,
+            "topic_key": db.topic_key(topic) if topic else None,
+            "source": source,
+            "question_id": question_id,
+            "type": kind,
+            "difficulty": estimate_difficulty(question_text, kind, responses, correct),
+        })
+    return items
+
+def _shares(mix, present):
+    """Normalise a mix over the keys that are present; absent keys pass their share on."""
+    shares = {key: value for key, value in mix.items() if key in present and value > 0}
+    total = sum(shares.values())
+    return {key: value / total for key, value in shares.items()} if total else {}
+
+def assemble_paper(items, spec, topics=None, rng=None):
+    """
+    Select questions for a paper under the constraints of spec.
+
+    Args:
+        items (list): Candidate questions, as returned by bank_items
+        spec (dict): Constraints, as returned by paper_spec
+        topics (list, optional): Topic keys the paper has to cover (default: every topic in items)
+        rng (random.Random, optional): Decides between interchangeable questions
+
+    Returns:
+        dict: {"questions": the selected items with "marks" and "minutes" added,
+               "report": what was achieved against each constraint}
+    """
+    rng = rng or random.Random()
+    target = spec["total_marks"]
+    limit = spec.get("time_limit_minutes")
+    type_shares = _shares(spec["type_mix"], {item["type"] for item in items})
+    difficulty_shares = _shares(spec["difficulty_mix"], set(DIFFICULTIES))
+    difficulty_target = {d: target * share for d, share in difficulty_shares.items()}
+    type_target = {t: target * share for t, share in type_shares.items()}
+
+    # Questions in one bucket are interchangeable as far as the constraints go
+    buckets = defaultdict(list)
+    for item in items:
+        if item["type"] in type_shares:
+            buckets[(item["difficulty"], item["type"], item["topic_key"])].append(item)
+    for bucket in buckets.values():
+        rng.shuffle(bucket)
+
+    def marks(bucket_key):
+        return spec["marks"][bucket_key[0]]
+
+    def minutes(bucket_key):
+        return spec["minutes"][bucket_key[1]][bucket_key[0]]
+
+    chosen = []
+    state = {"marks": 0, "minutes": 0}
+    by_difficulty, by_type, by_topic = defaultdict(int), defaultdict(int), defaultdict(int)
+
+    def fits(bucket_key, freed_marks=0, freed_minutes=0):
+        if state["marks"] - freed_marks + marks(bucket_key) > target:
+            return False
+        return limit is None or state["minutes"] - freed_minutes + minutes(bucket_key) <= limit
+
+    def gain(bucket_key):
+        difficulty, kind, topic = bucket_key
+        value = marks(bucket_key)
+        closed = (min(value, max(0, difficulty_target.get(difficulty, 0) - by_difficulty[difficulty]))
+                  + min(value, max(0, type_target.get(kind, 0) - by_type[kind])))
+        return closed / value + TOPIC_WEIGHT / (1 + by_topic[topic])
+
+    def take(bucket_key):
+        item = buckets[bucket_key].pop()
+        chosen.append((bucket_key, item))
+        state["marks"] += marks(bucket_key)
+        state["minutes"] += minutes(bucket_key)
+        by_difficulty[bucket_key[0]] += marks(bucket_key)
+        by_type[bucket_key[1]] += marks(bucket_key)
+        by_topic[bucket_key[2]] += 1
+
+    def best(keys):
+        keys = [key for key in keys if buckets[key] and fits(key)]
+        return max(keys, key=gain) if keys else None
+
+    # One question per topic first, starting with the topics that have the fewest questions
+    available_topics = {key[2] for key in buckets if key[2]}
+    wanted_topics = set(topics) if topics else available_topics
+    if spec.get("cover_topics"):
+        sizes = {topic: sum(len(b) for key, b in buckets.items() if key[2] == topic) for topic in wanted_topics}
+        for topic in sorted(wanted_topics & available_topics, key=lambda topic: sizes[topic]):
+            key = best([key for key in buckets if key[2] == topic])
+            if key is not None:
+                take(key)
+
+    # Then whatever closes the largest gaps, until the marks are reached or nothing fits
+    while state["marks"] < target:
+        key = best(list(buckets))
+        if key is None:
+            break
+        take(key)
+
+    # Close a remaining marks gap by swapping a question for one worth more
+    swapped = True
+    while swapped and state["marks"] < target:
+        swapped = False
+        options = []
+        for index, (old_key, _) in enumerate(chosen):
+            # The last question of a topic that has to be covered is only swapped within the topic
+            keep_topic = spec.get("cover_topics") and by_topic[old_key[2]] == 1 and old_key[2] in wanted_topics
+            for new_key, bucket in buckets.items():
+                if not bucket or marks(new_key) <= marks(old_key) or (keep_topic and new_key[2] != old_key[2]):
+                    continue
+                if fits(new_key, marks(old_key), minutes(old_key)):
+                    options.append((marks(new_key) - marks(old_key), gain(new_key), index, new_key))
+        if options:
+            _, _, index, new_key = max(options)
+            old_key, old_item = chosen.pop(index)
+            buckets[old_key].append(old_item)
+            state["marks"] -= marks(old_key)
+            state["minutes"] -= minutes(old_key)
+            by_difficulty[old_key[0]] -= marks(old_key)
+            by_type[old_key[1]] -= marks(old_key)
+            by_topic[old_key[2]] -= 1
+            take(new_key)
+            swapped = True
+
+    # Easy questions first within each type, as papers are usually laid out
+    chosen.sort(key=lambda entry: (QUESTION_TYPES.index(entry[0][1]), DIFFICULTIES.index(entry[0][0])))
+    questions = [dict(item, marks=marks(key), minutes=minutes(key)) for key, item in chosen]
+
+    covered = sorted(topic for topic in wanted_topics if by_topic[topic])
+    missing = sorted(topic for topic in wanted_topics if not by_topic[topic])
+    problems = []
+    if state["marks"] < target:
+        problems.append(f"{state['marks']} of {target} marks: the bank has too few suitable questions")
+    for difficulty, wanted in difficulty_target.items():
+        if abs(by_difficulty[difficulty] - wanted) > max(1, 0.1 * target):
+            problems.append(f"{by_difficulty[difficulty]} marks of {difficulty} questions instead of {wanted:.0f}")
+    for kind, wanted in type_target.items():
+        if abs(by_type[kind] - wanted) > max(1, 0.1 * target):
+            problems.append(f"{by_type[kind]} marks of {kind} questions instead of {wanted:.0f}")
+    for kind in spec["type_mix"]:
+        if spec["type_mix"][kind] > 0 and kind not in type_shares:
+            problems.append(f"No {kind} questions in the bank")
+    if spec.get("cover_topics") and missing:
+        problems.append(f"No questions for {len(missing)} topic(s): {', '.join(missing)}")
+
+    return {
+        "questions": questions,
+        "report": {
+            "total_marks": state["marks"],
+            "target_marks": target,
+            "minutes": state["minutes"],
+            "time_limit_minutes": limit,
+            "difficulty": {d: (by_difficulty[d], round(difficulty_target.get(d, 0), 1)) for d in DIFFICULTIES},
+            "types": {t: (by_type[t], round(type_target.get(t, 0), 1)) for t in spec["type_mix"]},
+            "topics_covered": covered,
+            "topics_missing": missing,
+            "problems": problems,
+        },
+    }
+
+def assemble_for_document(db, document_id, mode="basic", topics=None, seed=None, **overrides):
+    """
+    Assemble a paper for a document from its stored questions.
+
+    Args:
+        db (Database): Open database
+        document_id (int): Document the paper is for
+        mode (str): One of MODES
+        topics (list, optional): Only use, and cover, these topics
+        seed (int, optional): Seed for the choice between interchangeable questions;
+            the same seed and bank give the same paper
+        **overrides: Settings of the mode to replace (see paper_spec)
+
+    Returns:
+        dict: assemble_paper's result plus "settings", the spec with the seed, topics and
+        report, as stored with the paper by save_paper
+    """
+    spec = paper_spec(mode, **overrides)
+    seed = random.randrange(2 ** 31) if seed is None else seed
+    topics = [topic for topic in topics or [] if topic and topic != "All Topics"]
+    items = bank_items(db, document_id, topics)
+    paper = assemble_paper(items, spec, [db.topic_key(topic) for topic in topics] or None, random.Random(seed))
+    paper["settings"] = dict(spec, seed=seed, topics=topics, source="bank", report=paper["report"])
+    return paper
+
+def save_paper(db, document_id, questions, settings):
+    """
+    Store a paper, its settings and its questions in one transaction.
+
+    Args:
+        questions (list): Question dicts with "question", "answer", "options" and
+            optionally "topic", "marks" and "difficulty". Questions with the "source" and
+            "question_id" of a bank question are stored as copies of it, which the bank skips.
+        settings (dict): How the paper was made, e.g. an assembled paper's "settings"
+
+    Returns:
+        int: The new paper_id
+    """
+    rows = [(question["question"], question["answer"], question["options"], question.get("topic"),
+             question.get("marks"), question.get("difficulty"),
+             question.get("source") if question.get("question_id") is not None else None,
+             question.get("question_id")) for question in questions]
+    return db.add_question_paper_with_questions(document_id, settings, rows)
+
+def load_paper(db, paper_id):
+    """
+    Load a stored paper.
+
+    Returns:
+        dict: {"paper_id", "document_id", "settings", "created_at", "questions"} with
+        questions in the same form as assemble_paper's, or None if there is no such paper
+    """
+    header = db.get_paper_settings(paper_id)
+    if header is None:
+        return None
+    document_id, settings, created_at = header
+    questions = []
+    for paper_question_id, question_text, answer, topic, marks, difficulty, options in \
+            db.get_paper_questions_with_options(paper_id):
+        question = {"question": question_text, "options": options, "answer": answer, "topic": topic,
+                    "source": "paper", "question_id": paper_question_id}
+        if marks is not None:
+            question.update(marks=marks, difficulty=difficulty)
+        questions.append(question)
+    return {"paper_id": paper_id, "document_id": document_id, "settings": settings,
+            "created_at": created_at, "questions": questions}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Assemble a question paper from the stored question bank.")
+    parser.add_argument("--db", default="edumate.db", help="SQLite database file")
+    parser.add_argument("--document", type=int, required=True, help="Document ID")
+    parser.add_argument("--mode", default="basic", choices=list(MODES))
+    parser.add_argument("--marks", type=int, default=..., help="Total marks (default: the mode's)")
+    parser.add_argument("--minutes", type=float, default=...,
+                        help="Time limit in minutes, 0 for none (default: the mode's)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--save", action="store_true", help="Store the paper in the database")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    paper = assemble_for_document(db, args.document, args.mode, seed=args.seed,
+                                  total_marks=args.marks,
+                                  time_limit_minutes=args.minutes if args.minutes is ... else args.minutes or None)
+    if args.save and paper["questions"]:
+        print(f"Saved as paper {save_paper(db, args.document, paper['questions'], paper['settings'])}\n")
+    db.close()
+    for number, question in enumerate(paper["questions"], 1):
+        print(f"Q{number}. [{marks_label(question['marks'])}, {question['difficulty']}] {question['question']}")
+    report = paper["report"]
+    print(f"\n{report['total_marks']}/{report['target_marks']} marks, {report['minutes']:g} minutes, "
+          f"seed {paper['settings']['seed']}")
+    for problem in report["problems"]:
+        print(f"- {problem}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
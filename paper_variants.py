@@ -0,0 +1,256 @@
+# Variant sets of a stored question paper: versions A, B, C, ... for an exam
+# hall, or one per student, each with the questions and their options in a
+# different order.
+#
+# A variant's orders are derived from the set's seed and the variant's label,
+# and stored in paper_variants as two small byte arrays (the question order,
+# then the option order of every question) rather than as copies of the
+# paper's rows. Answer keys, printable papers and grading all map through
+# these permutations.
+#
+#     python paper_variants.py --db edumate.db --paper 4 --count 30 --out variants
+#     python paper_variants.py --db edumate.db --paper 4 --grade B CADB-ABDC
+
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+from array import array
+
+from database import Database
+from paper_assembly import load_paper, marks_label, question_type
+
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+PAGE_BREAK = '\n<div style="page-break-after: always"></div>\n\n'
+# Marks answered in a response sheet as left blank
+BLANK = {"", "-", "_", "?", "."}
+
+def variant_labels(count):
+    """Labels for count variants: A to Z, then AA, AB, and so on."""
+    labels = []
+    for number in range(1, count + 1):
+        label = ""
+        while number:
+            number, rest = divmod(number - 1, len(LETTERS))
+            label = LETTERS[rest] + label
+        labels.append(label)
+    return labels
+
+def derive_variant(paper, seed, label, shuffle_options=True):
+    """
+    The question order and option orders of one variant. The same paper, seed
+    and label always give the same variant. True/false options keep their order.
+
+    Returns:
+        dict: {"label", "order": paper question index per position,
+               "option_orders": per paper question, original option index per position}
+    """
+    rng = random.Random(f"{seed}:{label}")
+    order = list(range(len(paper["questions"])))
+    rng.shuffle(order)
+    option_orders = []
+    for question in paper["questions"]:
+        positions = list(range(len(question["options"])))
+        if shuffle_options and question_type(question["options"]) != "true_false":
+            rng.shuffle(positions)
+        option_orders.append(positions)
+    return {"label": label, "order": order, "option_orders": option_orders}
+
+def _to_bytes(values, typecode):
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()  # stored little-endian
+    return packed.tobytes()
+
+def _from_bytes(blob, typecode):
+    values = array(typecode)
+    values.frombytes(blob)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tolist()
+
+def pack_variant(variant):
+    """The (question_order, option_orders) byte arrays stored for a variant."""
+    options = [position for positions in variant["option_orders"] for position in positions]
+    return _to_bytes(variant["order"], "H"), _to_bytes(options, "B")
+
+def unpack_variant(paper, label, question_order, option_orders):
+    """Rebuild a variant from its stored byte arrays."""
+    flat = _from_bytes(option_orders, "B")
+    per_question, start = [], 0
+    for question in paper["questions"]:
+        per_question.append(flat[start:start + len(question["options"])])
+        start += len(question["options"])
+    return {"label": label, "order": _from_bytes(question_order, "H"), "option_orders": per_question}
+
+def create_variants(db, paper_id, count=None, labels=None, seed=None, shuffle_options=True):
+    """
+    Create and store a variant set of a paper, replacing any earlier set.
+
+    Args:
+        db (Database): Open database
+        paper_id (int): The stored paper
+        count (int, optional): Number of variants, labelled A, B, C, ...
+        labels (list, optional): Labels to use instead, e.g. one per student
+        seed (int, optional): Seed of the set (default: a random one)
+        shuffle_options (bool): Permute the options as well as the questions
+
+    Returns:
+        tuple: (paper as returned by load_paper, list of variants, seed)
+    """
+    paper = load_paper(db, paper_id)
+    if paper is None:
+        raise ValueError(f"No question paper with ID {paper_id}")
+    labels = list(dict.fromkeys(str(label).strip() for label in labels if str(label).strip())) if labels \
+        else variant_labels(count or 1)
+    if len(paper["questions"]) > 0xFFFF or any(len(question["options"]) > 0xFF for question in paper["questions"]):
+        raise ValueError("Paper is too large to be stored as variants")
+    seed = random.randrange(2 ** 31) if seed is None else seed
+    variants = [derive_variant(paper, seed, label, shuffle_options) for label in labels]
+    db.replace_paper_variants(paper_id, seed, [(variant["label"],) + pack_variant(variant) for variant in variants])
+    return paper, variants, seed
+
+def load_variants(db, paper_id, label=None):
+    """
+    Load a paper and its stored variants (or the one with label).
+
+    Returns:
+        tuple: (paper, list of variants), or (None, []) if there is no such paper
+    """
+    paper = load_paper(db, paper_id)
+    if paper is None:
+        return None, []
+    rows = db.get_paper_variants(paper_id, label)
+    return paper, [unpack_variant(paper, label, question_order, option_orders)
+                   for label, _, question_order, option_orders in rows]
+
+def _answer_indexes(paper):
+    """Original index of the correct option of every question."""
+    return [question["options"].index(question["answer"]) if question["answer"] in question["options"] else None
+            for question in paper["questions"]]
+
+def answer_key(paper, variant, answers=None):
+    """
+    The correct letter at each position of a variant, as a string like "CADB".
+    "?" marks a question whose answer is not among its options.
+    """
+    answers = answers or _answer_indexes(paper)
+    key = []
+    for index in variant["order"]:
+        correct = answers[index]
+        key.append("?" if correct is None else LETTERS[variant["option_orders"][index].index(correct)])
+    return "".join(key)
+
+def answer_keys_csv(paper, variants):
+    """Answer keys of a set as CSV: one row per variant, one column per question position."""
+    answers = _answer_indexes(paper)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["variant"] + [f"Q{number}" for number in range(1, len(paper["questions"]) + 1)])
+    for variant in variants:
+        writer.writerow([variant["label"]] + list(answer_key(paper, variant, answers)))
+    return output.getvalue()
+
+def render_variant(paper, variant, title=None):
+    """A variant as printable Markdown, without answers."""
+    title = title or f"Question Paper {paper['paper_id']}"
+    lines = [f"## {title} - Set {variant['label']}\n"]
+    for number, index in enumerate(variant["order"], 1):
+        question = paper["questions"][index]
+        marks = f" ({marks_label(question['marks'])})" if question.get("marks") else ""
+        lines.append(f"**Q{number}.** {question['question']}{marks}\n")
+        options = question["options"]
+        lines.extend(f"{LETTERS[position]}. {options[original]}"
+                     for position, original in enumerate(variant["option_orders"][index]))
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+def printable_set(paper, variants, title=None):
+    """Every variant of a set as one printable Markdown document, one variant per page."""
+    return PAGE_BREAK.join(render_variant(paper, variant, title) for variant in variants)
+
+def grade_response(paper, variant, response):
+    """
+    Grade a response sheet by mapping each answer back through the variant's permutations.
+
+    Args:
+        response (str or list): The letter chosen at each position, e.g. "CA-B";
+            blanks are "", "-", "_", "?" or "."
+
+    Returns:
+        dict: {"correct", "answered", "total", "marks", "max_marks",
+               "questions": [(paper question index, chosen option text or None, is_correct)] in paper order}
+    """
+    letters = list(response)
+    answers = _answer_indexes(paper)
+    chosen = {}
+    for position, index in enumerate(variant["order"]):
+        letter = str(letters[position]).strip().upper() if position < len(letters) and letters[position] else ""
+        if letter in BLANK or letter not in LETTERS[:len(variant["option_orders"][index])]:
+            continue
+        chosen[index] = variant["option_orders"][index][LETTERS.index(letter)]
+
+    results, marks, max_marks = [], 0, 0
+    for index, question in enumerate(paper["questions"]):
+        weight = question.get("marks") or 1
+        max_marks += weight
+        is_correct = index in chosen and chosen[index] == answers[index]
+        if is_correct:
+            marks += weight
+        results.append((index, question["options"][chosen[index]] if index in chosen else None, is_correct))
+    return {
+        "correct": sum(1 for _, _, is_correct in results if is_correct),
+        "answered": len(chosen),
+        "total": len(results),
+        "marks": marks,
+        "max_marks": max_marks,
+        "questions": results,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create, print and grade variant sets of a question paper.")
+    parser.add_argument("--db", default="edumate.db", help="SQLite database file")
+    parser.add_argument("--paper", type=int, required=True, help="Paper ID")
+    parser.add_argument("--count", type=int, help="Create this many variants (A, B, C, ...)")
+    parser.add_argument("--labels", help="Create one variant per label in this file, one per line (e.g. roll numbers)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--keep-options", action="store_true", help="Only shuffle the question order")
+    parser.add_argument("--out", help="Write variants.md and answer_keys.csv of the stored set to this directory")
+    parser.add_argument("--grade", nargs=2, metavar=("LABEL", "ANSWERS"), help="Grade one response sheet")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    try:
+        if args.count or args.labels:
+            labels = None
+            if args.labels:
+                with open(args.labels, encoding="utf-8") as f:
+                    labels = f.read().splitlines()
+            _, variants, seed = create_variants(db, args.paper, args.count, labels, args.seed,
+                                                shuffle_options=not args.keep_options)
+            print(f"Stored {len(variants)} variants of paper {args.paper} (seed {seed})")
+        if args.out:
+            paper, variants = load_variants(db, args.paper)
+            os.makedirs(args.out, exist_ok=True)
+            with open(os.path.join(args.out, "variants.md"), "w", encoding="utf-8") as f:
+                f.write(printable_set(paper, variants))
+            with open(os.path.join(args.out, "answer_keys.csv"), "w", encoding="utf-8", newline="") as f:
+                f.write(answer_keys_csv(paper, variants))
+            print(f"Wrote {len(variants)} variants to {args.out}")
+        if args.grade:
+            label, response = args.grade
+            paper, variants = load_variants(db, args.paper, label)
+            if not variants:
+                print(f"Paper {args.paper} has no variant {label}")
+                return 1
+            result = grade_response(paper, variants[0], response)
+            print(f"Set {label}: {result['correct']}/{result['total']} correct, "
+                  f"{result['marks']}/{result['max_marks']} marks")
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+# Background processing of new documents. Adding a document (upload, OCR,
+# bulk ingestion or the API) queues these stages in processing_jobs:
+#
+#   extract   text of the uploaded file, if the document has none yet
+#   summary   a stored summary, so "Manage Summaries" opens with one ready
+#   topics    sections indexed under the summary's topics, if OCR gave none
+#   quiz      a first quiz, whose questions later quizzes reuse from the bank
+#
+# Stages of one document run in order; every stage is skipped when its result
+# already exists. A failed stage is retried, waiting longer before each
+# retry, until it has had MAX_ATTEMPTS. The app and the API run a worker
+# thread in-process; queued jobs can also be worked off from the command line:
+#
+#     python processing_pipeline.py --db edumate.db          # run until the queue is empty
+#     python processing_pipeline.py --db edumate.db --watch  # keep polling
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from chunking import split_text
+from context_selection import parse_stored_summary
+from database import Database
+from question_bank import build_quiz
+from quiz_batch import document_quiz_input
+from single_flight import coalesce
+from summerize import format_summary, generate_summary
+
+STAGES = ("extract", "summary", "topics", "quiz")
+# Comma-separated stages to queue for new documents; empty disables the pipeline
+PIPELINE_STAGES = [stage.strip() for stage in os.environ.get("PIPELINE_STAGES", ",".join(STAGES)).split(",")
+                   if stage.strip()]
+# Questions in the first quiz generated for a document
+PIPELINE_QUIZ_QUESTIONS = int(os.environ.get("PIPELINE_QUIZ_QUESTIONS", "5"))
+# Worker threads per process and how often an idle worker checks the queue
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", "2"))
+POLL_SECONDS = float(os.environ.get("PIPELINE_POLL_SECONDS", "2"))
+# Attempts before a stage is marked failed, and when a running job counts as abandoned
+MAX_ATTEMPTS = 3
+STALE_SECONDS = 30 * 60
+# Delay before the first retry of a failed stage, doubled for every further attempt
+RETRY_SECONDS = float(os.environ.get("PIPELINE_RETRY_SECONDS", "30"))
+# Size of the text blocks indexed under a topic when the document has no sections
+SECTION_TOKENS = 400
+
+_workers = {}
+_workers_lock = threading.Lock()
+_wake = threading.Event()
+
+def _document(db, document_id):
+    return db.cursor.execute(
+        'SELECT document_id, original_file_url, text_content FROM documents WHERE document_id = ?',
+        (document_id,)
+    ).fetchone()
+
+def _plain_text(text_content):
+    """The text of a stored document, unwrapping OCR JSON."""
+    if text_content and text_content.strip().startswith('{') and text_content.strip().endswith('}'):
+        try:
+            return json.loads(text_content).get('text', text_content)
+        except (ValueError, AttributeError):
+            pass
+    return text_content or ""
+
+def extract_stage(db, document_id):
+    """Extract the text of the uploaded file (text layer, or OCR for scans and images)."""
+    # ingest imports ocr, which queues its documents through this module
+    from ingest import extract_file
+    from ocr import ocr_pages, ocr_sections
+
+    document = _document(db, document_id)
+    if document[2]:
+        return None
+    path = document[1]
+    if not path or not os.path.exists(path):
+        return None
+    if path.lower().endswith('.txt'):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        db.update_document_text(document_id, text)
+        return f"{len(text.split())} words from the text file"
+
+    result = extract_file(path)
+    if result["method"] == "ocr":
+        data = json.loads(result["ocr_response"])
+        pages = list(ocr_pages(data))
+        text = data.get('text', '')
+        sections = ocr_sections(data)
+    else:
+        pages = result["pages"]
+        text = "".join(page_text + "\n\n" for _, page_text, _ in pages if page_text)
+        sections = None
+    if not text.strip():
+        raise ValueError("No text could be extracted from the file")
+
+    # Sections, pages and text are stored together, so a failure leaves none of them
+    try:
+        if sections is not None:
+            db.replace_document_sections(document_id, sections, commit=False)
+        for page_number, page_text, confidence in pages:
+            db.add_document_page(document_id, page_number, page_text,
+                                 'ocr' if result["method"] == "ocr" else 'text_layer', confidence, commit=False)
+        db.update_document_text(document_id, text, commit=False)
+        db.update_document_processed(document_id, commit=False)
+        db.conn.commit()
+    except Exception:
+        db.conn.rollback()
+        raise
+    return f"{len(pages)} pages by {result['method']}"
+
+def _stored_subject(summary_text):
+    # OCR stores a "Subject: ...\nTopics: ..." placeholder until a real summary exists
+    if summary_text and summary_text.startswith("Subject:"):
+        subject = summary_text.split("\n", 1)[0][len("Subject:"):].strip()
+        return subject if subject and subject != "N/A" else None
+    return None
+
+def summary_stage(db, document_id):
+    """Summarize the document unless it already has a generated summary."""
+    document = _document(db, document_id)
+    text = _plain_text(document[2])
+    if not text.strip():
+        return None
+    latest = db.get_latest_summary(document_id)
+    # A summary restricted to some topics does not count as the document's summary
+    if any(text.startswith("# Summary") and covered is None
+           for text, covered in db.get_document_summaries(document_id)):
+        return None
+
+    topics = ", ".join(db.get_document_topics(document_id)) or None
+
+    def generate_and_store():
+        result = generate_summary(text, subject=_stored_subject(latest), topics=topics)
+        return db.add_summary(document_id, format_summary(result)) if result else None
+
+    # Shares the generation with a teacher clicking "Summarize Document" meanwhile
+    summary_id = coalesce("summary", document_id,
+                          {"db": os.path.abspath(db.db_name), "topics": None, "fresh": False}, generate_and_store)
+    if not summary_id:
+        raise ValueError("The model returned no summary")
+    return f"summary {summary_id}"
+
+def topics_stage(db, document_id):
+    """Index the document's text under the summary's topics when it has no sections."""
+    if db.get_document_sections(document_id):
+        return None
+    from ocr import ocr_sections
+
+    text = _plain_text(_document(db, document_id)[2])
+    _, summary_topics = parse_stored_summary(db.get_latest_summary(document_id))
+    topic_names = [name for name, _ in summary_topics]
+    if not text.strip() or not topic_names:
+        return None
+    sections = ocr_sections({
+        "topics": topic_names,
+        "sections": [{"content": block} for block in split_text(text, SECTION_TOKENS)],
+    })
+    db.replace_document_sections(document_id, sections)
+    indexed = {topic for _, _, topic in sections if topic}
+    return f"{len(sections)} sections under {len(indexed)} topics"
+
+def quiz_stage(db, document_id, count=None):
+    """Generate a first quiz unless the document already has one."""
+    if db.cursor.execute('SELECT 1 FROM quizzes WHERE document_id = ? LIMIT 1', (document_id,)).fetchone():
+        return None
+    request = document_quiz_input(db, document_id)
+    if request is None:
+        return None
+    text, topic = request
+    questions, _ = build_quiz(db, document_id, count or PIPELINE_QUIZ_QUESTIONS, text, topic)
+    if not questions:
+        raise ValueError("The model returned no usable questions")
+    return f"{len(questions)} questions"
+
+STAGE_FUNCTIONS = {
+    "extract": extract_stage,
+    "summary": summary_stage,
+    "topics": topics_stage,
+    "quiz": quiz_stage,
+}
+
+def enqueue_document(db, document_id, stages=None, start=True):
+    """
+    Queue the pipeline for a newly added document.
+
+    Args:
+        db (Database): Open database the document was added to
+        document_id (int): The new document
+        stages (list, optional): Stages to queue (default: PIPELINE_STAGES)
+        start (bool): Start a worker in this process; pass False from
+            short-lived scripts and let the app or the CLI work off the queue
+
+    Returns:
+        list: The stages queued
+    """
+    stages = [stage for stage in (PIPELINE_STAGES if stages is None else stages) if stage in STAGE_FUNCTIONS]
+    if not stages or document_id is None:
+        return []
+    db.enqueue_processing(document_id, stages)
+    if start:
+        ensure_worker(db.db_name)
+        _wake.set()
+    return stages
+
+def run_next_job(db):
+    """
+    Claim and run one ready job.
+
+    Returns:
+        tuple: (job_id, document_id, stage, status) or None if no job was ready
+    """
+    job = db.claim_processing_job()
+    if job is None:
+        return None
+    job_id, document_id, stage = job
+    try:
+        result = STAGE_FUNCTIONS[stage](db, document_id)
+        status = "done" if result else "skipped"
+        db.finish_processing_job(job_id, status, result)
+    except Exception as e:
+        attempts = db.cursor.execute('SELECT attempts FROM processing_jobs WHERE job_id = ?', (job_id,)).fetchone()[0]
+        if attempts < MAX_ATTEMPTS:
+            # Back off so that a quota or outage error does not use up every attempt at once
+            status = "pending"
+            db.finish_processing_job(job_id, status, error=str(e), retry_in=RETRY_SECONDS * 2 ** (attempts - 1))
+        else:
+            status = "failed"
+            db.finish_processing_job(job_id, status, error=str(e))
+    return job_id, document_id, stage, status
+
+def run_pending(db_name, watch=False, on_job=None):
+    """Work off the queue of a database; with watch, keep polling for new jobs."""
+    db = Database(db_name)
+    db.requeue_stale_processing_jobs(STALE_SECONDS)
+    try:
+        while True:
+            outcome = run_next_job(db)
+            if outcome is not None:
+                if on_job:
+                    on_job(outcome)
+                continue
+            if not watch:
+                return
+            _wake.wait(POLL_SECONDS)
+            _wake.clear()
+    finally:
+        db.close()
+
+def ensure_worker(db_name, workers=PIPELINE_WORKERS):
+    """Start the background worker threads for a database once per process."""
+    with _workers_lock:
+        threads = [thread for thread in _workers.get(db_name, []) if thread.is_alive()]
+        for index in range(len(threads), max(1, workers)):
+            thread = threading.Thread(target=run_pending, args=(db_name, True),
+                                      name=f"pipeline-{index}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        _workers[db_name] = threads
+
+def processing_status(db, document_id):
+    """The pipeline state of a document as {stage: (status, result or error)}."""
+    return {
+        stage: (status, error if status == "failed" else result)
+        for _, _, stage, status, _, result, error, _ in db.get_processing_jobs(document_id)
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run queued document processing jobs.")
+    parser.add_argument("--db", default="edumate.db", help="SQLite database file")
+    parser.add_argument("--watch", action="store_true", help="Keep polling for new jobs")
+    parser.add_argument("--enqueue", type=int, nargs="*", metavar="DOCUMENT_ID",
+                        help="Queue the pipeline for these documents first")
+    args = parser.parse_args(argv)
+
+    if args.enqueue:
+        db = Database(args.db)
+        for document_id in args.enqueue:
+            enqueue_document(db, document_id, start=False)
+        db.close()
+
+    def report(outcome):
+        job_id, document_id, stage, status = outcome
+        print(f"document {document_id}: {stage} {status}")
+
+    run_pending(args.db, watch=args.watch, on_job=report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import math
+import re
+from collections import Counter
+
+from chunking import CHARS_PER_TOKEN, estimate_tokens, split_text
+
+# Token budgets for the document text embedded in a prompt
+QUIZ_PROMPT_TOKENS = 8000
+PAPER_PROMPT_TOKENS = 12000
+# Paragraphs larger than this are split before passages are picked, so OCR text
+# with single newlines and no blank lines is not one block over any budget
+PASSAGE_TOKENS = 400
+
+# A header or footer is a short line found at the top or bottom of at least
+# this share of pages (and on at least three pages)
+REPEATED_LINE_PAGE_SHARE = 0.5
+EDGE_LINES = 2
+MAX_HEADER_LENGTH = 80
+
+_HYPHEN_BREAK = re.compile(r"(\w)-\n[ \t]*([a-z])")
+_SPACE_RUN = re.compile(r"[ \t ]+")
+_BLANK_RUN = re.compile(r"\n{3,}")
+_PAGE_NUMBER = re.compile(r"^(page\s*)?\d+(\s*(of|/)\s*\d+)?$", re.IGNORECASE)
+_WORD = re.compile(r"[a-zA-Z][a-zA-Z0-9]+")
+
+STOPWORDS = set("""
+a an and are as at be by for from has have in is it its of on or that the this to was
+were which with will can also into than then these those their there such not but
+""".split())
+
+def _line_key(line):
+    """Compare header/footer lines ignoring case, spacing and page numbers."""
+    return re.sub(r"\d+", "#", " ".join(line.split()).lower())
+
+def dehyphenate(text):
+    """Join words split across lines with a hyphen ("equa-\\ntion" -> "equation")."""
+    return _HYPHEN_BREAK.sub(r"\1\2", text)
+
+def normalize_whitespace(text):
+    """Collapse runs of spaces, strip line ends and allow at most one blank line in a row."""
+    lines = [_SPACE_RUN.sub(" ", line).strip() for line in text.replace("\r\n", "\n").split("\n")]
+    return _BLANK_RUN.sub("\n\n", "\n".join(lines)).strip()
+
+def repeated_lines(pages):
+    """
+    Find running headers and footers: short lines that open or close most pages.
+
+    Args:
+        pages (list): The text of each page, in order
+
+    Returns:
+        set: Normalised keys (see _line_key) of the lines to drop
+    """
+    if len(pages) < 3:
+        return set()
+    counts = Counter()
+    for page in pages:
+        lines = [line.strip() for line in (page or "").split("\n") if line.strip()]
+        edges = lines[:EDGE_LINES] + lines[-EDGE_LINES:]
+        counts.update({_line_key(line) for line in edges if len(line) <= MAX_HEADER_LENGTH})
+    needed = max(3, math.ceil(len(pages) * REPEATED_LINE_PAGE_SHARE))
+    return {key for key, count in counts.items() if count >= needed}
+
+def strip_repeated_lines(text, pages=None):
+    """
+    Remove page numbers and running headers/footers.
+    With the document's pages the headers are found from the page edges;
+    without them, short lines repeated at least three times are treated as headers.
+
+    Returns:
+        tuple: (text, number of lines removed)
+    """
+    lines = text.split("\n")
+    if pages:
+        drop = repeated_lines(pages)
+    else:
+        counts = Counter(_line_key(line) for line in lines
+                         if line.strip() and len(line.strip()) <= MAX_HEADER_LENGTH
+                         and not line.strip().startswith("#") and not line.strip().endswith(":"))
+        drop = {key for key, count in counts.items() if count >= 3}
+
+    kept = []
+    removed = 0
+    for line in lines:
+        stripped = line.strip()
+        if stripped and (_PAGE_NUMBER.match(stripped) or _line_key(stripped) in drop):
+            removed += 1
+            continue
+        kept.append(line)
+    return "\n".join(kept), removed
+
+def _words(text):
+    return {word.lower() for word in _WORD.findall(text) if word.lower() not in STOPWORDS}
+
+def select_passages(text, max_tokens):
+    """
+    Keep the most informative paragraphs that fit in max_tokens, in their original order.
+    Paragraphs are scored by the rarity (inverse document frequency across
+    paragraphs) of the terms they contain, per token, so dense definitions
+    beat repetitive filler. A heading is kept when any paragraph under it is.
+    Paragraphs over PASSAGE_TOKENS are split first; non-empty text never comes back empty.
+
+    Returns:
+        tuple: (text, number of passages considered, number kept)
+    """
+    blocks = [block.strip() for block in text.split("\n\n") if block.strip()]
+    passage_tokens = max(1, min(PASSAGE_TOKENS, max_tokens))
+    passages = []
+    heading = None
+    for block in blocks:
+        if block.startswith("#") and "\n" not in block:
+            heading = block
+            continue
+        passages.extend((heading, piece) for piece in split_text(block, passage_tokens))
+
+    if not passages:
+        return text, 0, 0
+
+    word_sets = [_words(block) for _, block in passages]
+    document_frequency = Counter(word for words in word_sets for word in words)
+    total = len(passages)
+
+    def score(index):
+        idf = sum(math.log(1 + total / document_frequency[word]) for word in word_sets[index])
+        return idf / math.sqrt(max(1, estimate_tokens(passages[index][1])))
+
+    chosen = set()
+    used = 0
+    seen_headings = set()
+    for index in sorted(range(total), key=score, reverse=True):
+        heading, block = passages[index]
+        # One token more per passage covers the blank line joining it and the estimate's rounding
+        cost = estimate_tokens(block) + 1 + (estimate_tokens(heading) + 1 if heading and heading not in seen_headings else 0)
+        if used + cost > max_tokens:
+            continue
+        chosen.add(index)
+        used += cost
+        if heading:
+            seen_headings.add(heading)
+    if not chosen:
+        # Not even one passage fits (a tiny budget): send the start of the most informative one
+        index = max(range(total), key=score)
+        return passages[index][1][:max(1, max_tokens) * CHARS_PER_TOKEN], total, 1
+
+    output = []
+    last_heading = None
+    for index, (heading, block) in enumerate(passages):
+        if index not in chosen:
+            continue
+        if heading and heading != last_heading:
+            output.append(heading)
+            last_heading = heading
+        output.append(block)
+    return "\n\n".join(output), total, len(chosen)
+
+def compact_text(text, max_tokens=None, pages=None):
+    """
+    Shrink document text before it goes into a prompt.
+    Steps: de-hyphenate line breaks, strip page numbers and running
+    headers/footers, normalise whitespace, drop duplicate paragraphs and,
+    if the result is still over max_tokens, keep only the most informative passages.
+
+    Args:
+        text (str): Document text
+        max_tokens (int, optional): Token budget; None only cleans the text up
+        pages (list, optional): Page texts of the document, used to find headers and footers
+
+    Returns:
+        tuple: (compacted text, stats dict with token counts before and after)
+    """
+    text = text or ""
+    stats = {"tokens_before": estimate_tokens(text), "chars_before": len(text)}
+
+    compacted = dehyphenate(text.replace("\r\n", "\n"))
+    compacted, stats["lines_removed"] = strip_repeated_lines(compacted, pages)
+    compacted = normalize_whitespace(compacted)
+
+    paragraphs = []
+    seen = set()
+    for paragraph in compacted.split("\n\n"):
+        key = " ".join(paragraph.split()).lower()
+        if key in seen and not paragraph.startswith("#"):
+            continue
+        seen.add(key)
+        paragraphs.append(paragraph)
+    stats["duplicate_paragraphs"] = len(compacted.split("\n\n")) - len(paragraphs)
+    compacted = "\n\n".join(paragraphs)
+    stats["tokens_cleaned"] = estimate_tokens(compacted)
+
+    stats["passages_total"] = stats["passages_kept"] = None
+    if max_tokens and stats["tokens_cleaned"] > max_tokens:
+        compacted, stats["passages_total"], stats["passages_kept"] = select_passages(compacted, max_tokens)
+
+    stats["tokens_after"] = estimate_tokens(compacted)
+    stats["chars_after"] = len(compacted)
+    stats["reduction"] = (
+        round(1 - stats["tokens_after"] / stats["tokens_before"], 3) if stats["tokens_before"] else 0.0
+    )
+    return compacted, stats
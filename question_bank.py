@@ -0,0 +1,148 @@
+import random
+import re
+
+from dedup import add_quiz_deduplicated
+from Qgen import generate_quiz
+from quiz_batch import quiz_rows
+
+# Questions served to or answered by a student within this many days are not reused
+RECENT_DAYS = 14
+
+def _normalize(text):
+    """Compare questions ignoring case, punctuation and spacing."""
+    return " ".join(re.findall(r"\w+", (text or "").lower()))
+
+def _as_question(row):
+    """Convert a get_question_bank row into the quiz JSON format."""
+    source, question_id, question_text, correct_option, topic, options = row
+    return {
+        "question": question_text,
+        "options": options,
+        "answer": correct_option,
+        "topic": topic,
+        "source": source,
+        "question_id": question_id,
+    }
+
+def plan_quiz(db, document_id, count, topics=None, user_id=None, recent_days=RECENT_DAYS, rng=None):
+    """
+    Draw as many questions as possible for a quiz from the stored bank.
+    Stored quiz and paper questions of the document (and topics, if given) are
+    eligible unless the student has seen them, or another copy of the same
+    wording, in the last recent_days days; questions with the same wording are
+    only used once.
+
+    Args:
+        db (Database): Open database
+        document_id (int): Document the quiz is for
+        count (int): Number of questions wanted
+        topics (list, optional): Only use questions tagged with these topics
+        user_id (int, optional): Student the quiz is for
+        recent_days (int): How long a seen question stays excluded
+        rng (random.Random, optional): Source of randomness for the draw
+
+    Returns:
+        dict: {"questions": drawn questions, "shortfall": how many still have to be
+               generated, "exclude": texts of every stored question, to keep the
+               generated ones from repeating them}
+    """
+    rng = rng or random.Random()
+    topics = [topic for topic in topics or [] if topic and topic != "All Topics"]
+    bank = db.get_question_bank(document_id, topics or None)
+    seen = db.get_recently_seen_questions(user_id, recent_days) if user_id else set()
+    # A paper may hold a copy of a quiz question (or the other way round); seeing one copy excludes all of them
+    seen_keys = {_normalize(row[2]) for row in (db.get_question_bank(document_id) if topics and seen else bank)
+                 if (row[0], row[1]) in seen}
+
+    eligible = {}
+    for row in bank:
+        key = _normalize(row[2])
+        if key and key not in eligible and key not in seen_keys and row[5]:
+            eligible[key] = row
+    drawn = rng.sample(list(eligible.values()), min(count, len(eligible)))
+
+    # Every stored question counts as an exclusion, including seen ones,
+    # so the model does not regenerate what the student has just answered
+    exclude = list(dict.fromkeys(row[2] for row in bank))
+    return {
+        "questions": [_as_question(row) for row in drawn],
+        "shortfall": count - len(drawn),
+        "exclude": exclude,
+    }
+
+def store_generated(db, document_id, plan, generated):
+    """
+    Store newly generated questions in the bank as a new quiz for the document,
+    so the next request can be served from them. Repeats of stored questions
+    are dropped.
+
+    Returns:
+        list: The stored questions, at most as many as the plan was missing
+    """
+    known = {_normalize(text) for text in plan["exclude"]}
+    known.update(_normalize(question["question"]) for question in plan["questions"])
+    fresh = []
+    for question_text, answer, options, topic in quiz_rows(generated):
+        if _normalize(question_text) in known:
+            continue
+        known.add(_normalize(question_text))
+        fresh.append((question_text, answer, options, topic))
+    if not fresh:
+        return []
+
+    # Paraphrases of stored questions are dropped as well as exact repeats
+    quiz_id, fresh, _ = add_quiz_deduplicated(db, document_id, fresh)
+    stored = db.get_quiz_questions(quiz_id) if quiz_id else []
+    questions = [
+        _as_question(('quiz', question_id, question_text, answer, topic, options))
+        for (question_id, _, _, _), (question_text, answer, options, topic) in zip(stored, fresh)
+    ]
+    # Only keep as many as were missing; extra questions still go into the bank
+    return questions[:max(0, plan["shortfall"])]
+
+def finish_quiz(db, plan, stored, user_id=None):
+    """
+    Put a quiz together from the drawn and the stored generated questions.
+    When a student is given, every question in the quiz is recorded as seen by them.
+
+    Returns:
+        list: The drawn questions followed by the generated ones
+    """
+    questions = list(plan["questions"]) + list(stored)
+    if user_id:
+        db.record_question_exposures(user_id, [(q["source"], q["question_id"]) for q in questions])
+    return questions
+
+def complete_plan(db, document_id, plan, generated, user_id=None):
+    """
+    Store the newly generated questions in the bank and finish the quiz.
+
+    Returns:
+        list: The drawn questions followed by the generated ones
+    """
+    return finish_quiz(db, plan, store_generated(db, document_id, plan, generated), user_id)
+
+def build_quiz(db, document_id, count, text, topic_label=None, topics=None, user_id=None,
+               recent_days=RECENT_DAYS, use_cache=True, generate=generate_quiz):
+    """
+    Build a quiz bank-first: stored questions are used where possible and the
+    model is only asked for the missing number.
+
+    Args:
+        text (str): Prompt text, only used if questions have to be generated
+        topic_label (str, optional): Topic passed to the generator
+        generate (callable, optional): Generator with generate_quiz's signature
+
+    Returns:
+        tuple: (questions, {"from_bank": int, "generated": int})
+    """
+    plan = plan_quiz(db, document_id, count, topics, user_id, recent_days)
+    generated = []
+    if plan["shortfall"] > 0:
+        generated = generate(text, topic_label, plan["shortfall"], use_cache=use_cache,
+                             exclude=plan["exclude"]) or []
+    questions = complete_plan(db, document_id, plan, generated, user_id)
+    return questions, {
+        "from_bank": len(plan["questions"]),
+        "generated": len(questions) - len(plan["questions"]),
+    }
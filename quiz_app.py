@@ -2,7 +2,7 @@ import streamlit as st
 import json
 import os
 from database import Database
-from Qgen import generate_quiz, save_quiz_to_file
+from Qgen import save_quiz_to_file, stream_quiz
 
 st.set_page_config(page_title="QUIZ", layout="centered")
 
@@ -107,31 +107,43 @@ try:
                 
                 topic_input = st.text_input("Topic/Subject", value=topics)
             
+            fresh_quiz = st.checkbox("Generate fresh questions", help="Ignore a cached quiz generated earlier from the same settings")
+            
             # Generate Quiz button
             if st.button("Generate Quiz"):
-                with st.spinner("Generating quiz questions..."):
-                    # Prepare text content
-                    try:
-                        if text_content.strip().startswith('{') and text_content.strip().endswith('}'):
-                            ocr_data = json.loads(text_content)
-                            if 'text' in ocr_data:
-                                text_content = ocr_data.get('text', '')
-                    except:
-                        pass
-                    
-                    # Generate quiz using Qgen.py
-                    quiz_data = generate_quiz(text_content, topic_input, num_questions)
+                # Prepare text content
+                try:
+                    if text_content.strip().startswith('{') and text_content.strip().endswith('}'):
+                        ocr_data = json.loads(text_content)
+                        if 'text' in ocr_data:
+                            text_content = ocr_data.get('text', '')
+                except:
+                    pass
+                
+                # Show each question as soon as it has been generated
+                status = st.empty()
+                status.info("Generating quiz questions...")
+                quiz_data = []
+                try:
+                    for question in stream_quiz(text_content, topic_input, num_questions, use_cache=not fresh_quiz):
+                        quiz_data.append(question)
+                        st.markdown(f"**Question {len(quiz_data)}:** {question.get('question', '')}")
+                        for option in question.get('options', []):
+                            st.markdown(f"- {option}")
+                        status.info(f"Generated {len(quiz_data)} of {num_questions} questions...")
+                except Exception as e:
+                    st.error(f"Error generating quiz: {str(e)}")
+                
+                if quiz_data:
+                    # Save quiz to file
+                    save_quiz_to_file(quiz_data)
+                    status.success(f"Generated {len(quiz_data)} quiz questions!")
                     
-                    if quiz_data:
-                        # Save quiz to file
-                        save_quiz_to_file(quiz_data)
-                        st.success(f"Generated {len(quiz_data)} quiz questions!")
-                        
-                        # Direct to quiz interface
-                        st.session_state.show_quiz = True
-                        st.rerun()
-                    else:
-                        st.error("Failed to generate quiz. Please try again.")
+                    # Direct to quiz interface
+                    st.session_state.show_quiz = True
+                    st.rerun()
+                else:
+                    status.error("Failed to generate quiz. Please try again.")
         else:
             st.warning("Selected document has no text content. Please choose another document.")
     else:
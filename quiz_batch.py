@@ -0,0 +1,180 @@
+# Generate quizzes for many documents at once, e.g. a whole course for a term:
+#     python quiz_batch.py 3 4 7 --questions 10 --db edumate.db
+#
+# Quizzes are generated concurrently (bounded by --concurrency) and each one is
+# written to quizzes/quiz_questions/question_options in a single transaction as
+# soon as it is ready, so an interrupted batch keeps the quizzes already made.
+# Near-duplicates of questions already stored for the document are dropped.
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from database import Database
+from dedup import add_quiz_deduplicated
+from context_selection import DEFAULT_POLICY, POLICIES, select_context
+from prompt_compaction import QUIZ_PROMPT_TOKENS
+from Qgen import agenerate_quiz
+
+def document_quiz_input(db, document_id, max_tokens=QUIZ_PROMPT_TOKENS, policy=DEFAULT_POLICY):
+    """
+    Load the context to build a document's quiz from: its compacted text or,
+    depending on the context policy, its stored summary (see context_selection).
+    Returns (text, topic) or None if the document has no text.
+    """
+    row = db.cursor.execute(
+        'SELECT text_content FROM documents WHERE document_id = ?', (document_id,)
+    ).fetchone()
+    if not row or not row[0]:
+        return None
+
+    text_content = row[0]
+    topic = None
+    # OCR results may be stored as JSON with subject, topics and text fields
+    if text_content.strip().startswith('{') and text_content.strip().endswith('}'):
+        try:
+            ocr_data = json.loads(text_content)
+            text_content = ocr_data.get('text', text_content)
+            topics = ocr_data.get('topics')
+            topic = ", ".join(topics) if isinstance(topics, list) else topics
+            if ocr_data.get('subject'):
+                topic = f"{ocr_data['subject']}: {topic}" if topic else ocr_data['subject']
+        except (ValueError, AttributeError):
+            pass
+    if not topic:
+        topic = ", ".join(db.get_document_topics(document_id)) or None
+
+    pages = [page[3] for page in db.get_document_pages(document_id)]
+    text_content, stats = select_context(db, document_id, text_content, None, policy, max_tokens, pages)
+    db.add_prompt_token_stats(document_id, "quiz", stats, max_tokens)
+    return text_content, topic
+
+def quiz_rows(quiz_data):
+    """Turn generated questions into (question_text, correct_option, options, topic) rows, skipping malformed ones."""
+    rows = []
+    for question in quiz_data or []:
+        if not isinstance(question, dict):
+            continue
+        question_text = question.get("question")
+        options = question.get("options")
+        answer = question.get("answer")
+        if not question_text or not isinstance(options, list) or not options or not answer:
+            continue
+        options = [str(option) for option in options]
+        if str(answer) not in options:
+            options.append(str(answer))
+        rows.append((str(question_text), str(answer), options, question.get("topic") or None))
+    return rows
+
+async def run_quiz_batch(document_ids, num_questions=5, db_name="edumate.db", concurrency=4,
+                         use_cache=True, on_progress=None, context_policy=DEFAULT_POLICY):
+    """
+    Generate and store a quiz for each document.
+
+    Args:
+        document_ids (list): Documents to build quizzes from
+        num_questions (int or dict): Questions per quiz, or {document_id: count}
+        db_name (str): SQLite database file
+        concurrency (int): Maximum number of quizzes generated at once
+        use_cache (bool): Reuse cached quizzes for identical input
+        on_progress (callable, optional): Called as on_progress(done, total, entry)
+            after each document finishes
+        context_policy (str): Prompt context policy, one of context_selection.POLICIES
+
+    Returns:
+        dict: {"quizzes": [one entry per document, in input order], "created": int,
+               "failed": int, "elapsed_seconds": float}. Each entry has
+               document_id, quiz_id, questions, duplicates_dropped and error.
+    """
+    start = time.perf_counter()
+    db = Database(db_name)
+    entries = [{"document_id": document_id, "quiz_id": None, "questions": 0, "duplicates_dropped": 0, "error": None}
+               for document_id in document_ids]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    def count_for(document_id):
+        if isinstance(num_questions, dict):
+            return num_questions.get(document_id, num_questions.get(str(document_id), 5))
+        return num_questions
+
+    async def generate(entry):
+        request = document_quiz_input(db, entry["document_id"], policy=context_policy)
+        if request is None:
+            raise ValueError("No text content found for this document")
+        text, topic = request
+        async with semaphore:
+            return await agenerate_quiz(text, topic, count_for(entry["document_id"]), use_cache=use_cache)
+
+    async def generate_entry(index):
+        try:
+            return index, await generate(entries[index]), None
+        except Exception as e:
+            return index, None, e
+
+    done = 0
+    try:
+        for next_result in asyncio.as_completed([generate_entry(i) for i in range(len(entries))]):
+            index, quiz_data, error = await next_result
+            entry = entries[index]
+            if error is None:
+                rows = quiz_rows(quiz_data)
+                if rows:
+                    try:
+                        quiz_id, kept, dropped = add_quiz_deduplicated(db, entry["document_id"], rows)
+                        entry["quiz_id"] = quiz_id
+                        entry["questions"] = len(kept)
+                        entry["duplicates_dropped"] = len(dropped)
+                        if quiz_id is None:
+                            error = ValueError("Every generated question duplicated a stored one")
+                    except Exception as e:
+                        error = e
+                else:
+                    error = ValueError("The model returned no usable questions")
+            if error is not None:
+                entry["error"] = str(error)
+            done += 1
+            if on_progress:
+                on_progress(done, len(entries), entry)
+    finally:
+        db.close()
+
+    created = sum(1 for entry in entries if entry["quiz_id"])
+    return {
+        "quizzes": entries,
+        "created": created,
+        "failed": len(entries) - created,
+        "elapsed_seconds": round(time.perf_counter() - start, 2),
+    }
+
+def generate_quiz_batch(document_ids, num_questions=5, db_name="edumate.db", concurrency=4,
+                        use_cache=True, on_progress=None, context_policy=DEFAULT_POLICY):
+    """Blocking wrapper around run_quiz_batch for scripts and Streamlit."""
+    return asyncio.run(run_quiz_batch(
+        document_ids, num_questions, db_name, concurrency, use_cache, on_progress, context_policy
+    ))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate quizzes for several documents concurrently.")
+    parser.add_argument("document_ids", type=int, nargs="+", help="Documents to build quizzes from")
+    parser.add_argument("--questions", type=int, default=5, help="Questions per quiz")
+    parser.add_argument("--db", default="edumate.db", help="SQLite database file (default: edumate.db)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Quizzes generated at the same time")
+    parser.add_argument("--fresh", action="store_true", help="Ignore cached quizzes")
+    parser.add_argument("--context", choices=POLICIES, default=DEFAULT_POLICY,
+                        help="Prompt context: full text, stored summary, hybrid, or auto (default)")
+    args = parser.parse_args(argv)
+
+    def progress(done, total, entry):
+        status = f"quiz {entry['quiz_id']} ({entry['questions']} questions)" if entry["quiz_id"] else f"failed ({entry['error']})"
+        print(f"[{done}/{total}] document {entry['document_id']}: {status}")
+
+    report = generate_quiz_batch(
+        args.document_ids, args.questions, args.db, args.concurrency, not args.fresh, progress, args.context
+    )
+    print(f"\nCreated {report['created']} quizzes, {report['failed']} failed in {report['elapsed_seconds']}s")
+    return 0 if not report["failed"] else 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import json
+import re
+
+# Fences and wrapper keys the model sometimes puts around the question array
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*(.*?)\s*(?:```)?$", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_OPTION_PREFIX = re.compile(r"^\(?([A-Za-z])[\).:]\s+(.*)$", re.DOTALL)
+_ANSWER_LETTER = re.compile(r"^(?:option\s+)?\(?([A-Za-z])\)?[\).:]?(?:\s+(.*))?$", re.IGNORECASE | re.DOTALL)
+WRAPPER_KEYS = ("questions", "quiz", "items", "data")
+
+MIN_OPTIONS = 2
+
+def _close_truncated(text):
+    """
+    Cut a truncated JSON document after its last complete object and close
+    whatever arrays and objects are still open. Returns None if no object completed.
+    """
+    stack = []
+    in_string = escaped = False
+    last = None
+    for position, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+        elif char in "}]" and stack:
+            bracket = stack.pop()
+            if bracket == "{":
+                last = (position, list(stack))
+    if last is None:
+        return None
+    position, still_open = last
+    closing = "".join("]" if bracket == "[" else "}" for bracket in reversed(still_open))
+    return text[:position + 1] + closing
+
+def repair_json(text):
+    """
+    Parse a model response as JSON, repairing the common faults: code fences,
+    text before the JSON, trailing commas and output cut off mid-array.
+
+    Returns:
+        The parsed value, or None if it could not be repaired
+    """
+    if not isinstance(text, str):
+        return None
+    text = text.strip()
+    fenced = _CODE_FENCE.match(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [index for index in (text.find("["), text.find("{")) if index >= 0]
+    if not starts:
+        return None
+    text = text[min(starts):]
+
+    candidates = [text, _TRAILING_COMMA.sub(r"\1", text)]
+    closed = _close_truncated(candidates[-1])
+    if closed:
+        candidates.append(_TRAILING_COMMA.sub(r"\1", closed))
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    return None
+
+def question_list(data):
+    """Get the list of questions out of a parsed response, unwrapping {"questions": [...]}."""
+    if isinstance(data, dict):
+        for key in WRAPPER_KEYS:
+            if isinstance(data.get(key), list):
+                return data[key]
+        if "question" in data:
+            return [data]
+        return []
+    return data if isinstance(data, list) else []
+
+def _clean(value):
+    return " ".join(str(value).split()) if value is not None else ""
+
+def _strip_option_letters(options):
+    """Remove "A) ", "b. ", "(C) " prefixes, but only when the options are lettered A, B, C... in order."""
+    matches = [_OPTION_PREFIX.match(option) for option in options]
+    if not all(matches):
+        return options, {}
+    letters = [match.group(1).upper() for match in matches]
+    if letters != [chr(ord("A") + index) for index in range(len(options))]:
+        return options, {}
+    stripped = [match.group(2).strip() for match in matches]
+    return stripped, dict(zip(letters, stripped))
+
+def _match_answer(answer, options, lettered):
+    """Find the option an answer refers to: exact, case-insensitive, or by its letter."""
+    if answer in options:
+        return answer
+    folded = {option.casefold(): option for option in options}
+    if answer.casefold() in folded:
+        return folded[answer.casefold()]
+    letter = _ANSWER_LETTER.match(answer)
+    if letter:
+        key = letter.group(1).upper()
+        rest = _clean(letter.group(2))
+        if rest and rest.casefold() in folded:
+            return folded[rest.casefold()]
+        if not rest or len(answer) <= 3:
+            if key in lettered:
+                return lettered[key]
+            index = ord(key) - ord("A")
+            if not rest and 0 <= index < len(options) and len(options) <= 26:
+                return options[index]
+    return None
+
+def normalize_question(item):
+    """
+    Clean up one generated question and check it can be graded.
+    Whitespace is collapsed, letter prefixes are removed from options,
+    duplicate options are dropped and the answer is matched to its option.
+
+    Returns:
+        tuple: (question dict, None) if it is usable, or (None, reason) if not
+    """
+    if not isinstance(item, dict):
+        return None, "not an object"
+    question_text = _clean(item.get("question"))
+    if not question_text:
+        return None, "missing question text"
+    options = item.get("options")
+    if not isinstance(options, list):
+        return None, "options are not a list"
+
+    options = [_clean(option) for option in options if _clean(option)]
+    options, lettered = _strip_option_letters(options)
+    options = list(dict.fromkeys(options))
+    if len(options) < MIN_OPTIONS:
+        return None, f"fewer than {MIN_OPTIONS} options"
+
+    answer = _match_answer(_clean(item.get("answer")), options, lettered)
+    if answer is None:
+        return None, "answer is not one of the options"
+
+    question = dict(item)
+    question.update({"question": question_text, "options": options, "answer": answer})
+    if question.get("topic") is not None:
+        question["topic"] = _clean(question["topic"]) or None
+    return question, None
+
+def validate_quiz(data):
+    """
+    Normalise every question of a parsed quiz response.
+
+    Returns:
+        tuple: (usable questions, [(index, reason)] for the questions that are not)
+    """
+    valid, invalid = [], []
+    for index, item in enumerate(question_list(data)):
+        question, reason = normalize_question(item)
+        if question is None:
+            invalid.append((index, reason))
+        else:
+            valid.append(question)
+    return valid, invalid
+
+def is_repairable_quiz(text):
+    """Cache check for quiz responses: true if at least one usable question can be recovered."""
+    return bool(validate_quiz(repair_json(text))[0])
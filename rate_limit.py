@@ -0,0 +1,226 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+import httpx
+
+# Request budget shared by every process using the same limiter file
+# (Streamlit sessions, API workers, ingestion runs)
+RATE_LIMIT_PATH = os.environ.get("LLM_RATE_LIMIT_PATH", "llm_rate_limit.db")
+REQUESTS_PER_MINUTE = float(os.environ.get("GEMINI_REQUESTS_PER_MINUTE", "60"))
+BURST = float(os.environ.get("GEMINI_BURST", "10"))
+
+# Retry policy for quota and transient server errors
+MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = float(os.environ.get("LLM_BACKOFF_BASE_SECONDS", "1.0"))
+BACKOFF_MAX_SECONDS = float(os.environ.get("LLM_BACKOFF_MAX_SECONDS", "30.0"))
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Longest single sleep while waiting for a token, so waiters re-check the
+# bucket regularly instead of oversleeping when other processes go idle
+MAX_POLL_SECONDS = 1.0
+
+class TokenBucket:
+    """
+    Token bucket stored in SQLite so that every process sharing the file
+    draws from the same budget. Each call takes one token; tokens refill at
+    rate_per_minute up to burst.
+    """
+
+    def __init__(self, path=RATE_LIMIT_PATH, name="gemini", rate_per_minute=REQUESTS_PER_MINUTE, burst=BURST):
+        self.path = path
+        self.name = name
+        self.rate_per_second = rate_per_minute / 60.0
+        self.burst = max(1.0, burst)
+        self._lock = threading.Lock()
+        # Autocommit mode so BEGIN IMMEDIATE below controls the transaction
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_metrics (
+                name TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                value REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (name, metric)
+            )
+        ''')
+
+    def _try_take(self):
+        """Take a token if one is available. Returns 0, or the seconds until one will be."""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self.conn.execute(
+                    'SELECT tokens, updated_at FROM rate_buckets WHERE name = ?', (self.name,)
+                ).fetchone()
+                tokens = self.burst if row is None else min(
+                    self.burst, row[0] + max(0.0, now - row[1]) * self.rate_per_second
+                )
+                if tokens >= 1:
+                    tokens -= 1
+                    wait = 0.0
+                else:
+                    wait = (1 - tokens) / self.rate_per_second
+                self.conn.execute('''
+                    INSERT INTO rate_buckets (name, tokens, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+                ''', (self.name, tokens, now))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def acquire(self):
+        """Block until a token is available. Returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            wait = self._try_take()
+            if wait == 0:
+                break
+            wait = min(wait, MAX_POLL_SECONDS)
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            record("throttled", waited=waited)
+        return waited
+
+    async def aacquire(self):
+        """
+        Async version of acquire. The SQLite transaction, which can wait on
+        other processes' locks, runs in a worker thread, and waits are
+        asyncio sleeps, so the event loop is never blocked.
+        """
+        waited = 0.0
+        while True:
+            wait = await asyncio.to_thread(self._try_take)
+            if wait == 0:
+                break
+            wait = min(wait, MAX_POLL_SECONDS)
+            await asyncio.sleep(wait)
+            waited += wait
+        if waited:
+            await arecord("throttled", waited=waited)
+        return waited
+
+    def add_metric(self, metric, amount=1):
+        """Add to a counter shared by every process using this limiter."""
+        with self._lock:
+            self.conn.execute('''
+                INSERT INTO rate_metrics (name, metric, value) VALUES (?, ?, ?)
+                ON CONFLICT(name, metric) DO UPDATE SET value = value + excluded.value
+            ''', (self.name, metric, amount))
+
+    def totals(self):
+        """Counters accumulated by all processes."""
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT metric, value FROM rate_metrics WHERE name = ?', (self.name,)
+            ).fetchall()
+        return dict(rows)
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_limiter():
+    """Get the process-wide limiter, opening the shared bucket on first use."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = TokenBucket()
+    return _limiter
+
+# Counters for this process; stats() adds the cross-process totals
+_metrics = {"calls": 0, "throttled": 0, "throttle_wait_seconds": 0.0, "retries": 0, "gave_up": 0}
+_metrics_lock = threading.Lock()
+
+def record(event, waited=0.0):
+    """Count a rate-limit event locally and in the shared totals."""
+    with _metrics_lock:
+        _metrics[event] += 1
+        if waited:
+            _metrics["throttle_wait_seconds"] += waited
+    limiter = get_limiter()
+    limiter.add_metric(event)
+    if waited:
+        limiter.add_metric("throttle_wait_seconds", waited)
+
+async def arecord(event, waited=0.0):
+    """Async version of record; the shared totals are written from a worker thread."""
+    await asyncio.to_thread(record, event, waited)
+
+def stats():
+    """Return this process's counters plus the totals across all processes."""
+    with _metrics_lock:
+        local = dict(_metrics)
+    local["throttle_wait_seconds"] = round(local["throttle_wait_seconds"], 3)
+    return {"process": local, "all_processes": get_limiter().totals()}
+
+def is_retryable(error):
+    """Quota errors, server errors and dropped connections are worth retrying."""
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS:
+        return True
+    return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff: uniform between 0 and base * 2**attempt, capped."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+def call_with_retry(fn, can_retry=None, give_up=None):
+    """
+    Call fn() under the shared rate limit, retrying retryable errors with backoff.
+
+    Args:
+        fn (callable): The API call; called once per attempt
+        can_retry (callable, optional): Checked before retrying. Streaming callers
+            return False once output has reached the user, since a retry would repeat it.
+        give_up (callable, optional): Called with a retryable error; returning True
+            raises it at once, e.g. so a routed call can try another model instead
+    """
+    limiter = get_limiter()
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        record("calls")
+        try:
+            return fn()
+        except Exception as e:
+            if (attempt == MAX_RETRIES or not is_retryable(e) or (can_retry and not can_retry())
+                    or (give_up and give_up(e))):
+                if is_retryable(e):
+                    record("gave_up")
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Gemini call failed ({e}); retrying in {delay:.1f}s")
+            record("retries")
+            time.sleep(delay)
+
+async def acall_with_retry(fn, can_retry=None, give_up=None):
+    """Async version of call_with_retry; fn() must return an awaitable."""
+    limiter = await asyncio.to_thread(get_limiter)
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.aacquire()
+        await arecord("calls")
+        try:
+            return await fn()
+        except Exception as e:
+            if (attempt == MAX_RETRIES or not is_retryable(e) or (can_retry and not can_retry())
+                    or (give_up and give_up(e))):
+                if is_retryable(e):
+                    await arecord("gave_up")
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Gemini call failed ({e}); retrying in {delay:.1f}s")
+            await arecord("retries")
+            await asyncio.sleep(delay)
@@ -0,0 +1,324 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Identical generations that are already running are joined instead of started
+# again, keyed by (operation, document, settings). Within a process callers
+# attach to the running flight; across processes (Streamlit, API workers, the
+# processing pipeline) a lease row in a shared SQLite file names the process
+# doing the work, and the others read its results from that row.
+FLIGHTS_PATH = os.environ.get("LLM_FLIGHTS_PATH", "llm_flights.db")
+# A lease not renewed for this long belongs to a process that died
+LEASE_SECONDS = float(os.environ.get("SINGLE_FLIGHT_LEASE_SECONDS", "30"))
+# How often followers in other processes check the lease row
+POLL_SECONDS = float(os.environ.get("SINGLE_FLIGHT_POLL_SECONDS", "0.2"))
+# Requests arriving this soon after a flight finished still get its result,
+# so followers that poll just after the end are not mistaken for new requests
+JOIN_AFTER_SECONDS = 1.0
+# Finished lease rows are deleted after this long
+KEEP_SECONDS = 3600
+
+class FlightError(RuntimeError):
+    """The shared generation a caller was attached to failed."""
+
+def flight_key(operation, document_id, settings=None):
+    """Key of a generation: the operation, the document and a hash of its settings."""
+    payload = json.dumps(
+        {"operation": operation, "document_id": document_id, "settings": settings},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LeaseTable:
+    """Flight leases and results stored in SQLite, shared by every process using the file."""
+
+    def __init__(self, path=FLIGHTS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit mode so BEGIN IMMEDIATE below controls the transaction
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS flights (
+                flight_key TEXT PRIMARY KEY,
+                operation TEXT,
+                owner TEXT NOT NULL,
+                status TEXT NOT NULL,
+                items TEXT,
+                result TEXT,
+                error TEXT,
+                started_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                finished_at REAL
+            )
+        ''')
+
+    def acquire(self, key, operation, owner):
+        """
+        Take the lease on a key unless another live process holds it.
+
+        Returns:
+            str: owner; equal to the given owner when the lease was taken,
+                 otherwise the process whose flight the caller should follow
+        """
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self.conn.execute(
+                    'SELECT owner, status, expires_at, finished_at FROM flights WHERE flight_key = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    current, status, expires_at, finished_at = row
+                    if status == 'running' and expires_at > now:
+                        self.conn.execute("COMMIT")
+                        return current
+                    if status == 'done' and finished_at and now - finished_at < JOIN_AFTER_SECONDS:
+                        self.conn.execute("COMMIT")
+                        return current
+                self.conn.execute('''
+                    INSERT OR REPLACE INTO flights (flight_key, operation, owner, status, started_at, expires_at)
+                    VALUES (?, ?, ?, 'running', ?, ?)
+                ''', (key, operation, owner, now, now + LEASE_SECONDS))
+                self.conn.execute('DELETE FROM flights WHERE finished_at < ?', (now - KEEP_SECONDS,))
+                self.conn.execute("COMMIT")
+                return owner
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def publish(self, key, owner, items):
+        """Store the items produced so far and renew the lease."""
+        with self._lock:
+            self.conn.execute('''
+                UPDATE flights SET items = ?, expires_at = ?
+                WHERE flight_key = ? AND owner = ?
+            ''', (json.dumps(items), time.time() + LEASE_SECONDS, key, owner))
+
+    def renew(self, key, owner):
+        with self._lock:
+            self.conn.execute('''
+                UPDATE flights SET expires_at = ?
+                WHERE flight_key = ? AND owner = ? AND status = 'running'
+            ''', (time.time() + LEASE_SECONDS, key, owner))
+
+    def finish(self, key, owner, items, result=None, error=None):
+        """Record the outcome of a flight; error marks it failed."""
+        with self._lock:
+            self.conn.execute('''
+                UPDATE flights SET status = ?, items = ?, result = ?, error = ?, finished_at = ?
+                WHERE flight_key = ? AND owner = ?
+            ''', ('failed' if error else 'done', json.dumps(items), json.dumps(result), error,
+                  time.time(), key, owner))
+
+    def read(self, key):
+        """Get a flight as (owner, status, items, result, error, expires_at), or None."""
+        with self._lock:
+            row = self.conn.execute('''
+                SELECT owner, status, items, result, error, expires_at FROM flights WHERE flight_key = ?
+            ''', (key,)).fetchone()
+        if row is None:
+            return None
+        owner, status, items, result, error, expires_at = row
+        return (owner, status, json.loads(items) if items else [],
+                json.loads(result) if result else None, error, expires_at)
+
+_table = None
+_table_lock = threading.Lock()
+
+def get_table():
+    """Return the process-wide lease table."""
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = LeaseTable()
+    return _table
+
+# Per-process counts: flights run here, and requests that joined a flight
+# run by this process (local) or by another one (remote)
+_metrics = {"flights": 0, "joined_local": 0, "joined_remote": 0}
+_metrics_lock = threading.Lock()
+
+def _record(event):
+    with _metrics_lock:
+        _metrics[event] += 1
+
+def stats():
+    """Return this process's coalescing counts."""
+    with _metrics_lock:
+        return dict(_metrics)
+
+class _Flight:
+    """One running generation and everything it has produced so far, shared by its callers."""
+
+    def __init__(self, key):
+        self.key = key
+        self.items = []
+        self.result = None
+        self.error = None
+        self.done = False
+        self.changed = threading.Condition()
+
+    def add(self, item):
+        with self.changed:
+            self.items.append(item)
+            self.changed.notify_all()
+
+    def finish(self, result=None, error=None):
+        with self.changed:
+            self.result = result
+            self.error = error
+            self.done = True
+            self.changed.notify_all()
+
+    def follow(self):
+        """Yield every item in order as it arrives; returns the flight's result."""
+        seen = 0
+        while True:
+            with self.changed:
+                while seen == len(self.items) and not self.done:
+                    self.changed.wait()
+                items = self.items[seen:]
+                done = self.done
+            for item in items:
+                yield item
+            seen += len(items)
+            if done and seen == len(self.items):
+                if self.error is not None:
+                    raise FlightError(str(self.error)) from self.error
+                return self.result
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+def _join(operation, document_id, settings):
+    """Return (flight, True if the caller has to run it)."""
+    key = flight_key(operation, document_id, settings)
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is not None:
+            _record("joined_local")
+            return flight, False
+        flight = _Flight(key)
+        _flights[key] = flight
+        return flight, True
+
+def _run(flight, operation, produce):
+    """Run a flight here, or mirror the one another process holds the lease for."""
+    table = get_table()
+    owner = uuid.uuid4().hex
+    try:
+        holder = table.acquire(flight.key, operation, owner)
+        if holder == owner:
+            _record("flights")
+            _lead(flight, table, owner, produce)
+        else:
+            _record("joined_remote")
+            _mirror(flight, table, holder)
+    except Exception as e:
+        flight.finish(error=e)
+    finally:
+        with _flights_lock:
+            if _flights.get(flight.key) is flight:
+                del _flights[flight.key]
+
+def _lead(flight, table, owner, produce):
+    # Keep the lease alive while the model is busy between items
+    stop = threading.Event()
+    def heartbeat():
+        while not stop.wait(LEASE_SECONDS / 3):
+            table.renew(flight.key, owner)
+    threading.Thread(target=heartbeat, daemon=True).start()
+    try:
+        generator = produce()
+        while True:
+            try:
+                item = next(generator)
+            except StopIteration as finished:
+                result = finished.value
+                break
+            flight.add(item)
+            table.publish(flight.key, owner, flight.items)
+    except Exception as e:
+        table.finish(flight.key, owner, flight.items, error=str(e) or type(e).__name__)
+        raise
+    finally:
+        stop.set()
+    table.finish(flight.key, owner, flight.items, result)
+    flight.finish(result)
+
+def _mirror(flight, table, holder):
+    seen = 0
+    while True:
+        row = table.read(flight.key)
+        if row is None or row[0] != holder:
+            raise FlightError("The shared generation was replaced before it finished")
+        _, status, items, result, error, expires_at = row
+        for item in items[seen:]:
+            flight.add(item)
+        seen = max(seen, len(items))
+        if status == 'done':
+            flight.finish(result)
+            return
+        if status == 'failed':
+            raise FlightError(error)
+        if expires_at < time.time():
+            raise FlightError("The process running the shared generation stopped responding")
+        time.sleep(POLL_SECONDS)
+
+def coalesce(operation, document_id, settings, fn):
+    """
+    Run fn() once for all concurrent callers with the same key and give each its result.
+    fn runs synchronously in the first caller's thread; the rest wait for its result.
+    Unlike coalesce_stream, no background thread is started for it.
+
+    Args:
+        operation (str): What is generated, e.g. "summary"
+        document_id (int): Document it is generated for
+        settings: Anything else that changes the result (JSON-friendly, hashed into the
+            key), including the database when results are stored in one
+        fn (callable): The generation; its result must be JSON-serialisable
+
+    Returns:
+        The result of fn. Raises FlightError if a joined flight failed.
+    """
+    def produce():
+        return fn()
+        yield  # A generator that yields nothing and returns fn's result
+
+    flight, leader = _join(operation, document_id, settings)
+    if leader:
+        _run(flight, operation, produce)
+    # Only the result is left to collect; follow() just waits for it
+    for _ in flight.follow():
+        pass
+    return flight.result
+
+def coalesce_stream(operation, document_id, settings, produce):
+    """
+    Stream a generation once for all concurrent callers with the same key.
+    The generator from produce() runs in a background thread, so it finishes
+    even if the caller that started it stops reading.
+
+    Args:
+        operation, document_id, settings: As for coalesce
+        produce (callable): Returns a generator; its items and its return value
+            must be JSON-serialisable
+
+    Returns:
+        generator: Yields every item of the shared stream, including those
+        produced before the caller joined; its return value (the value of
+        "yield from") is the generator's return value.
+    """
+    flight, leader = _join(operation, document_id, settings)
+    if leader:
+        threading.Thread(target=_run, args=(flight, operation, produce),
+                         name="single-flight", daemon=True).start()
+    return flight.follow()
@@ -1,90 +1,316 @@
 # To run this code you need to install the following dependencies:
 # pip install google-genai
 
-import base64
+import asyncio
 import os
-import json
-from google import genai
+from concurrent.futures import ThreadPoolExecutor
 from google.genai import types
 from dotenv import load_dotenv
+from pydantic import BaseModel, ValidationError
+from chunking import estimate_tokens, split_text
+from llm import agenerate_text, gather_bounded, generate_text
+from model_routing import ROUTED
 
 # Load environment variables from .env file
 load_dotenv()
 
-def generate_summary(text, subject=None, topics=None):
+# The model tier is picked per call from the input size and recent latency (see model_routing)
+MODEL = ROUTED
+
+# Documents estimated above this many tokens are summarized chunk by chunk
+CHUNK_TOKENS = int(os.environ.get("SUMMARY_CHUNK_TOKENS", "6000"))
+# Number of chunks summarized at the same time
+MAX_CONCURRENT_CHUNKS = int(os.environ.get("SUMMARY_MAX_CONCURRENT_CHUNKS", "4"))
+
+SUMMARY_SYSTEM_PROMPT = """You are an expert teacher and professor.
+You are given text and topics from notes, summarize them such that you are teaching it.
+Give an overview of the whole text and one entry per topic with its name and a detailed explanation."""
+
+CHUNK_SYSTEM_PROMPT = """You are an expert teacher and professor.
+You are given one part of a longer set of notes. Summarize this part such that you are teaching it.
+Give an overview of this part and one entry per topic with its name and a detailed explanation."""
+
+REDUCE_SYSTEM_PROMPT = """You are an expert teacher and professor.
+You are given the summaries of consecutive parts of one set of notes and the topics they cover.
+Write a single overview of the whole document."""
+
+class SummaryTopic(BaseModel):
+    """One topic of a summary and its explanation."""
+    name: str
+    content: str = ""
+
+class Summary(BaseModel):
+    """
+    A generated summary: an overview and one entry per topic.
+    The model is asked for exactly this shape (response_schema) and every
+    response is validated against it before it is returned or cached.
+    """
+    summary: str
+    topics: list[SummaryTopic] = []
+
+class Overview(BaseModel):
+    """Response of the reduce step of a chunked summary."""
+    summary: str
+
+def generate_summary(text, subject=None, topics=None, use_cache=True, chunk_tokens=CHUNK_TOKENS):
     """
     Generate a summary from text content using Google Gemini API.
+    Text longer than chunk_tokens is summarized with summarize_in_chunks.
     
     Args:
         text (str): The text content to summarize
         subject (str, optional): The subject of the document
         topics (str, optional): The topics covered in the document
+        use_cache (bool): Reuse a cached summary for identical input; False regenerates
+        chunk_tokens (int): Estimated token count above which the text is chunked
         
     Returns:
-        dict: A dictionary containing the summary
+        Summary: The summary, or None if generation failed
     """
-    client = genai.Client(
-        api_key=os.environ.get("GEMINI_API_KEY"),
-    )
+    if estimate_tokens(text) > chunk_tokens:
+        return summarize_in_chunks(text, subject, topics, use_cache=use_cache, chunk_tokens=chunk_tokens)
 
-    model = "gemini-2.5-flash-preview-04-17"
+    try:
+        return _schema_request(Summary, _summary_prompt(text, subject, topics), SUMMARY_SYSTEM_PROMPT,
+                               use_cache, "summary")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return None
+
+async def agenerate_summary(text, subject=None, topics=None, use_cache=True, chunk_tokens=CHUNK_TOKENS):
+    """
+    Async version of generate_summary built on the async Gemini client.
+    Unlike generate_summary, API errors are raised rather than printed,
+    so batch callers can report them per document.
+    """
+    if estimate_tokens(text) > chunk_tokens:
+        return await asummarize_in_chunks(text, subject, topics, use_cache=use_cache, chunk_tokens=chunk_tokens)
+
+    return await _aschema_request(Summary, _summary_prompt(text, subject, topics), SUMMARY_SYSTEM_PROMPT,
+                                  use_cache, "summary")
+
+async def generate_summaries_many(items, concurrency=4, use_cache=True):
+    """
+    Summarize many texts concurrently.
+
+    Args:
+        items (list): Texts, or dicts with "text" and optional "subject" and "topics"
+        concurrency (int): Maximum number of documents summarized at once
+        use_cache (bool): Reuse cached summaries for identical input
+
+    Returns:
+        list: One Summary per item, in input order; items that failed
+        hold the exception instead
+    """
+    async def one(item):
+        if isinstance(item, str):
+            item = {"text": item}
+        return await agenerate_summary(
+            item["text"], item.get("subject"), item.get("topics"), use_cache=use_cache
+        )
+
+    return await gather_bounded(one, items, concurrency)
+
+def _summary_prompt(text, subject, topics):
+    return f"""{_context(subject, topics)}
+    Please create a comprehensive summary of the following text. Include topic names and detailed explanations.
     
-    # Prepare the prompt with context
+    TEXT TO SUMMARIZE:
+    {text}
+    """
+
+def _context(subject, topics):
     context = ""
     if subject:
         context += f"Subject: {subject}\n"
     if topics:
         context += f"Topics: {topics}\n"
-    
-    prompt = f"""{context}
-    Please create a comprehensive summary of the following text. Include topic names and detailed explanations.
-    
-    TEXT TO SUMMARIZE:
-    {text}
-    """
-    
-    contents = [
-        types.Content(
-            role="user",
-            parts=[
-                types.Part.from_text(text=prompt),
-            ],
-        ),
-    ]
-    generate_content_config = types.GenerateContentConfig(
+    return context
+
+def _schema_config(schema, prompt, system_prompt):
+    contents = [types.Content(role="user", parts=[types.Part.from_text(text=prompt)])]
+    config = types.GenerateContentConfig(
         response_mime_type="application/json",
-        system_instruction=[
-            types.Part.from_text(text="""You are an expert teacher and professor.
-You are given text and topics from notes, summarize them such that you are teaching it. 
-The output should be a json file containing topic names and summary."""),
-        ],
+        response_schema=schema,
+        system_instruction=[types.Part.from_text(text=system_prompt)],
     )
+    return contents, config
 
+class _SchemaParser:
+    """
+    Validates responses against a schema for llm.generate_text and keeps the
+    result, so a fresh response is parsed once; only cache hits are parsed here.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.parsed = None
+
+    def validate(self, response_text):
+        try:
+            self.parsed = self.schema.model_validate_json(response_text)
+            return True
+        except ValidationError:
+            return False
+
+    def result(self, response_text):
+        if self.parsed is None and not self.validate(response_text):
+            raise ValueError(f"Response does not match the {self.schema.__name__} schema: {response_text[:200]}")
+        return self.parsed
+
+def _schema_request(schema, prompt, system_prompt, use_cache, operation):
+    """Run one generation constrained to schema and return the validated object; raises ValueError otherwise."""
+    contents, config = _schema_config(schema, prompt, system_prompt)
+    parser = _SchemaParser(schema)
+    response_text = generate_text(MODEL, contents, config, use_cache=use_cache, validate=parser.validate,
+                                  operation=operation)
+    return parser.result(response_text)
+
+async def _aschema_request(schema, prompt, system_prompt, use_cache, operation):
+    """Async version of _schema_request."""
+    contents, config = _schema_config(schema, prompt, system_prompt)
+    parser = _SchemaParser(schema)
+    response_text = await agenerate_text(MODEL, contents, config, use_cache=use_cache, validate=parser.validate,
+                                         operation=operation)
+    return parser.result(response_text)
+
+def format_summary(summary):
+    """
+    Format a Summary as the text stored in the summaries table:
+    a "# Summary" overview followed by a "# Topics" section with one entry per topic.
+    """
+    topics = "".join(f"## {topic.name}\n\n{topic.content}\n\n" for topic in summary.topics)
+    return "# Summary\n\n" + summary.summary + "\n\n# Topics\n\n" + topics
+
+def _chunk_prompt(chunk, index, total, subject, topics):
+    return f"""{_context(subject, topics)}
+    This is part {index + 1} of {total} of the notes. Summarize this part, including topic names and detailed explanations.
+
+    TEXT TO SUMMARIZE:
+    {chunk}
+    """
+
+def summarize_chunk(chunk, index, total, subject=None, topics=None, use_cache=True):
+    """Map step: summarize one chunk into a Summary; a chunk that fails gives an empty one."""
+    prompt = _chunk_prompt(chunk, index, total, subject, topics)
     try:
-        response_text = ""
-        for chunk in client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
-        ):
-            response_text += chunk.text
-            
-        # Try to parse the JSON response
+        return _schema_request(Summary, prompt, CHUNK_SYSTEM_PROMPT, use_cache, "summary_chunk")
+    except ValueError as e:
+        print(e)
+        return Summary(summary="")
+
+async def asummarize_chunk(chunk, index, total, subject=None, topics=None, use_cache=True):
+    """Async version of summarize_chunk."""
+    prompt = _chunk_prompt(chunk, index, total, subject, topics)
+    try:
+        return await _aschema_request(Summary, prompt, CHUNK_SYSTEM_PROMPT, use_cache, "summary_chunk")
+    except ValueError as e:
+        print(e)
+        return Summary(summary="")
+
+def _merge_topics(chunk_results):
+    """Combine topics with the same name (ignoring case and spacing) in document order."""
+    merged = {}
+    for result in chunk_results:
+        for topic in result.topics:
+            key = " ".join(topic.name.split()).lower()
+            if key not in merged:
+                merged[key] = SummaryTopic(name=topic.name.strip(), content=topic.content.strip())
+            elif topic.content.strip():
+                merged[key].content = (merged[key].content + "\n\n" + topic.content.strip()).strip()
+    return list(merged.values())
+
+def _reduce_prompt(chunk_summaries, merged_topics, subject, topics):
+    """Prompt for the overall summary, or None when there is nothing to merge."""
+    if len(chunk_summaries) < 2:
+        return None
+    parts = "\n\n".join(f"Part {i + 1}: {text}" for i, text in enumerate(chunk_summaries))
+    return f"""{_context(subject, topics)}
+    Topics covered: {", ".join(topic.name for topic in merged_topics)}
+
+    PART SUMMARIES:
+    {parts}
+    """
+
+def _reduced_summary(reduced, chunk_summaries):
+    if reduced is not None and reduced.summary:
+        return reduced.summary
+    return "\n\n".join(chunk_summaries)
+
+def merge_chunk_summaries(chunk_results, subject=None, topics=None, use_cache=True):
+    """
+    Reduce step: merge per-chunk results into one Summary.
+    Topics are merged locally; the overall summary is written from the chunk
+    summaries only, so this call stays small however long the document is.
+    """
+    merged_topics = _merge_topics(chunk_results)
+    chunk_summaries = [result.summary for result in chunk_results if result.summary]
+    prompt = _reduce_prompt(chunk_summaries, merged_topics, subject, topics)
+    reduced = None
+    if prompt:
+        try:
+            reduced = _schema_request(Overview, prompt, REDUCE_SYSTEM_PROMPT, use_cache, "summary_reduce")
+        except ValueError as e:
+            print(e)
+    return Summary(summary=_reduced_summary(reduced, chunk_summaries), topics=merged_topics)
+
+async def amerge_chunk_summaries(chunk_results, subject=None, topics=None, use_cache=True):
+    """Async version of merge_chunk_summaries."""
+    merged_topics = _merge_topics(chunk_results)
+    chunk_summaries = [result.summary for result in chunk_results if result.summary]
+    prompt = _reduce_prompt(chunk_summaries, merged_topics, subject, topics)
+    reduced = None
+    if prompt:
         try:
-            summary_data = json.loads(response_text)
-            return summary_data
-        except json.JSONDecodeError:
-            # If JSON parsing fails, return the raw text
-            print(f"Error parsing JSON response. Raw text: {response_text[:200]}...")
-            return {
-                "summary": response_text,
-                "topics": []
-            }
-            
+            reduced = await _aschema_request(Overview, prompt, REDUCE_SYSTEM_PROMPT, use_cache, "summary_reduce")
+        except ValueError as e:
+            print(e)
+    return Summary(summary=_reduced_summary(reduced, chunk_summaries), topics=merged_topics)
+
+def summarize_in_chunks(text, subject=None, topics=None, use_cache=True,
+                        chunk_tokens=CHUNK_TOKENS, max_workers=MAX_CONCURRENT_CHUNKS):
+    """
+    Summarize long text map-reduce style.
+    The text is split on section and paragraph boundaries, the chunks are
+    summarized concurrently and the results merged, so latency grows with
+    len(chunks) / max_workers rather than with document length.
+
+    Returns:
+        Summary: The merged summary, or None if every chunk failed
+    """
+    chunks = split_text(text, chunk_tokens)
+    if not chunks:
+        return None
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+            chunk_results = list(pool.map(
+                lambda item: summarize_chunk(item[1], item[0], len(chunks), subject, topics, use_cache),
+                enumerate(chunks),
+            ))
+        if not any(result.summary or result.topics for result in chunk_results):
+            return None
+        return merge_chunk_summaries(chunk_results, subject, topics, use_cache)
     except Exception as e:
         print(f"An error occurred: {e}")
         return None
 
+async def asummarize_in_chunks(text, subject=None, topics=None, use_cache=True,
+                               chunk_tokens=CHUNK_TOKENS, max_workers=MAX_CONCURRENT_CHUNKS):
+    """Async version of summarize_in_chunks; errors are raised rather than printed."""
+    chunks = split_text(text, chunk_tokens)
+    if not chunks:
+        return None
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def one(index, chunk):
+        async with semaphore:
+            return await asummarize_chunk(chunk, index, len(chunks), subject, topics, use_cache)
+
+    chunk_results = await asyncio.gather(*(one(i, chunk) for i, chunk in enumerate(chunks)))
+    if not any(result.summary or result.topics for result in chunk_results):
+        return None
+    return await amerge_chunk_summaries(chunk_results, subject, topics, use_cache)
+
 if __name__ == "__main__":
     # Test with sample text
     sample_text = """
@@ -0,0 +1,267 @@
+import atexit
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+# Telemetry location, overridable from the environment; LLM_TELEMETRY=0 turns it off
+TELEMETRY_PATH = os.environ.get("LLM_TELEMETRY_PATH", "llm_telemetry.db")
+TELEMETRY_ENABLED = os.environ.get("LLM_TELEMETRY", "1") != "0"
+# Records waiting to be written; beyond this they are dropped rather than slowing calls down
+MAX_PENDING = 10000
+MAX_BATCH = 500
+
+COLUMNS = (
+    "started_at", "day", "operation", "model", "input_chars", "input_bytes", "input_tokens",
+    "output_chars", "output_tokens", "first_chunk_ms", "latency_ms", "retries", "cache_hit",
+    "status", "error", "route",
+)
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS llm_calls (
+            call_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at REAL NOT NULL,
+            day TEXT NOT NULL,
+            operation TEXT NOT NULL,
+            model TEXT,
+            input_chars INTEGER,
+            input_bytes INTEGER,
+            input_tokens INTEGER,
+            output_chars INTEGER,
+            output_tokens INTEGER,
+            first_chunk_ms REAL,
+            latency_ms REAL NOT NULL,
+            retries INTEGER DEFAULT 0,
+            cache_hit INTEGER DEFAULT 0,
+            status TEXT NOT NULL,
+            error TEXT,
+            route TEXT
+        )
+    ''')
+    # Added with model routing: which tier was chosen and why
+    if "route" not in {row[1] for row in conn.execute('PRAGMA table_info(llm_calls)')}:
+        conn.execute('ALTER TABLE llm_calls ADD COLUMN route TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_calls_day ON llm_calls (day, operation)')
+    conn.commit()
+    return conn
+
+class TelemetryWriter:
+    """
+    Writes call records to the llm_calls table from a background thread,
+    in batches, so recording a call never waits on the database.
+    """
+
+    def __init__(self, path=TELEMETRY_PATH):
+        self.path = path
+        self.queue = queue.Queue(MAX_PENDING)
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, record):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="llm-telemetry", daemon=True)
+                self._thread.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """Wait (up to timeout seconds) until every submitted record is written."""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _run(self):
+        conn = _connect(self.path)
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                conn.executemany(
+                    f"INSERT INTO llm_calls ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})",
+                    [tuple(record.get(column) for column in COLUMNS) for record in batch],
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Could not write LLM telemetry: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    """Return the process-wide telemetry writer."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = TelemetryWriter()
+            atexit.register(_writer.flush)
+        return _writer
+
+def measure_contents(contents):
+    """Count the text characters and binary bytes (e.g. PDFs) in prompt contents."""
+    chars = size = 0
+    if contents is None:
+        return 0, 0
+    if isinstance(contents, str):
+        return len(contents), 0
+    if isinstance(contents, (bytes, bytearray)):
+        return 0, len(contents)
+    if isinstance(contents, (list, tuple)):
+        for item in contents:
+            item_chars, item_bytes = measure_contents(item)
+            chars += item_chars
+            size += item_bytes
+        return chars, size
+    parts = getattr(contents, "parts", None)
+    if parts is not None:
+        return measure_contents(parts)
+    text = getattr(contents, "text", None)
+    if text:
+        chars += len(text)
+    inline_data = getattr(contents, "inline_data", None)
+    if inline_data is not None and getattr(inline_data, "data", None):
+        size += len(inline_data.data)
+    return chars, size
+
+class CallRecord:
+    """
+    Measurements of one model call: sizes, time to first chunk, total latency,
+    retries and whether it was served from the cache. finish() submits it.
+    """
+
+    def __init__(self, operation, model, contents=None):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.operation = operation
+        self.model = model
+        self.input_chars, self.input_bytes = measure_contents(contents)
+        self.input_tokens = self.output_tokens = None
+        self.first_chunk_ms = None
+        self.output_chars = 0
+        self.attempts = 0
+        # Set by routed calls: the tier and why it was chosen
+        self.route = None
+
+    def attempt(self):
+        """Mark the start of an attempt; output from a failed earlier attempt is discarded."""
+        self.attempts += 1
+        self.output_chars = 0
+
+    def chunk(self, text, usage=None):
+        """Record a streamed chunk and, if the chunk carries it, the token usage."""
+        if text and self.first_chunk_ms is None:
+            self.first_chunk_ms = (time.perf_counter() - self._start) * 1000
+        self.output_chars += len(text or "")
+        if usage is not None:
+            self.usage(usage)
+
+    def usage(self, usage):
+        self.input_tokens = getattr(usage, "prompt_token_count", None) or self.input_tokens
+        self.output_tokens = getattr(usage, "candidates_token_count", None) or self.output_tokens
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self._start) * 1000
+
+    def finish(self, error=None, cache_hit=False):
+        if not TELEMETRY_ENABLED:
+            return
+        get_writer().submit({
+            "started_at": self.started_at,
+            "day": datetime.fromtimestamp(self.started_at).strftime("%Y-%m-%d"),
+            "operation": self.operation,
+            "model": self.model,
+            "input_chars": self.input_chars,
+            "input_bytes": self.input_bytes,
+            "input_tokens": self.input_tokens,
+            "output_chars": self.output_chars,
+            "output_tokens": self.output_tokens,
+            "first_chunk_ms": self.first_chunk_ms,
+            "latency_ms": self.elapsed_ms(),
+            "retries": max(0, self.attempts - 1),
+            "cache_hit": int(cache_hit),
+            "status": "error" if error is not None else "ok",
+            "error": f"{type(error).__name__}: {error}"[:500] if error is not None else None,
+            "route": self.route,
+        })
+
+def start_call(operation, model, contents=None):
+    """Start measuring a model call."""
+    return CallRecord(operation, model, contents)
+
+def percentile(values, share):
+    """Nearest-rank percentile of a non-empty list."""
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(share * len(values)) - 1))]
+
+def latency_report(days=14, by_day=True, path=TELEMETRY_PATH, by_model=False):
+    """
+    Summarise recorded calls per operation (and per day, and per model).
+    Latency percentiles cover successful calls that reached the model;
+    cache hits are counted separately.
+
+    Returns:
+        list: Dicts with operation, day, calls, errors, cache_hits, retries,
+              p50_ms, p95_ms, p99_ms, first_chunk_p50_ms, input_tokens, output_tokens;
+              with by_model also model and fallbacks (calls made after another tier failed)
+    """
+    if not os.path.exists(path):
+        return []
+    conn = _connect(path)
+    try:
+        rows = conn.execute('''
+            SELECT day, operation, latency_ms, first_chunk_ms, cache_hit, status, retries,
+                   input_tokens, output_tokens, model, route
+            FROM llm_calls
+            WHERE started_at >= ?
+        ''', (time.time() - days * 86400,)).fetchall()
+    finally:
+        conn.close()
+
+    groups = defaultdict(list)
+    for row in rows:
+        groups[(row[0] if by_day else None, row[1], row[9] if by_model else None)].append(row)
+
+    report = []
+    # Newest day first, operations (then models) alphabetically within a day
+    ordered = sorted(sorted(groups.items(), key=lambda item: (item[0][1], item[0][2] or "")),
+                     key=lambda item: item[0][0] or "", reverse=True)
+    for (day, operation, model), calls in ordered:
+        live = [call for call in calls if not call[4] and call[5] == "ok"]
+        latencies = [call[2] for call in live]
+        first_chunks = [call[3] for call in live if call[3] is not None]
+        entry = {
+            "operation": operation,
+            "day": day,
+            "calls": len(calls),
+            "errors": sum(1 for call in calls if call[5] != "ok"),
+            "cache_hits": sum(call[4] for call in calls),
+            "retries": sum(call[6] or 0 for call in calls),
+            "p50_ms": round(percentile(latencies, 0.50)) if latencies else None,
+            "p95_ms": round(percentile(latencies, 0.95)) if latencies else None,
+            "p99_ms": round(percentile(latencies, 0.99)) if latencies else None,
+            "first_chunk_p50_ms": round(percentile(first_chunks, 0.50)) if first_chunks else None,
+            "input_tokens": sum(call[7] or 0 for call in calls),
+            "output_tokens": sum(call[8] or 0 for call in calls),
+        }
+        if by_model:
+            entry["model"] = model
+            entry["fallbacks"] = sum(1 for call in calls if (call[10] or "").startswith("fallback"))
+        report.append(entry)
+    return report